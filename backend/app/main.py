@@ -5,9 +5,19 @@ Integrates camera/session-based smile detection endpoints.
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse
 from app.routes import camera  # Use new camera-based routes
+from app.routes import batch
+from app.routes import history
 from app.logger import setup_logger
-from app.services.camera_manager import camera_manager
+from app.services.camera_manager import camera_registry
+from app.services.detection_pipeline import pipeline_registry
+from app.services.process_detector import get_process_detector, shutdown_process_detector
+from app.services.smile_detector import cascade_pool
+from app.services.face_detectors import face_detector_info
+from app.services.startup import startup_tracker, warm_up_detection, warmup_enabled
+from app.models.detection_event import detection_event_writer, detection_image_writer, init_detection_db
+from app.services.metrics import metrics
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -30,7 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["x-smile-coords"],
+    expose_headers=["x-smile-coords", "x-frame-seq", "x-frame-timestamp", "etag", "server-timing", "x-result-stale"],
 )
 
 # Health check endpoint
@@ -43,10 +53,111 @@ def root():
     """
     return {"message": "Smile Detection API is running."}
 
+# Readiness endpoint
+@app.get("/ready", tags=["Health"])
+def ready():
+    """
+    Readiness check: 200 once startup and detector warmup have completed, 503 until then
+    (or if startup failed). Unlike the health check, route traffic only when this passes.
+    Returns:
+        dict: {"ready", "startup_ms", "phases": {phase: ms}, "error"}
+    """
+    status = startup_tracker.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+# Queue depths and writer outcomes, evaluated on every scrape
+metrics.register_gauge(
+    "smile_queue_depth",
+    "Items waiting in background writer queues",
+    lambda: {
+        (("queue", "events"),): detection_event_writer.stats()["pending"],
+        (("queue", "images"),): detection_image_writer.stats()["pending"],
+    },
+)
+metrics.register_gauge(
+    "smile_writer_items",
+    "Items written or dropped by the background writers since startup",
+    lambda: {
+        (("queue", "events"), ("result", "written")): detection_event_writer.stats()["written"],
+        (("queue", "events"), ("result", "dropped")): detection_event_writer.stats()["dropped"],
+        (("queue", "images"), ("result", "written")): detection_image_writer.stats()["written"],
+        (("queue", "images"), ("result", "dropped")): detection_image_writer.stats()["dropped"],
+    },
+)
+metrics.register_gauge(
+    "smile_cascade_pool",
+    "In-process cascade pairs by state",
+    lambda: {(("state", state),): cascade_pool.stats()[state] for state in ("in_use", "idle")},
+)
+metrics.register_gauge(
+    "smile_capture_fps",
+    "Measured capture rate per camera (frames per second)",
+    lambda: {(("camera", camera_id),): camera_registry.get(camera_id).measured_fps for camera_id in camera_registry.ids()},
+)
+
+metrics.register_gauge(
+    "smile_startup_phase_seconds",
+    "Duration of each completed startup phase",
+    lambda: {(("phase", phase),): seconds for phase, seconds in startup_tracker.phases().items()},
+)
+metrics.register_gauge("smile_ready", "1 once startup and warmup have completed", lambda: int(startup_tracker.ready))
+
+# Face detector backends
+@app.get("/detectors", tags=["Health"])
+def get_detectors():
+    """
+    Lists the face detector backends, the one requested with FACE_DETECTOR, the one actually
+    active (Haar if the requested one could not be loaded), and each backend's measured cost
+    in this process.
+    Returns:
+        dict: {"detectors": [{"name", "description", "active", "requested", "fallback", "error", "calls", "mean_ms"}]}
+    """
+    return {"detectors": face_detector_info()}
+
+# Prometheus metrics endpoint
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus scrape endpoint: stage duration histograms, frame/detection counters and queue depths.
+    Returns:
+        str: Metrics in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Attach new camera-based detection endpoints
 app.include_router(camera.router)
 
-# Ensure camera is stopped on server shutdown
+# Attach batch detection endpoints for uploaded images
+app.include_router(batch.router)
+
+# Attach detection history and aggregate endpoints
+app.include_router(history.router)
+
+# Start the event/image writers and background detection workers (and process pool, if configured) on server startup,
+# then warm up the detector in the background; /ready passes once it is done
+@app.on_event("startup")
+def startup_event():
+    with startup_tracker.phase("schema"):
+        init_detection_db()  # Before any reader or writer: history requests never run DDL
+    with startup_tracker.phase("writers"):
+        detection_event_writer.start()
+        detection_image_writer.start()
+    with startup_tracker.phase("detection_engine"):
+        get_process_detector()
+    with startup_tracker.phase("pipelines"):
+        pipeline_registry.start()
+    if warmup_enabled():
+        startup_tracker.run_in_background("warmup", warm_up_detection)
+    else:
+        startup_tracker.mark_ready()
+
+# Ensure cameras and detection workers are stopped and queued events/images flushed on server shutdown
 @app.on_event("shutdown")
 def shutdown_event():
-    camera_manager.stop()
+    camera_registry.stop_all()
+    pipeline_registry.stop()
+    shutdown_process_detector()
+    detection_image_writer.stop()  # Save queued detection images (pack mode queues their index rows)
+    detection_event_writer.stop()  # Then flush queued detection events and image index rows
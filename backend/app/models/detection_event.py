@@ -1,62 +1,611 @@
 import os
 from datetime import datetime
 import logging
+import queue
 import sqlite3
-import json
+import threading
+import time
+from collections import deque
+from itertools import groupby
+from app.models.image_store import create_image_pack_store
+from app.services.metrics import metrics
 
-def log_detection_event(coords, db_path=None):
+# Normalized detection schema: one row per event with a numeric (epoch seconds),
+# indexed timestamp, and one row per smile box with integer coordinates.
+SCHEMA_STATEMENTS = (
     """
-    Logs smile detection events with timestamp and coordinates into a local SQLite database.
+    CREATE TABLE IF NOT EXISTS detection_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        camera_id TEXT NOT NULL,
+        ts REAL NOT NULL,
+        box_count INTEGER NOT NULL,
+        image_key TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS detection_boxes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event_id INTEGER NOT NULL REFERENCES detection_events(id) ON DELETE CASCADE,
+        x INTEGER NOT NULL,
+        y INTEGER NOT NULL,
+        w INTEGER NOT NULL,
+        h INTEGER NOT NULL
+    )
+    """,
+    # Covers per-camera history pages and aggregates without touching the table
+    "CREATE INDEX IF NOT EXISTS idx_detection_events_camera_ts ON detection_events (camera_id, ts, box_count)",
+    "CREATE INDEX IF NOT EXISTS idx_detection_events_ts ON detection_events (ts, box_count)",
+    "CREATE INDEX IF NOT EXISTS idx_detection_boxes_event ON detection_boxes (event_id)",
+    # Offset index of images kept in pack files (IMAGE_STORE=pack), by image key
+    """
+    CREATE TABLE IF NOT EXISTS detection_images (
+        key TEXT PRIMARY KEY,
+        pack_id INTEGER NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_detection_images_pack ON detection_images (pack_id)",
+    """
+    CREATE TABLE IF NOT EXISTS episodes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        camera_id TEXT NOT NULL,
+        start_time REAL NOT NULL,
+        end_time REAL NOT NULL,
+        frame_count INTEGER NOT NULL,
+        best_x INTEGER NOT NULL,
+        best_y INTEGER NOT NULL,
+        best_w INTEGER NOT NULL,
+        best_h INTEGER NOT NULL,
+        image_path TEXT
+    )
+    """,
+)
+
+# Copies the legacy `detections` table (ISO local-time text + JSON coords) into the
+# normalized tables, keeping ids (shifted by :offset past existing events if they would
+# collide), then renames it so the copy runs only once.
+MIGRATE_LEGACY_DETECTIONS = (
+    """
+    INSERT INTO detection_events (id, camera_id, ts, box_count)
+    SELECT id + :offset, 'default', (julianday(timestamp, 'utc') - 2440587.5) * 86400.0, json_array_length(coords)
+    FROM detections
+    WHERE timestamp IS NOT NULL AND json_valid(coords)
+    """,
+    """
+    INSERT INTO detection_boxes (event_id, x, y, w, h)
+    SELECT d.id + :offset, json_extract(box.value, '$.x'), json_extract(box.value, '$.y'),
+           json_extract(box.value, '$.w'), json_extract(box.value, '$.h')
+    FROM detections AS d, json_each(d.coords) AS box
+    WHERE d.timestamp IS NOT NULL AND json_valid(d.coords)
+    ORDER BY d.id, box.key
+    """,
+)
+LEGACY_ID_COLLISION = "SELECT 1 FROM detections AS d JOIN detection_events AS e ON e.id = d.id LIMIT 1"
+
+INSERT_DETECTION_EVENT = "INSERT INTO detection_events (camera_id, ts, box_count, image_key) VALUES (?, ?, ?, ?)"
+INSERT_DETECTION_BOX = "INSERT INTO detection_boxes (event_id, x, y, w, h) VALUES (?, ?, ?, ?, ?)"
+INSERT_IMAGE_LOCATION = "INSERT OR REPLACE INTO detection_images (key, pack_id, offset, length) VALUES (?, ?, ?, ?)"
+DELETE_IMAGE_PACK = "DELETE FROM detection_images WHERE pack_id = ?"
+SELECT_IMAGE_LOCATION = "SELECT pack_id, offset, length FROM detection_images WHERE key = ?"
+INSERT_EPISODE = """
+    INSERT INTO episodes (camera_id, start_time, end_time, frame_count, best_x, best_y, best_w, best_h, image_path)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _table_exists(conn, name):
+    """
+    Returns True if the database has a table with this name.
+    """
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def ensure_schema(conn):
+    """
+    Creates the detection tables and indexes if needed, and migrates a legacy
+    `detections` table into them.
+    Idempotent, and safe to run from several connections at once: everything runs in one
+    write transaction (BEGIN IMMEDIATE), so a single connection migrates and the others
+    then find the migrated schema.
 
     Args:
-        coords (list): List of dictionaries containing smile coordinates.
-        db_path (str): Path to SQLite DB file (default "smiles.db").
+        conn (sqlite3.Connection): Open connection to the detection database.
     """
-    db_path = db_path or os.environ.get("SMILE_DB_PATH", "smiles.db")
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # Explicit transaction: the sqlite3 module would commit before DDL
     try:
-         # Connect to the database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Create the detections table if it doesn't exist
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS detections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                coords TEXT
-            )
-        """)
-
-        # Insert the current timestamp and smile coordinates into the table
-        cursor.execute(
-            "INSERT INTO detections (timestamp, coords) VALUES (?, ?)",
-            (datetime.now().isoformat(), json.dumps(coords))
-        )
-
-         # Commit the transaction
-        conn.commit()
-    except sqlite3.Error as e:
-        # Log any database-related error
-        logging.exception("Database error during detection logging")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in SCHEMA_STATEMENTS:
+                conn.execute(statement)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(detection_events)")}
+            if "image_key" not in columns:
+                conn.execute("ALTER TABLE detection_events ADD COLUMN image_key TEXT")
+            if _table_exists(conn, "detections"):
+                offset = 0
+                if conn.execute(LEGACY_ID_COLLISION).fetchone():
+                    offset = conn.execute("SELECT MAX(id) FROM detection_events").fetchone()[0]
+                for statement in MIGRATE_LEGACY_DETECTIONS:
+                    conn.execute(statement, {"offset": offset})
+                # An earlier migration may already have used the name
+                legacy_name, suffix = "detections_legacy", 1
+                while _table_exists(conn, legacy_name):
+                    suffix += 1
+                    legacy_name = f"detections_legacy_{suffix}"
+                conn.execute(f'ALTER TABLE detections RENAME TO "{legacy_name}"')
+                logging.info(f"[DetectionEvent] Migrated legacy detections table to the normalized schema (kept as {legacy_name})")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
     finally:
-        # Ensure the connection is closed to avoid DB locks
-        if 'conn' in locals():
+        conn.isolation_level = isolation_level
+
+def init_detection_db(db_path=None):
+    """
+    Creates or migrates the detection schema, once at startup, so that readers never run DDL.
+
+    Args:
+        db_path (str): Path to SQLite DB file (default SMILE_DB_PATH or "smiles.db").
+    """
+    conn = sqlite3.connect(db_path or os.environ.get("SMILE_DB_PATH", "smiles.db"))
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")  # Persistent: readers never block the writer
+        ensure_schema(conn)
+    finally:
+        conn.close()
+
+def insert_detection_events(conn, events):
+    """
+    Inserts detection events and their boxes (no commit).
+
+    Args:
+        conn (sqlite3.Connection): Open connection.
+        events (list): (camera_id, timestamp, coords, image_key) tuples.
+    """
+    boxes = []
+    for camera_id, timestamp, coords, image_key in events:
+        event_id = conn.execute(INSERT_DETECTION_EVENT, (camera_id, timestamp, len(coords), image_key)).lastrowid
+        boxes.extend((event_id, int(c["x"]), int(c["y"]), int(c["w"]), int(c["h"])) for c in coords)
+    conn.executemany(INSERT_DETECTION_BOX, boxes)
+
+def log_detection_event(coords, timestamp=None, camera_id="default"):
+    """
+    Logs a smile detection event through the shared background writer (non-blocking;
+    the writer owns the database connection and commits in batches).
+
+    Args:
+        coords (list): List of dictionaries containing smile coordinates.
+        timestamp (float, optional): Detection time in epoch seconds (default: now).
+        camera_id (str): Camera the detection came from.
+    Returns:
+        bool: True if queued, False if dropped because the queue is full.
+    """
+    return detection_event_writer.submit(coords, timestamp, camera_id=camera_id)
+
+class DetectionEventWriter:
+    """
+    Long-lived, batched writer for detection events and smile episodes.
+    Owns a single SQLite connection (WAL mode) on a background thread, ensures the
+    schema once, and commits queued events in batches by size or age.
+    Callers never block on disk I/O: events go through a bounded in-memory queue.
+    """
+
+    def __init__(self, db_path=None, batch_size=100, flush_interval=1.0, max_queue=10000):
+        """
+        Args:
+            db_path (str): Path to SQLite DB file (default SMILE_DB_PATH or "smiles.db").
+            batch_size (int): Commit as soon as this many events are pending.
+            flush_interval (float): Commit pending events at least this often (seconds).
+            max_queue (int): Maximum queued events; newer events are dropped when full.
+        """
+        self._db_path = db_path
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0  # Events committed
+        self.dropped = 0  # Events rejected because the queue was full
+
+    def start(self):
+        """
+        Starts the writer thread. Returns False if it is already running.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            return True
+
+    def submit(self, coords, timestamp=None, camera_id="default", image_key=None):
+        """
+        Queues a detection event without blocking.
+
+        Args:
+            coords (list): List of dictionaries containing smile coordinates.
+            timestamp (float, optional): Detection time in epoch seconds (default: now).
+            camera_id (str): Camera the detection came from.
+            image_key (str, optional): Key (file name) of the saved detection image.
+        Returns:
+            bool: True if queued, False if dropped because the queue is full.
+        """
+        return self._enqueue(INSERT_DETECTION_EVENT, (camera_id, timestamp or time.time(), coords, image_key))
+
+    def submit_episode(self, episode, image_path=None):
+        """
+        Queues a closed smile episode without blocking.
+
+        Args:
+            episode (dict): {"camera_id", "start", "end", "frames", "best_box": {"x", "y", "w", "h"}}.
+            image_path (str, optional): Path of the episode's representative image.
+        Returns:
+            bool: True if queued, False if dropped because the queue is full.
+        """
+        box = episode["best_box"]
+        return self._enqueue(INSERT_EPISODE, (
+            episode["camera_id"], episode["start"], episode["end"], episode["frames"],
+            box["x"], box["y"], box["w"], box["h"], image_path,
+        ))
+
+    def submit_image_location(self, key, pack_id, offset, length):
+        """
+        Queues the offset index row of an image appended to a pack file.
+        """
+        return self._enqueue(INSERT_IMAGE_LOCATION, (key, pack_id, offset, length))
+
+    def submit_pack_deletion(self, pack_id):
+        """
+        Queues removal of the index rows of a pack deleted by retention.
+        """
+        return self._enqueue(DELETE_IMAGE_PACK, (pack_id,))
+
+    def _enqueue(self, statement, params):
+        """
+        Queues one row insert, counting it as dropped if the queue is full.
+        """
+        try:
+            self._queue.put_nowait((statement, params))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logging.warning("[DetectionEvent] Event queue full; dropping detection event")
+            return False
+
+    def stats(self):
+        """
+        Returns writer counters.
+        Returns:
+            dict: {"written", "dropped", "pending"}
+        """
+        return {"written": self.written, "dropped": self.dropped, "pending": self._queue.qsize()}
+
+    def flush(self, timeout=5.0):
+        """
+        Waits until every event queued so far is committed.
+        Returns:
+            bool: True if flushed, False on timeout or if the writer is not running.
+        """
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        """
+        Commits all queued events and stops the writer thread (call on shutdown).
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return False
+        if not thread.is_alive():
+            # The writer failed (e.g., could not open the database): nothing will drain the queue
+            logging.error(f"[DetectionEvent] Writer thread is not running; {self._queue.qsize()} queued events were not written")
+            return True
+        try:
+            self._queue.put(None, timeout=timeout)
+            thread.join(timeout)
+        except queue.Full:
+            pass
+        if thread.is_alive():
+            logging.error(f"[DetectionEvent] Writer did not drain within {timeout}s; {self._queue.qsize()} queued events may be lost")
+        return True
+
+    def _run(self):
+        """
+        Writer thread: owns the connection and commits batches until stopped.
+        """
+        db_path = self._db_path or os.environ.get("SMILE_DB_PATH", "smiles.db")
+        try:
+            conn = sqlite3.connect(db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL; no fsync per commit
+            ensure_schema(conn)
+        except sqlite3.Error:
+            logging.exception("Database error while opening detection event writer")
+            return
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = self._flush_interval if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    # Oldest pending event reached flush_interval
+                    self._commit(conn, batch)
+                    batch, deadline = [], None
+                    continue
+                if item is None or isinstance(item, threading.Event):
+                    # Stop (None) or flush request (Event): commit everything queued before it
+                    self._commit(conn, batch)
+                    batch, deadline = [], None
+                    if item is None:
+                        return
+                    item.set()
+                    continue
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self._flush_interval
+                if len(batch) >= self._batch_size:
+                    self._commit(conn, batch)
+                    batch, deadline = [], None
+        finally:
             conn.close()
 
-def save_detection_image(image_bytes, save_dir=None):
+    def _commit(self, conn, batch):
+        """
+        Inserts and commits one batch of rows in a single transaction.
+        """
+        if not batch:
+            return
+        try:
+            started = time.perf_counter()
+            for statement, rows in groupby(batch, key=lambda item: item[0]):
+                params = [params for _, params in rows]
+                if statement == INSERT_DETECTION_EVENT:
+                    insert_detection_events(conn, params)
+                else:
+                    conn.executemany(statement, params)
+            conn.commit()
+            metrics.observe("db_commit", time.perf_counter() - started)
+            self.written += len(batch)
+        except (sqlite3.Error, KeyError, TypeError, ValueError):  # Malformed coords fail the batch too
+            logging.exception("Database error during batched detection logging")
+            conn.rollback()
+
+# Shared writer used by the detection pipelines
+detection_event_writer = DetectionEventWriter()
+
+def detection_image_filename(timestamp=None, prefix="smile"):
+    """
+    Returns the file name (also the image key) for an image captured at timestamp (datetime, default now).
+    """
+    return f"{prefix}_{(timestamp or datetime.now()).strftime('%Y%m%d_%H%M%S_%f')}.jpg"
+
+def save_detection_image(image_bytes, save_dir=None, timestamp=None, filename=None):
     """
     Saves the detected smile image as a JPEG file in detected_smiles/.
+    The file name is derived from timestamp (detection time, default now) unless given.
     Returns the file path on success, None on failure.
     """
     save_dir = save_dir or os.environ.get("DETECTION_IMAGE_DIR", "detected_smiles")
     try:        
         os.makedirs(save_dir, exist_ok=True)
-        filename = f"smile_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jpg"
+        filename = filename or detection_image_filename(timestamp)
         filepath = os.path.join(save_dir, filename)
-        with open(filepath, "wb") as f:
+        with metrics.time_stage("image_write"), open(filepath, "wb") as f:
             f.write(image_bytes)
         logging.info(f"[DetectionEvent] Saved detected smile image to {filepath}")
         return filepath
     except Exception as e:
         logging.error(f"[DetectionEvent] Failed to save detected smile image: {e}")
-        return None
\ No newline at end of file
+        return None
+
+class DetectionImageWriter:
+    """
+    Background writer for detected smile images.
+    Images go through a bounded in-memory queue so detection never waits on disk;
+    when the queue is full, the overflow policy decides what happens:
+    - "drop_oldest": discard the oldest queued image (default)
+    - "drop_newest": discard the image being submitted
+    - "block": wait until the writer frees a slot
+    Images are saved as individual files, or appended to pack files when an
+    ImagePackStore is configured (IMAGE_STORE=pack); pack locations are indexed
+    in the detection database through the event writer.
+    """
+
+    OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+    RETENTION_INTERVAL = 60.0  # Seconds between pack retention checks
+
+    def __init__(self, save_dir=None, max_queue=None, overflow_policy=None, pack_store=None, event_writer=None):
+        """
+        Args:
+            save_dir (str): Target directory (default DETECTION_IMAGE_DIR or "detected_smiles").
+            max_queue (int): Queue bound (default IMAGE_QUEUE_SIZE or 100).
+            overflow_policy (str): One of OVERFLOW_POLICIES (default IMAGE_QUEUE_POLICY or "drop_oldest").
+            pack_store (ImagePackStore, optional): Pack store to use (default: from IMAGE_STORE on start).
+            event_writer (DetectionEventWriter, optional): Receives pack offset index rows.
+        """
+        self._save_dir = save_dir
+        self._max_queue = max_queue
+        self._policy = overflow_policy
+        self._pack_store = pack_store
+        self._event_writer = event_writer
+        self._next_retention = 0.0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.queued = 0   # Images accepted into the queue
+        self.written = 0  # Images saved to disk
+        self.dropped = 0  # Images discarded by the overflow policy
+
+    def start(self):
+        """
+        Resolves configuration and starts the writer thread. Returns False if already running.
+        """
+        with self._cond:
+            if self._running:
+                return False
+            self._max_queue = self._max_queue or int(os.environ.get("IMAGE_QUEUE_SIZE", 100))
+            self._policy = self._policy or os.environ.get("IMAGE_QUEUE_POLICY", "drop_oldest")
+            if self._policy not in self.OVERFLOW_POLICIES:
+                raise ValueError(f"Unknown image queue overflow policy: {self._policy}")
+            if self._pack_store is None:
+                self._pack_store = create_image_pack_store()
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            return True
+
+    def submit(self, image_bytes, filename=None):
+        """
+        Queues an image for saving, applying the overflow policy when the queue is full.
+        Args:
+            image_bytes (bytes): JPEG data.
+            filename (str, optional): File name to use instead of the timestamp-based default.
+        Returns:
+            bool: True if the image was queued, False if it was dropped.
+        """
+        item = (image_bytes, datetime.now(), filename)
+        with self._cond:
+            max_queue = self._max_queue or int(os.environ.get("IMAGE_QUEUE_SIZE", 100))
+            policy = self._policy or os.environ.get("IMAGE_QUEUE_POLICY", "drop_oldest")
+            if len(self._pending) >= max_queue:
+                if policy == "block" and self._running:
+                    while self._running and len(self._pending) >= max_queue:
+                        self._cond.wait()
+                elif policy == "drop_oldest":
+                    self._pending.popleft()
+                    self.dropped += 1
+                else:
+                    self.dropped += 1
+                    return False
+            self._pending.append(item)
+            self.queued += 1
+            self._cond.notify_all()
+            return True
+
+    def image_path(self, filename):
+        """
+        Returns the path an image submitted with this filename will be saved to,
+        or the filename itself (its pack key) when images go to pack files.
+        """
+        if self._pack_store is not None:
+            return filename
+        return os.path.join(self._save_dir or os.environ.get("DETECTION_IMAGE_DIR", "detected_smiles"), filename)
+
+    def load(self, key, conn):
+        """
+        Reads a saved image by key, from its pack (memory-mapped) or its file.
+
+        Args:
+            key (str): Image key (file name) recorded with the detection.
+            conn (sqlite3.Connection): Connection to the detection database (pack offset index).
+        Returns:
+            bytes or None: Image data, or None if it is not (or no longer) stored.
+        """
+        if self._pack_store is not None:
+            location = conn.execute(SELECT_IMAGE_LOCATION, (key,)).fetchone()
+            if location is not None:
+                return self._pack_store.read(*location)
+        # Individual files, including images saved before switching to packs
+        try:
+            with open(self._file_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _file_path(self, filename):
+        """
+        Returns the path of an image saved as an individual file.
+        """
+        return os.path.join(self._save_dir or os.environ.get("DETECTION_IMAGE_DIR", "detected_smiles"), os.path.basename(filename))
+
+    def stats(self):
+        """
+        Returns writer counters.
+        Returns:
+            dict: {"queued", "written", "dropped", "pending"}
+        """
+        with self._cond:
+            return {
+                "queued": self.queued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "pending": len(self._pending),
+            }
+
+    def stop(self, timeout=5.0):
+        """
+        Saves all queued images and stops the writer thread (call on shutdown).
+        """
+        with self._cond:
+            if not self._running:
+                return False
+            self._running = False
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        thread.join(timeout)
+        if self._pack_store is not None:
+            self._pack_store.close()
+        return True
+
+    def _run(self):
+        """
+        Writer thread: saves queued images until stopped and drained,
+        and applies pack retention periodically.
+        """
+        while True:
+            item = None
+            with self._cond:
+                if self._running and not self._pending:
+                    self._cond.wait(timeout=self.RETENTION_INTERVAL)
+                if self._pending:
+                    item = self._pending.popleft()
+                    self._cond.notify_all()  # Wake submitters blocked on a full queue
+                elif not self._running:
+                    return
+            if item is not None and self._save(*item):
+                with self._cond:
+                    self.written += 1
+            self._apply_retention()
+
+    def _save(self, image_bytes, timestamp, filename):
+        """
+        Saves one image as a file, or appends it to the pack store and indexes its location.
+        Returns a truthy value on success.
+        """
+        if self._pack_store is None:
+            return save_detection_image(image_bytes, self._save_dir, timestamp=timestamp, filename=filename)
+        key = filename or detection_image_filename(timestamp)
+        try:
+            with metrics.time_stage("image_write"):
+                location = self._pack_store.append(image_bytes)
+        except OSError as e:
+            logging.error(f"[DetectionEvent] Failed to append detected smile image to pack: {e}")
+            return None
+        if self._event_writer is not None:
+            self._event_writer.submit_image_location(key, *location)
+        return location
+
+    def _apply_retention(self):
+        """
+        Deletes expired packs (at most every RETENTION_INTERVAL seconds) and their index rows.
+        """
+        if self._pack_store is None or time.monotonic() < self._next_retention:
+            return
+        self._next_retention = time.monotonic() + self.RETENTION_INTERVAL
+        for pack_id in self._pack_store.enforce_retention():
+            if self._event_writer is not None:
+                self._event_writer.submit_pack_deletion(pack_id)
+
+# Shared image writer used by the detection pipelines
+detection_image_writer = DetectionImageWriter(event_writer=detection_event_writer)
@@ -0,0 +1,148 @@
+"""
+Detection History Queries.
+Read side of the normalized detection schema: keyset-paginated history and
+per-camera aggregates computed in SQLite, so reports never load or parse the whole table.
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+
+BUCKET_SECONDS = {"minute": 60, "hour": 3600}
+
+def open_history_db(db_path=None):
+    """
+    Opens a read-only connection for history queries. No DDL runs here: the schema is
+    created (and a legacy table migrated) once at startup by init_detection_db().
+
+    Args:
+        db_path (str): Path to SQLite DB file (default SMILE_DB_PATH or "smiles.db").
+    Returns:
+        sqlite3.Connection: Open connection; the caller closes it.
+    Raises:
+        sqlite3.OperationalError: If the database does not exist.
+    """
+    path = Path(db_path or os.environ.get("SMILE_DB_PATH", "smiles.db")).absolute()
+    return sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True)
+
+def encode_cursor(timestamp, event_id):
+    """
+    Returns the opaque cursor pointing just after the given event.
+    """
+    return f"{timestamp!r}_{event_id}"
+
+def decode_cursor(cursor):
+    """
+    Parses a cursor produced by encode_cursor.
+    Returns:
+        tuple: (timestamp, event_id)
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    timestamp, _, event_id = cursor.rpartition("_")
+    return float(timestamp), int(event_id)
+
+def _time_filters(camera_id, start, end):
+    """
+    Builds the WHERE clauses and parameters shared by history queries.
+    """
+    clauses, params = [], []
+    if camera_id is not None:
+        clauses.append("camera_id = ?")
+        params.append(camera_id)
+    if start is not None:
+        clauses.append("ts >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("ts < ?")
+        params.append(end)
+    return clauses, params
+
+def list_detections(conn, camera_id=None, start=None, end=None, cursor=None, limit=100):
+    """
+    Returns one page of detection events, newest first.
+    Pages are addressed by (timestamp, id) keys rather than offsets, so each page
+    is an index range scan no matter how deep the client has paged.
+
+    Args:
+        conn (sqlite3.Connection): Open connection.
+        camera_id (str, optional): Only this camera's events.
+        start (float, optional): Inclusive lower bound (epoch seconds).
+        end (float, optional): Exclusive upper bound (epoch seconds).
+        cursor (str, optional): next_cursor from the previous page.
+        limit (int): Maximum events per page.
+    Returns:
+        dict: {"items": [{"id", "camera_id", "timestamp", "coords", "has_image"}], "next_cursor": str or None}
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    clauses, params = _time_filters(camera_id, start, end)
+    if cursor is not None:
+        clauses.append("(ts, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(
+        f"SELECT id, camera_id, ts, image_key FROM detection_events {where} ORDER BY ts DESC, id DESC LIMIT ?",
+        params + [limit + 1],
+    ).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+
+    coords = {row[0]: [] for row in rows}
+    if coords:
+        placeholders = ",".join("?" * len(coords))
+        for event_id, x, y, w, h in conn.execute(
+            f"SELECT event_id, x, y, w, h FROM detection_boxes WHERE event_id IN ({placeholders}) ORDER BY id",
+            list(coords),
+        ):
+            coords[event_id].append({"x": x, "y": y, "w": w, "h": h})
+
+    items = [
+        {"id": event_id, "camera_id": camera, "timestamp": ts, "coords": coords[event_id], "has_image": image_key is not None}
+        for event_id, camera, ts, image_key in rows
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+def get_image_key(conn, event_id):
+    """
+    Returns the image key recorded with a detection event, or None.
+    """
+    row = conn.execute("SELECT image_key FROM detection_events WHERE id = ?", (event_id,)).fetchone()
+    return row[0] if row else None
+
+def aggregate_detections(conn, bucket="minute", camera_id=None, start=None, end=None):
+    """
+    Counts detection events and smiles per time bucket and camera.
+
+    Args:
+        conn (sqlite3.Connection): Open connection.
+        bucket (str): "minute" or "hour".
+        camera_id (str, optional): Only this camera's events.
+        start (float, optional): Inclusive lower bound (epoch seconds).
+        end (float, optional): Exclusive upper bound (epoch seconds).
+    Returns:
+        list: [{"camera_id", "bucket_start", "detections", "smiles"}] ordered by bucket, then camera.
+    Raises:
+        ValueError: If the bucket is unknown.
+    """
+    if bucket not in BUCKET_SECONDS:
+        raise ValueError(f"Unknown bucket: {bucket}")
+    seconds = BUCKET_SECONDS[bucket]
+    clauses, params = _time_filters(camera_id, start, end)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(
+        f"""
+        SELECT camera_id, CAST(ts / {seconds} AS INTEGER) * {seconds} AS bucket_start,
+               COUNT(*), SUM(box_count)
+        FROM detection_events {where}
+        GROUP BY camera_id, bucket_start
+        ORDER BY bucket_start, camera_id
+        """,
+        params,
+    ).fetchall()
+    return [
+        {"camera_id": camera, "bucket_start": bucket_start, "detections": detections, "smiles": smiles}
+        for camera, bucket_start, detections, smiles in rows
+    ]
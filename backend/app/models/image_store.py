@@ -0,0 +1,177 @@
+"""
+Image Pack Store.
+Optional storage backend for detection images: JPEGs are appended to rolling
+pack files instead of being written as one file each. An image is addressed by
+(pack_id, offset, length); the detection database keeps that offset index.
+Reads are memory-mapped, and retention deletes whole packs, so neither depends
+on how many images have been stored.
+
+Enable with IMAGE_STORE=pack.
+"""
+
+import os
+import re
+import mmap
+import time
+import logging
+import threading
+
+PACK_NAME = re.compile(r"^pack_(\d{8})\.pack$")
+
+class ImagePackStore:
+    """
+    Append-only store of images in rolling pack files.
+    append() must only be called from a single writer thread; read() is safe from any thread.
+    """
+
+    def __init__(self, directory, max_pack_bytes=64 * 1024 * 1024, max_total_bytes=0, max_age=0):
+        """
+        Args:
+            directory (str): Directory holding the pack files.
+            max_pack_bytes (int): Start a new pack once the current one would exceed this size.
+            max_total_bytes (int): Delete the oldest packs while all packs exceed this size (0 = no limit).
+            max_age (float): Delete packs last written more than this many seconds ago (0 = no limit).
+        """
+        self.directory = directory
+        self.max_pack_bytes = max_pack_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+        # pack_id -> [size, last write time]; only packs are listed, never images
+        self._packs = {}
+        for name in os.listdir(directory):
+            match = PACK_NAME.match(name)
+            if match:
+                stat = os.stat(os.path.join(directory, name))
+                self._packs[int(match.group(1))] = [stat.st_size, stat.st_mtime]
+        self._current_id = max(self._packs, default=0)
+        self._current = None  # Open append handle of the current pack
+        self._maps = {}       # pack_id -> mmap used by readers
+        self._lock = threading.Lock()
+
+    def pack_path(self, pack_id):
+        """
+        Returns the file path of a pack.
+        """
+        return os.path.join(self.directory, f"pack_{pack_id:08d}.pack")
+
+    def append(self, image_bytes):
+        """
+        Appends one image to the current pack, rolling over to a new pack when it is full.
+
+        Args:
+            image_bytes (bytes): Encoded image.
+        Returns:
+            tuple: (pack_id, offset, length) locating the image.
+        """
+        with self._lock:
+            size = self._packs.get(self._current_id, [0])[0]
+            if self._current is None or (size and size + len(image_bytes) > self.max_pack_bytes):
+                self._roll()
+            pack_id = self._current_id
+            offset = self._packs[pack_id][0]
+        self._current.write(image_bytes)
+        self._current.flush()  # Readers map the file, so data must reach it before the index row does
+        with self._lock:
+            self._packs[pack_id] = [offset + len(image_bytes), time.time()]
+        return pack_id, offset, len(image_bytes)
+
+    def read(self, pack_id, offset, length):
+        """
+        Reads one image through a memory map of its pack.
+
+        Returns:
+            bytes or None: Image data, or None if the pack has been deleted or is too short.
+        """
+        with self._lock:
+            if pack_id not in self._packs:
+                return None
+            mapped = self._maps.get(pack_id)
+            if mapped is None or len(mapped) < offset + length:
+                # Not mapped yet, or mapped before this image was appended
+                if mapped is not None:
+                    mapped.close()
+                try:
+                    with open(self.pack_path(pack_id), "rb") as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    self._maps.pop(pack_id, None)
+                    return None
+                self._maps[pack_id] = mapped
+            if len(mapped) < offset + length:
+                return None
+            return mapped[offset:offset + length]
+
+    def enforce_retention(self, now=None):
+        """
+        Deletes whole packs older than max_age, then the oldest packs while the total exceeds max_total_bytes.
+        The pack currently being appended to is never deleted.
+
+        Returns:
+            list: IDs of the deleted packs.
+        """
+        now = now or time.time()
+        with self._lock:
+            candidates = sorted(pack_id for pack_id in self._packs if pack_id != self._current_id)
+            total = sum(size for size, _ in self._packs.values())
+            expired = []
+            for pack_id in candidates:
+                size, written = self._packs[pack_id]
+                too_old = self.max_age and now - written > self.max_age
+                too_big = self.max_total_bytes and total > self.max_total_bytes
+                if not (too_old or too_big):
+                    continue
+                expired.append(pack_id)
+                total -= size
+                del self._packs[pack_id]
+                mapped = self._maps.pop(pack_id, None)
+                if mapped is not None:
+                    mapped.close()
+        for pack_id in expired:
+            try:
+                os.remove(self.pack_path(pack_id))
+            except OSError:
+                logging.exception(f"[ImageStore] Failed to delete pack {pack_id}")
+        if expired:
+            logging.info(f"[ImageStore] Retention deleted {len(expired)} pack(s)")
+        return expired
+
+    def close(self):
+        """
+        Closes the append handle and all reader maps.
+        """
+        with self._lock:
+            if self._current is not None:
+                self._current.close()
+                self._current = None
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps = {}
+
+    def _roll(self):
+        """
+        Opens the next pack for appending (called with the lock held).
+        """
+        if self._current is not None:
+            self._current.close()
+        if self._current_id not in self._packs or self._packs[self._current_id][0]:
+            self._current_id += 1
+        self._current = open(self.pack_path(self._current_id), "ab")
+        self._packs[self._current_id] = [0, time.time()]
+
+def create_image_pack_store():
+    """
+    Creates an ImagePackStore when IMAGE_STORE=pack, from IMAGE_PACK_DIR, IMAGE_PACK_SIZE_MB,
+    IMAGE_RETENTION_MB and IMAGE_RETENTION_DAYS.
+    Returns:
+        ImagePackStore or None: None when images are saved as individual files.
+    """
+    if os.environ.get("IMAGE_STORE", "files") != "pack":
+        return None
+    megabyte = 1024 * 1024
+    return ImagePackStore(
+        os.environ.get("IMAGE_PACK_DIR") or os.path.join(os.environ.get("DETECTION_IMAGE_DIR", "detected_smiles"), "packs"),
+        max_pack_bytes=int(float(os.environ.get("IMAGE_PACK_SIZE_MB", 64)) * megabyte),
+        max_total_bytes=int(float(os.environ.get("IMAGE_RETENTION_MB", 0)) * megabyte),
+        max_age=float(os.environ.get("IMAGE_RETENTION_DAYS", 0)) * 86400,
+    )
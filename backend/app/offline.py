@@ -0,0 +1,265 @@
+"""
+Offline Smile Detection.
+Command-line entry point that scores a recorded video file or a directory of
+images instead of a live camera. Long inputs are split into chunks scored by
+parallel worker processes, and detections are stored in bulk.
+
+Usage:
+    python -m app.offline recording.mp4 --stride 5 --workers 4
+    python -m app.offline snapshots/ --camera-id lobby
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+
+from app.logger import setup_logger
+from app.models.detection_event import ensure_schema, insert_detection_events
+from app.services.face_tracker import create_face_tracker
+from app.services.smile_detector import detect_smile_on_frame
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def plan_chunks(total, chunk_size):
+    """
+    Splits [0, total) into consecutive (start, end) ranges of at most chunk_size items.
+    """
+    return [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+
+def _detect(frame, face_tracker):
+    """
+    Returns the smile coords of one frame ([] if none), without drawing or encoding.
+    """
+    result = detect_smile_on_frame(frame, encode_image=False, face_tracker=face_tracker)
+    return result[1] if result is not None else []
+
+def process_video_chunk(path, start, end, stride):
+    """
+    Worker task: scores every stride-th frame of frames [start, end) of a video.
+    Skipped frames are only grabbed (demuxed), never decoded.
+    Frames are timed by their position in the stream (CAP_PROP_POS_MSEC), which stays
+    correct when a seek lands on a nearby keyframe or the frame rate varies.
+
+    Returns:
+        tuple: (frames scored, [(seconds from the start of the video, coords), ...] for frames with smiles)
+    """
+    capture = cv2.VideoCapture(path)
+    try:
+        if start:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        face_tracker = create_face_tracker()  # Consecutive frames of one chunk form a stream
+        scored, detections = 0, []
+        for index in range(start, end):
+            if index % stride:
+                if not capture.grab():
+                    break
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            scored += 1
+            coords = _detect(frame, face_tracker)
+            if coords:
+                msec = capture.get(cv2.CAP_PROP_POS_MSEC)  # Timestamp of the frame just read
+                detections.append((msec / 1000.0 if msec > 0 or index == 0 else index / fps, coords))
+        return scored, detections
+    finally:
+        capture.release()
+
+def process_image_chunk(paths, first_index):
+    """
+    Worker task: scores a list of image files.
+
+    Returns:
+        tuple: (images scored, [(index, coords), ...] for images with smiles; index counts from first_index)
+    """
+    scored, detections = 0, []
+    for offset, path in enumerate(paths):
+        frame = cv2.imread(path)
+        if frame is None:
+            logging.warning(f"[Offline] Could not read image {path}")
+            continue
+        scored += 1
+        coords = _detect(frame, None)
+        if coords:
+            detections.append((first_index + offset, coords))
+    return scored, detections
+
+class BulkDetectionStore:
+    """
+    Writes detections to the detection database in large transactions.
+    """
+
+    def __init__(self, db_path, batch_size=1000):
+        """
+        Args:
+            db_path (str): Path to SQLite DB file.
+            batch_size (int): Detections per transaction.
+        """
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        ensure_schema(self._conn)
+        self._batch_size = batch_size
+        self._pending = []
+        self.written = 0
+
+    def add(self, camera_id, timestamp, coords):
+        """
+        Queues one detection, committing once batch_size detections are pending.
+        """
+        self._pending.append((camera_id, timestamp, coords, None))
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Commits all pending detections in one transaction.
+        """
+        if not self._pending:
+            return
+        with self._conn:
+            insert_detection_events(self._conn, self._pending)
+        self.written += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        """
+        Commits pending detections and closes the connection.
+        """
+        self.flush()
+        self._conn.close()
+
+def _list_images(directory):
+    """
+    Returns the image files of a directory, sorted by name.
+    """
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+def _plan(source, stride, chunk_size, start_time):
+    """
+    Builds the worker tasks for a source and a function mapping result positions to timestamps.
+    Image results are indexes; video results are seconds from the start of the video.
+
+    Returns:
+        tuple: (tasks as (function, args) pairs, expected frames to score, position -> epoch seconds)
+    """
+    if os.path.isdir(source):
+        images = _list_images(source)[::stride]
+        tasks = [(process_image_chunk, (images[start:end], start)) for start, end in plan_chunks(len(images), chunk_size)]
+        return tasks, len(images), lambda index: os.path.getmtime(images[index])
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video source: {source}")
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    capture.release()
+    if start_time is None:
+        # The modification time is when the recording ended: go back by its duration
+        start_time = os.path.getmtime(source) - max(total, 0) / fps
+        if total <= 0:
+            logging.warning(f"[Offline] Unknown length of {source}; timestamps start at its modification time, pass --start-time")
+    if total <= 0:
+        # Unknown length (e.g., some streams): cannot seek into chunks, score sequentially
+        return [(process_video_chunk, (source, 0, sys.maxsize, stride))], None, lambda seconds: start_time + seconds
+    tasks = [(process_video_chunk, (source, start, end, stride)) for start, end in plan_chunks(total, chunk_size)]
+    return tasks, len(range(0, total, stride)), lambda seconds: start_time + seconds
+
+def run(source, db_path=None, camera_id=None, stride=1, workers=1, chunk_size=None, batch_size=1000, start_time=None):
+    """
+    Scores a video file or image directory and stores its detections.
+
+    Args:
+        source (str): Video file path or directory of images.
+        db_path (str): Detection database (default SMILE_DB_PATH or "smiles.db").
+        camera_id (str): Camera ID to store detections under (default: source file/directory name).
+        stride (int): Score every stride-th frame/image.
+        workers (int): Worker processes; 1 scores in this process.
+        chunk_size (int): Frames (images) per task (default: 1000 frames or 100 images).
+        batch_size (int): Detections per database transaction.
+        start_time (float): Epoch time of the first video frame (default: the file's modification
+            time minus the video's duration).
+            Images are stamped with their own modification times.
+    Returns:
+        dict: {"scored", "detections", "seconds", "fps"}
+    """
+    stride = max(int(stride), 1)
+    chunk_size = chunk_size or (100 if os.path.isdir(source) else 1000)
+    camera_id = camera_id or os.path.basename(os.path.normpath(source))
+    tasks, expected, timestamp_of = _plan(source, stride, chunk_size, start_time)
+    store = BulkDetectionStore(db_path or os.environ.get("SMILE_DB_PATH", "smiles.db"), batch_size=batch_size)
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    started = time.perf_counter()
+    scored = detections = 0
+    try:
+        if executor is None:
+            results = (func(*args) for func, args in tasks)
+        else:
+            results = (future.result() for future in as_completed([executor.submit(func, *args) for func, args in tasks]))
+        for chunk_scored, chunk_detections in results:
+            for position, coords in chunk_detections:
+                store.add(camera_id, timestamp_of(position), coords)
+            scored += chunk_scored
+            detections += len(chunk_detections)
+            elapsed = time.perf_counter() - started
+            progress = f"{scored}/{expected} frames ({scored * 100 // max(expected, 1)}%)" if expected else f"{scored} frames"
+            logging.info(f"[Offline] {progress}, {detections} with smiles, {scored / max(elapsed, 1e-9):.1f} fps")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        store.close()
+    seconds = time.perf_counter() - started
+    return {"scored": scored, "detections": detections, "seconds": seconds, "fps": scored / max(seconds, 1e-9)}
+
+def main(argv=None):
+    """
+    Command-line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Score a recorded video file or an image directory for smiles.")
+    parser.add_argument("source", help="Video file or directory of images")
+    parser.add_argument("--db", help="Detection database (default SMILE_DB_PATH or smiles.db)")
+    parser.add_argument("--camera-id", help="Camera ID to store detections under (default: source name)")
+    parser.add_argument("--stride", type=int, default=1, help="Score every Nth frame (default 1)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, help="Frames (images) per worker task")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Detections per database transaction")
+    parser.add_argument("--start-time", type=float, help="Epoch time of the first video frame (default: file mtime minus the video duration)")
+    args = parser.parse_args(argv)
+
+    setup_logger()
+    try:
+        summary = run(
+            args.source,
+            db_path=args.db,
+            camera_id=args.camera_id,
+            stride=args.stride,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            batch_size=args.batch_size,
+            start_time=args.start_time,
+        )
+    except (ValueError, OSError) as e:
+        logging.error(f"[Offline] {e}")
+        return 1
+    logging.info(
+        f"[Offline] Done: {summary['scored']} frames scored, {summary['detections']} with smiles, "
+        f"{summary['seconds']:.1f}s ({summary['fps']:.1f} fps)"
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Upload Detection API Endpoints.
+Scores client-supplied images: one raw frame per request (e.g., from a camera in the
+user's browser or on another machine), or many uploaded still images in a single request.
+"""
+
+from fastapi import APIRouter, Body, File, Response, UploadFile, status
+from fastapi.responses import JSONResponse
+from app.services.smile_detector import detect_smiles_in_images, detect_smile_on_frame, decode_image, DECODE_REDUCTIONS
+from app.services.process_detector import get_process_detector
+from app.services.metrics import metrics, server_timing
+import logging
+import json
+import os
+import time
+
+router = APIRouter()
+
+@router.post("/detect_smile/batch", tags=["Detection"])
+def detect_smile_batch(files: list[UploadFile] = File(...)):
+    """
+    Endpoint to detect smiles in many uploaded images (multipart field `files`).
+    Images are decoded and scored in parallel; nothing is logged or saved.
+    Returns:
+        - 200: {"results": [{"filename", "coords"} or {"filename", "error"}, ...]} in upload order
+        - 413: Too many images in one request (limit: MAX_BATCH_IMAGES, default 100)
+        - 500: Internal server error on failure
+    """
+    max_images = int(os.environ.get("MAX_BATCH_IMAGES", 100))
+    if len(files) > max_images:
+        return JSONResponse(status_code=413, content={"error": f"At most {max_images} images per batch"})
+    try:
+        images = [upload.file.read() for upload in files]
+        engine = get_process_detector()
+        detections = engine.detect_encoded(images) if engine else detect_smiles_in_images(images)
+        results = []
+        for upload, coords in zip(files, detections):
+            if coords is None:
+                results.append({"filename": upload.filename, "error": "Could not decode image"})
+            else:
+                results.append({"filename": upload.filename, "coords": coords})
+        return {"results": results}
+    except Exception:
+        logging.exception("[Batch] Exception in /detect_smile/batch")
+        return JSONResponse(status_code=500, content={"error": "Unexpected error during batch detection"})
+
+@router.post("/detect_smile", tags=["Detection"])
+def detect_smile_upload(
+    image: bytes = Body(..., media_type="image/jpeg"),
+    reduce: int = 1,
+    gray: bool = False,
+    annotate: bool = False,
+):
+    """
+    Endpoint to detect smiles in one client-supplied frame, sent as the raw request body
+    (Content-Type image/jpeg, image/png or application/octet-stream). Nothing is logged or saved.
+    The body is decoded in place, without copying it first. With `reduce=2|4|8` the image is decoded
+    straight to 1/reduce of its size, and with `gray=true` straight to grayscale (only the DNN face backend uses colour).
+    JSON coordinates refer to the uploaded image (scaled back from a reduced decode); with
+    `annotate=true` they refer to the returned JPEG, and X-Smile-Coords-Scale gives the factor
+    (reduce) to multiply them by for the uploaded image.
+    Returns:
+        - 200: {"coords": [...]} ([] if no smile), or with `annotate=true` the JPEG (at decode
+          resolution) with smile boxes drawn, coords in X-Smile-Coords and X-Smile-Coords-Scale
+        - 204: No Content if `annotate=true` and no smile detected
+        - 400: Body is not a decodable image, or reduce is not 1, 2, 4 or 8
+        - 500: Internal server error on failure
+    """
+    started = time.perf_counter()
+    if reduce not in DECODE_REDUCTIONS:
+        return JSONResponse(status_code=400, content={"error": f"reduce must be one of {list(DECODE_REDUCTIONS)}"})
+    try:
+        with metrics.collect_timings() as timings:
+            with metrics.time_stage("decode"):
+                frame = decode_image(image, reduce=reduce, gray=gray)
+            if frame is None:
+                return JSONResponse(status_code=400, content={"error": "Could not decode image"})
+            engine = get_process_detector()
+            if engine is not None:
+                result = engine.detect(frame, encode_image=annotate)
+            else:
+                result = detect_smile_on_frame(frame, encode_image=annotate)
+        jpeg, coords = result if result is not None else (None, [])
+        headers = {}
+        if os.environ.get("SERVER_TIMING", "0").lower() in ("1", "true", "yes"):
+            headers["Server-Timing"] = server_timing(timings, app=time.perf_counter() - started)
+        if not annotate:
+            coords = [{key: value * reduce for key, value in box.items()} for box in coords]
+            return JSONResponse(content={"coords": coords}, headers=headers)
+        if not coords:
+            return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
+        # Boxes are drawn on the decoded image: keep its coordinates, and say how to scale them
+        headers["X-Smile-Coords"] = json.dumps(coords)
+        headers["X-Smile-Coords-Scale"] = str(reduce)
+        return Response(content=jpeg, media_type="image/jpeg", headers=headers)
+    except Exception:
+        logging.exception("[Upload] Exception in POST /detect_smile")
+        return JSONResponse(status_code=500, content={"error": "Unexpected error during detection"})
@@ -1,81 +1,280 @@
 """
 Camera API Endpoints.
-Provides endpoints to start/stop camera and detect smiles in real-time video frames.
+Provides endpoints to start/stop cameras and detect smiles in real-time video frames,
+either by polling or over a push-based WebSocket stream.
+Every endpoint exists per camera ID under /cameras/{camera_id}/...; the original
+unprefixed endpoints operate on the default camera.
 """
 
-from fastapi import APIRouter, Response, status
+from fastapi import APIRouter, Header, Response, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import JSONResponse
-from app.services.camera_manager import camera_manager
-from app.services.smile_detector import detect_smile_on_frame
-from app.models.detection_event import log_detection_event, save_detection_image
+from app.services.camera_manager import camera_manager, camera_registry
+from app.services.detection_pipeline import detection_pipeline, pipeline_registry
+from app.services.metrics import server_timing
+from app.services.single_flight import Overloaded
+import asyncio
 import logging
 import json
+import os
+import time
 
 router = APIRouter()
 
-@router.post("/start_camera", tags=["Camera"])
-def start_camera():
+CAMERA_NOT_FOUND = {"error": "Camera not found"}
+
+def _start_camera(camera, source=None):
     """
-    Endpoint to start the webcam for smile detection.
-    Returns:
-        200 OK if started, 409 Conflict if already running, 500 on error.
+    Starts a camera and maps the outcome to an API response.
     """
     try:
-        result = camera_manager.start()
+        result = camera.start() if source is None else camera.start(source=source)
         if result:
             return {"status": "Camera started"}
-        elif camera_manager.is_running():
+        elif camera.is_running():
             return JSONResponse(status_code=409, content={"error": "Camera already running"})
         else:
             return JSONResponse(status_code=500, content={"error": "Failed to start camera"})
     except Exception:
-        logging.exception("[Camera] Exception in /start_camera")
+        logging.exception("[Camera] Exception while starting camera")
         return JSONResponse(status_code=500, content={"error": "Unexpected error while starting camera"})
 
-@router.post("/stop_camera", tags=["Camera"])
-def stop_camera():
+@router.post("/start_camera", tags=["Camera"])
+def start_camera():
     """
-    Endpoint to stop the webcam and release resources.
+    Endpoint to start the default webcam for smile detection.
     Returns:
-        200 OK if stopped, 409 Conflict if already stopped.
+        200 OK if started, 409 Conflict if already running, 500 on error.
+    """
+    return _start_camera(camera_manager)
+
+@router.get("/cameras", tags=["Camera"])
+def list_cameras():
+    """
+    Endpoint to list registered cameras and whether they are running.
+    Returns:
+        dict: {"cameras": [{"id", "running"}, ...]}
+    """
+    cameras = []
+    for camera_id in camera_registry.ids():
+        camera = camera_registry.get(camera_id)
+        cameras.append({"id": camera_id, "running": camera.is_running()})
+    return {"cameras": cameras}
+
+@router.post("/cameras/{camera_id}/start", tags=["Camera"])
+def start_camera_by_id(camera_id: str, source: str | None = None):
+    """
+    Endpoint to start a camera by ID, registering it on first use.
+    `source` may be a device index, a video file path or a stream URL;
+    numeric camera IDs default to the matching device index.
+    Returns:
+        200 OK if started, 400 if no source is known, 409 if already running, 500 on error.
+    """
+    camera = camera_registry.get_or_create(camera_id, source)
+    if camera is None:
+        return JSONResponse(status_code=400, content={"error": "Camera source required"})
+    return _start_camera(camera, source)
+
+def _stop_camera(camera, pipeline):
+    """
+    Stops a camera, clears its cached detection result and maps the outcome to an API response.
     """
     try:
-        result = camera_manager.stop()
+        result = camera.stop()
         if result:
+            pipeline.reset()
             return {"status": "Camera stopped"}
         else:
             return JSONResponse(status_code=409, content={"error": "Camera already stopped"})
     except Exception:
-        logging.exception("[Camera] Exception in /stop_camera")
+        logging.exception("[Camera] Exception while stopping camera")
         return JSONResponse(status_code=500, content={"error": "Unexpected error while stopping camera"})
 
-@router.get("/detect_smile", tags=["Detection"])
-def detect_smile():
+@router.post("/stop_camera", tags=["Camera"])
+def stop_camera():
     """
-    Endpoint to detect smile in the current camera frame.
+    Endpoint to stop the default webcam and release resources.
     Returns:
-        - 200: JPEG image with smile coordinates in headers (if detected)
-        - 204: No Content if no smile detected or no frame available
-        - 409: Error if camera is not started
-        - 500: Internal server error on failure
+        200 OK if stopped, 409 Conflict if already stopped.
+    """
+    return _stop_camera(camera_manager, detection_pipeline)
+
+@router.post("/cameras/{camera_id}/stop", tags=["Camera"])
+def stop_camera_by_id(camera_id: str):
+    """
+    Endpoint to stop a camera by ID and release its resources.
+    Returns:
+        200 OK if stopped, 404 if unknown, 409 Conflict if already stopped.
     """
+    camera = camera_registry.get(camera_id)
+    if camera is None:
+        return JSONResponse(status_code=404, content=CAMERA_NOT_FOUND)
+    return _stop_camera(camera, pipeline_registry.get(camera_id))
+
+def _etag_matches(if_none_match, etag):
+    """
+    Returns True if an If-None-Match header matches an ETag: "*", or any tag of the
+    comma-separated list, compared weakly (a W/ prefix is ignored, RFC 9110).
+    """
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == opaque:
+            return True
+    return False
+
+def _detect_smile(camera, pipeline, since, if_none_match, fresh=False):
+    """
+    Serves the cached detection result of a camera's pipeline, honouring conditional requests.
+    With fresh=True the newest captured frame is detected on demand (shared with concurrent
+    requests for the same frame); under overload the cached result is served instead, marked
+    with X-Result-Stale, or 503 is returned if DETECTION_OVERLOAD_POLICY=reject. A client that
+    already has the newest captured frame gets its 304 before any detection runs.
+    With SERVER_TIMING=1, a Server-Timing header reports the detection stages of the
+    served frame and the time spent in this request ("app").
+    """
+    started = time.perf_counter()
     try:
-        if not camera_manager.is_running():
+        if not camera.is_running():
             return JSONResponse(status_code=409, content={"error": "Camera not started"})
-        frame = camera_manager.get_frame()
-        if frame is None:
-            return Response(status_code=status.HTTP_204_NO_CONTENT)
-        result = detect_smile_on_frame(frame)
+        stale = False
+        if fresh:
+            seq, timestamp = pipeline.newest_frame_info()
+            if seq and (_etag_matches(if_none_match, f'"{seq}"') or (since is not None and seq <= since)):
+                headers = {"ETag": f'"{seq}"', "X-Frame-Seq": str(seq), "X-Frame-Timestamp": str(timestamp)}
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            try:
+                result = pipeline.detect_now()
+            except Overloaded:
+                if os.environ.get("DETECTION_OVERLOAD_POLICY", "stale") == "reject":
+                    return JSONResponse(status_code=503, content={"error": "Detection overloaded"}, headers={"Retry-After": "1"})
+                result, stale = pipeline.get_latest(), True
+        else:
+            result = pipeline.get_latest()
         if result is None:
             return Response(status_code=status.HTTP_204_NO_CONTENT)
-        image_bytes, coords = result
-        log_detection_event(coords)
-        save_detection_image(image_bytes)
+        headers = {
+            "ETag": f'"{result["seq"]}"',
+            "X-Frame-Seq": str(result["seq"]),
+            "X-Frame-Timestamp": str(result["timestamp"]),
+        }
+        if stale:
+            headers["X-Result-Stale"] = "1"
+        if os.environ.get("SERVER_TIMING", "0").lower() in ("1", "true", "yes"):
+            headers["Server-Timing"] = server_timing(result.get("timings"), app=time.perf_counter() - started)
+        if _etag_matches(if_none_match, headers["ETag"]) or (since is not None and result["seq"] <= since):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        if not result["coords"]:
+            return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
+        headers["X-Smile-Coords"] = json.dumps(result["coords"])
         return Response(
-            content=image_bytes,
+            content=result["image"],
             media_type="image/jpeg",
-            headers={"X-Smile-Coords": json.dumps(coords)}
+            headers=headers
         )
     except Exception:
-        logging.exception("[Camera] Exception in /detect_smile")
+        logging.exception("[Camera] Exception during detection")
         return JSONResponse(status_code=500, content={"error": "Unexpected error during detection"})
+
+@router.get("/detect_smile", tags=["Detection"])
+def detect_smile(
+    since: int | None = None,
+    fresh: bool = False,
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    Endpoint to fetch the latest smile detection result for the default camera.
+    Detection runs once per captured frame in the background pipeline;
+    this endpoint only returns the cached result.
+    Clients can skip frames they already have by sending the last `ETag`
+    in `If-None-Match`, or the last `X-Frame-Seq` as the `since` query parameter.
+    With `fresh=true` the newest captured frame is detected on demand; concurrent
+    requests for the same frame share one detection.
+    Returns:
+        - 200: JPEG image with smile coordinates and frame identity in headers (if detected)
+        - 204: No Content if no smile detected or no frame processed yet
+        - 304: Not Modified if the client already has the latest processed frame
+        - 409: Error if camera is not started
+        - 503: Too many on-demand detections in flight (DETECTION_OVERLOAD_POLICY=reject)
+        - 500: Internal server error on failure
+    """
+    return _detect_smile(camera_manager, detection_pipeline, since, if_none_match, fresh)
+
+@router.get("/cameras/{camera_id}/detect_smile", tags=["Detection"])
+def detect_smile_by_id(
+    camera_id: str,
+    since: int | None = None,
+    fresh: bool = False,
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    Endpoint to fetch the latest smile detection result for a camera by ID.
+    Same parameters and responses as /detect_smile, plus 404 for an unknown camera.
+    """
+    camera = camera_registry.get(camera_id)
+    if camera is None:
+        return JSONResponse(status_code=404, content=CAMERA_NOT_FOUND)
+    return _detect_smile(camera, pipeline_registry.get(camera_id), since, if_none_match, fresh)
+
+async def _wait_for_disconnect(websocket):
+    """
+    Consumes (and ignores) client messages until the client disconnects.
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+async def _stream_detections(websocket, pipeline, frames):
+    """
+    Pushes a pipeline's detection results to one WebSocket client until it disconnects.
+    """
+    await websocket.accept()
+    subscriber = pipeline.subscribe()
+    disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        while True:
+            next_result = asyncio.create_task(subscriber.get())
+            done, _ = await asyncio.wait({next_result, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                next_result.cancel()
+                logging.info("[Camera] Detection stream client disconnected")
+                break
+            result = next_result.result()
+            await websocket.send_json({
+                "seq": result["seq"],
+                "timestamp": result["timestamp"],
+                "coords": result["coords"],
+            })
+            if frames and result["image"] is not None:
+                await websocket.send_bytes(result["image"])
+    except WebSocketDisconnect:
+        logging.info("[Camera] Detection stream client disconnected")
+    except Exception:
+        logging.exception("[Camera] Exception in detection stream")
+    finally:
+        disconnected.cancel()
+        pipeline.unsubscribe(subscriber)
+
+@router.websocket("/ws/detect_smile")
+async def detect_smile_stream(websocket: WebSocket, frames: bool = False):
+    """
+    WebSocket endpoint that pushes every detection result of the default camera as it is produced.
+    Each event is a JSON message {"seq", "timestamp", "coords"}; with `?frames=true`
+    a binary JPEG message follows every event that has a smile.
+    Slow clients receive only the newest result; stale ones are dropped, never queued.
+    """
+    await _stream_detections(websocket, detection_pipeline, frames)
+
+@router.websocket("/ws/cameras/{camera_id}/detect_smile")
+async def detect_smile_stream_by_id(websocket: WebSocket, camera_id: str, frames: bool = False):
+    """
+    WebSocket endpoint that pushes every detection result of a camera by ID.
+    Closes with code 4404 if the camera is unknown.
+    """
+    pipeline = pipeline_registry.get(camera_id)
+    if pipeline is None:
+        await websocket.close(code=4404)
+        return
+    await _stream_detections(websocket, pipeline, frames)
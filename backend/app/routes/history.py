@@ -0,0 +1,83 @@
+"""
+Detection History API Endpoints.
+Paginated detection history and per-camera aggregates for dashboards.
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, Response
+from app.models.detection_event import detection_image_writer
+from app.models.detection_history import open_history_db, list_detections, aggregate_detections, get_image_key, BUCKET_SECONDS
+import logging
+
+router = APIRouter()
+
+MAX_PAGE_SIZE = 1000
+
+@router.get("/detections", tags=["History"])
+def get_detections(camera_id: str = None, start: float = None, end: float = None, cursor: str = None, limit: int = 100):
+    """
+    Endpoint to page through saved detection events, newest first.
+    Pass the returned next_cursor to fetch the following page.
+    Returns:
+        - 200: {"items": [{"id", "camera_id", "timestamp", "coords", "has_image"}], "next_cursor": str or null}
+        - 400: Invalid cursor or limit
+        - 500: Internal server error on failure
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return JSONResponse(status_code=400, content={"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"})
+    try:
+        conn = open_history_db()
+        try:
+            return list_detections(conn, camera_id=camera_id, start=start, end=end, cursor=cursor, limit=limit)
+        finally:
+            conn.close()
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Invalid cursor"})
+    except Exception:
+        logging.exception("[History] Exception in /detections")
+        return JSONResponse(status_code=500, content={"error": "Unexpected error while reading detections"})
+
+@router.get("/detections/aggregate", tags=["History"])
+def get_detection_aggregates(bucket: str = "minute", camera_id: str = None, start: float = None, end: float = None):
+    """
+    Endpoint to count detections and smiles per minute or hour, per camera.
+    Returns:
+        - 200: {"bucket", "results": [{"camera_id", "bucket_start", "detections", "smiles"}]}
+        - 400: Unknown bucket
+        - 500: Internal server error on failure
+    """
+    if bucket not in BUCKET_SECONDS:
+        return JSONResponse(status_code=400, content={"error": f"bucket must be one of {', '.join(BUCKET_SECONDS)}"})
+    try:
+        conn = open_history_db()
+        try:
+            results = aggregate_detections(conn, bucket=bucket, camera_id=camera_id, start=start, end=end)
+        finally:
+            conn.close()
+        return {"bucket": bucket, "results": results}
+    except Exception:
+        logging.exception("[History] Exception in /detections/aggregate")
+        return JSONResponse(status_code=500, content={"error": "Unexpected error while aggregating detections"})
+
+@router.get("/detections/{event_id}/image", tags=["History"])
+def get_detection_image(event_id: int):
+    """
+    Endpoint to fetch the saved image of a detection event (from its file or pack).
+    Returns:
+        - 200: JPEG image
+        - 404: Unknown event, or its image was not saved or was removed by retention
+        - 500: Internal server error on failure
+    """
+    try:
+        conn = open_history_db()
+        try:
+            key = get_image_key(conn, event_id)
+            image_bytes = detection_image_writer.load(key, conn) if key else None
+        finally:
+            conn.close()
+        if image_bytes is None:
+            return JSONResponse(status_code=404, content={"error": "Image not found"})
+        return Response(content=image_bytes, media_type="image/jpeg")
+    except Exception:
+        logging.exception("[History] Exception in /detections/{event_id}/image")
+        return JSONResponse(status_code=500, content={"error": "Unexpected error while reading detection image"})
@@ -1,83 +1,271 @@
 """
-Camera Manager Singleton.
-Handles background webcam access, frame capture, and clean resource release.
+Camera Manager and Registry.
+Handles background camera access, frame capture, and clean resource release
+for one or more video sources (device indices, video files, stream URLs).
 Intended for real-time smile detection endpoints.
 """
 
 import cv2
+import os
 import threading
 import logging
 import time
+from app.services.frame_buffer import FrameRingBuffer, convert_frame
+from app.services.metrics import metrics
+
+DEFAULT_CAMERA_ID = "default"
+FAILED_READ_DELAY = 0.03  # Seconds to wait before retrying after a failed read
+STOP_TIMEOUT = 2.0        # Seconds stop() waits for the capture thread to exit
+
+def parse_source(source):
+    """
+    Normalizes a video source: numeric strings become device indices,
+    anything else (file path, stream URL) is passed to OpenCV unchanged.
+    """
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
 
 class CameraManager:
     """
-    Singleton class to manage webcam access and frame capture.
-    Maintains the latest frame in memory and provides thread-safe access.
+    Manages access and frame capture for a single video source.
+    Keeps the last few frames in a preallocated ring buffer and provides thread-safe access.
     """
 
-    def __init__(self):
+    def __init__(self, source=None):
+        self._source = parse_source(source)  # None: CAMERA_SOURCE env var, else device 0
         self._cap = None
         self._lock = threading.Lock()
+        self._lifecycle = threading.Lock()  # Serializes start() and stop(), held while the old thread exits
         self._running = False
-        self._frame = None
+        self._buffer = FrameRingBuffer(int(os.environ.get("FRAME_BUFFER_SIZE", 4)))
         self._thread = None
+        self._stop_event = threading.Event()  # Stop signal of the current capture thread
+        self._listeners = []
+        # (sequence number, capture timestamp) of the latest frame; the sequence number is
+        # monotonic and never reset. Replaced as a whole by the capture thread, read without locking.
+        self._frame_info = (0, None)
+        self._frame_interval = None   # Minimum seconds between decoded frames (None: device rate)
+        self._drain = False           # Live source: grab and discard frames between intervals
+        self._measured_fps = 0.0
 
-    def start(self):
+    def add_frame_listener(self, callback):
+        """
+        Registers a callback invoked from the capture thread for every new frame.
+        Args:
+            callback (function): Called as callback(frame, seq, timestamp). Must be cheap and non-blocking.
+                The frame is a ring buffer slot: it is overwritten once FRAME_BUFFER_SIZE newer
+                frames have been captured, so borrow or copy it by seq (borrow_frame, copy_frame)
+                rather than keeping it.
+        """
+        self._listeners.append(callback)
+
+    @property
+    def source(self):
+        """
+        Returns the video source this camera captures from.
+        """
+        if self._source is None:
+            return parse_source(os.environ.get("CAMERA_SOURCE", "0"))
+        return self._source
+
+    @property
+    def frame_buffer(self):
+        """
+        Returns the ring buffer holding this camera's most recent frames.
+        """
+        return self._buffer
+
+    @property
+    def measured_fps(self):
+        """
+        Returns the smoothed rate (frames per second) at which frames are actually being captured.
+        """
+        return self._measured_fps
+
+    def start(self, source=None):
         """
         Starts the camera and begins background frame capture.
+        Args:
+            source (int or str, optional): Switch to this source before opening.
         """
-        with self._lock:
+        with self._lifecycle, self._lock:
             if self._running:
                 logging.warning("Camera already started.")
                 return False
-            self._cap = cv2.VideoCapture(0)
+            if source is not None:
+                self._source = parse_source(source)
+            self._cap = cv2.VideoCapture(self.source)
             if not self._cap.isOpened():
-                logging.error("Failed to open webcam.")
+                logging.error(f"Failed to open camera source {self.source!r}.")
                 self._cap = None
                 return False
+            self._configure_pacing()
             self._running = True
-            self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+            # Each capture thread gets its own stop signal, so a thread from an earlier
+            # start() can never resume because the camera is running again
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(target=self._capture_loop, args=(self._cap, self._stop_event), daemon=True)
             self._thread.start()
             logging.info("Camera started.")
             return True
 
+    def _configure_pacing(self):
+        """
+        Chooses how the capture loop is paced for the opened source.
+        Live sources (devices, stream URLs) are read as fast as they deliver: grab() blocks
+        until the device has the next frame, and the driver queue is kept at one frame so
+        reads never lag behind. With CAMERA_FPS set, frames beyond that rate are grabbed
+        but not decoded, which keeps the queue drained. Video files have no natural rate,
+        so they are played back at CAMERA_FPS, else their own frame rate (30 if unknown).
+        """
+        target_fps = float(os.environ.get("CAMERA_FPS", 0))
+        source = self.source
+        if isinstance(source, str) and os.path.isfile(source):
+            target_fps = target_fps or self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+            self._drain = False
+        else:
+            self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self._drain = True
+        self._frame_interval = 1.0 / target_fps if target_fps > 0 else None
+        self._measured_fps = 0.0
+
     def stop(self):
         """
         Stops the camera and releases resources.
+        Waits for the capture thread to exit before releasing the device, so a following
+        start() never runs alongside the old thread.
         """
-        with self._lock:
-            if not self._running:
-                logging.info("Camera already stopped.")
-                return False
-            self._running = False
-            if self._cap:
-                self._cap.release()
-                self._cap = None
-            self._frame = None
+        with self._lifecycle:
+            with self._lock:
+                if not self._running:
+                    logging.info("Camera already stopped.")
+                    return False
+                self._running = False
+                self._stop_event.set()
+                cap, thread = self._cap, self._thread
+                self._cap, self._thread = None, None
+            # Outside self._lock: the capture thread's listeners may call is_running()
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(STOP_TIMEOUT)
+                if thread.is_alive():
+                    logging.warning("Capture thread did not exit in time; releasing the camera anyway.")
+            if cap:
+                cap.release()
+            self._buffer.clear()
             logging.info("Camera stopped and resources released.")
             return True
 
-    def _capture_loop(self):
+    def _capture_loop(self, cap=None, stop_event=None):
         """
-        Background thread loop to read frames continuously.
+        Background thread loop: grabs frames continuously and decodes the ones due
+        straight into the ring buffer's next slot.
+        Args:
+            cap (cv2.VideoCapture, optional): Capture owned by this thread (default: the current one).
+            stop_event (threading.Event, optional): This thread's stop signal (default: the current one).
         """
-        while self._running and self._cap:
-            ret, frame = self._cap.read()
-            if ret:
-                self._frame = frame
-            else:
+        cap = cap if cap is not None else self._cap
+        stop_event = stop_event if stop_event is not None else self._stop_event
+        next_due = time.monotonic()
+        last_capture = None
+        while self._running and cap and not stop_event.is_set():
+            if not cap.grab():
+                if stop_event.is_set():
+                    break  # Stopped while grabbing: leave the buffer to the next capture thread
                 logging.warning("Failed to read frame from webcam.")
-                self._frame = None
-            time.sleep(0.03)  # ~30 FPS
+                self._buffer.clear()
+                time.sleep(FAILED_READ_DELAY)
+                continue
+            now = time.monotonic()
+            if self._frame_interval is not None and now < next_due:
+                if self._drain:
+                    continue  # Discard without decoding; the next grab() waits for a fresher frame
+                time.sleep(next_due - now)
+                now = time.monotonic()
+            writable, slot = self._buffer.begin_write()
+            if not writable:
+                continue  # Every spare slot is lent to a reader; skip this frame
+            ret, frame = cap.retrieve(slot) if slot is not None else cap.retrieve()
+            if not ret:
+                logging.warning("Failed to decode frame from webcam.")
+                continue
+            timestamp = time.time()
+            seq = self._frame_info[0] + 1
+            self._frame_info = (seq, timestamp)
+            frame = self._buffer.commit(frame, seq, timestamp)
+            if frame is None:
+                continue  # Camera stopped while decoding
+            metrics.inc("smile_frames_captured_total")
+            if last_capture is not None and now > last_capture:
+                rate = 1.0 / (now - last_capture)
+                self._measured_fps = rate if not self._measured_fps else 0.9 * self._measured_fps + 0.1 * rate
+            last_capture = now
+            if self._frame_interval is not None:
+                next_due = max(next_due + self._frame_interval, now)
+            self._notify_listeners(frame, seq, timestamp)
 
-    def get_frame(self):
+    def _notify_listeners(self, frame, seq, timestamp):
         """
-        Returns the latest captured frame.
+        Hands a freshly captured frame to every registered listener.
+        A failing listener is logged and never stops the capture loop.
+        """
+        for callback in self._listeners:
+            try:
+                callback(frame, seq, timestamp)
+            except Exception:
+                logging.exception("Frame listener failed.")
+
+    def get_frame(self, gray=False, scale=1.0):
+        """
+        Returns a copy of the latest captured frame, optionally grayscale and/or downscaled.
+        Conversions read the buffered frame directly, so no full-size BGR copy is made for them.
+        Args:
+            gray (bool): Return a single-channel grayscale image.
+            scale (float): Resize factor (e.g., 0.5 for half size).
         Returns:
             np.ndarray or None: The latest frame, or None if not available.
         """
-        with self._lock:
-            return self._frame.copy() if self._frame is not None else None
+        with metrics.time_stage("get_frame"):
+            lease = self._buffer.acquire()
+            if lease is None:
+                return None
+            with lease:
+                return convert_frame(lease.frame, gray=gray, scale=scale)
+
+    def borrow_frame(self, seq=None):
+        """
+        Lends the latest (or a specific) buffered frame without copying it.
+        Returns:
+            FrameLease or None: Lease whose .frame is a read-only view, valid until the lease
+            is released (use it as a context manager); None if the frame is not buffered.
+        """
+        return self._buffer.acquire(seq)
+
+    def copy_frame(self, seq):
+        """
+        Returns a copy of a specific buffered frame.
+        Returns:
+            np.ndarray or None: The frame, or None if it has already left the ring buffer.
+        """
+        item = self._buffer.copy(seq)
+        return item[0] if item is not None else None
+
+    def get_frames(self, count):
+        """
+        Returns copies of up to count of the most recent frames, oldest first.
+        Returns:
+            list: [(frame, seq, timestamp), ...]
+        """
+        return self._buffer.window(count)
+
+    def get_frame_info(self):
+        """
+        Returns the identity of the latest captured frame.
+        Returns:
+            tuple: (sequence number, capture timestamp). The sequence number is 0
+            and the timestamp None until the first frame is captured.
+        """
+        return self._frame_info
 
     def is_running(self):
         """
@@ -88,5 +276,86 @@ class CameraManager:
         with self._lock:
             return self._running
 
-# Singleton instance
+class CameraRegistry:
+    """
+    Registry of cameras keyed by camera ID.
+    Each camera owns its own capture thread and frame buffer; all share one process,
+    one OpenCV runtime and one set of detection services.
+    """
+
+    def __init__(self):
+        self._cameras = {}
+        self._lock = threading.Lock()
+        self._added_callbacks = []
+
+    def on_camera_added(self, callback):
+        """
+        Registers a callback invoked as callback(camera_id, camera) for every camera
+        added now or later (e.g., to attach a detection pipeline per camera).
+        """
+        with self._lock:
+            self._added_callbacks.append(callback)
+            existing = list(self._cameras.items())
+        for camera_id, camera in existing:
+            callback(camera_id, camera)
+
+    def add(self, camera_id, camera):
+        """
+        Registers an existing CameraManager under camera_id.
+        Returns:
+            CameraManager: The registered camera.
+        """
+        with self._lock:
+            self._cameras[camera_id] = camera
+            callbacks = list(self._added_callbacks)
+        for callback in callbacks:
+            callback(camera_id, camera)
+        return camera
+
+    def get(self, camera_id):
+        """
+        Returns the camera registered under camera_id, or None.
+        """
+        with self._lock:
+            return self._cameras.get(camera_id)
+
+    def get_or_create(self, camera_id, source=None):
+        """
+        Returns the camera for camera_id, creating it if needed.
+        A numeric camera ID without an explicit source is treated as a device index.
+        Returns:
+            CameraManager or None: None if the camera is unknown and no source can be derived.
+        """
+        if source is None and not camera_id.isdigit():
+            return self.get(camera_id)
+        with self._lock:
+            camera = self._cameras.get(camera_id)
+            if camera is not None:
+                return camera
+            # Created and registered under one lock hold, so concurrent callers share one camera
+            camera = self._cameras[camera_id] = CameraManager(source if source is not None else camera_id)
+            callbacks = list(self._added_callbacks)
+        for callback in callbacks:
+            callback(camera_id, camera)
+        return camera
+
+    def ids(self):
+        """
+        Returns the registered camera IDs.
+        """
+        with self._lock:
+            return list(self._cameras)
+
+    def stop_all(self):
+        """
+        Stops every registered camera.
+        """
+        with self._lock:
+            cameras = list(self._cameras.values())
+        for camera in cameras:
+            camera.stop()
+
+# Default camera (CAMERA_SOURCE, device 0 unless configured) and the registry holding it
 camera_manager = CameraManager()
+camera_registry = CameraRegistry()
+camera_registry.add(DEFAULT_CAMERA_ID, camera_manager)
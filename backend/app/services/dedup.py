@@ -0,0 +1,99 @@
+"""
+Near-Duplicate Suppression.
+Skips saving detections that repeat the previous saved one: same number of smiles,
+boxes in nearly the same place, and smile regions that look the same
+(compact perceptual hash), within a time window.
+"""
+
+import os
+import cv2
+import numpy as np
+
+def dhash(region, hash_size=8):
+    """
+    Computes a 64-bit difference hash of an image region.
+    Robust to small lighting and compression changes; visually similar regions
+    differ in only a few bits.
+
+    Args:
+        region (np.ndarray): BGR or grayscale image region.
+        hash_size (int): Hash grid size (hash has hash_size**2 bits).
+    Returns:
+        int: The hash, or 0 for an empty region.
+    """
+    if region is None or region.size == 0:
+        return 0
+    if region.ndim == 3:
+        region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(region, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+class DetectionDeduplicator:
+    """
+    Decides whether a detection is a near-duplicate of the last saved one for a stream.
+    Not thread-safe: use one instance per stream.
+    """
+
+    def __init__(self, max_distance=6, max_shift=20, window=5.0):
+        """
+        Args:
+            max_distance (int): Maximum differing hash bits (of 64) for "same-looking" smiles.
+            max_shift (int): Maximum box movement (pixels, any edge) for "same place".
+            window (float): Seconds after the last saved detection during which duplicates are skipped;
+                after that one detection is saved again even if unchanged.
+        """
+        self.max_distance = max_distance
+        self.max_shift = max_shift
+        self.window = window
+        self._last = None  # (timestamp, [(box, hash), ...]) of the last saved detection
+        self.suppressed = 0
+
+    def is_duplicate(self, frame, coords, timestamp):
+        """
+        Checks a detection against the last saved one and remembers it if it is new.
+
+        Args:
+            frame (np.ndarray): Unannotated frame the coords refer to.
+            coords (list): Smile boxes as {"x", "y", "w", "h"} dictionaries.
+            timestamp (float): Frame capture time (epoch seconds).
+        Returns:
+            bool: True if the detection should not be saved.
+        """
+        signature = [
+            ((c["x"], c["y"], c["w"], c["h"]), dhash(frame[c["y"]:c["y"] + c["h"], c["x"]:c["x"] + c["w"]]))
+            for c in coords
+        ]
+        if self._last is not None and timestamp - self._last[0] <= self.window and self._matches(self._last[1], signature):
+            self.suppressed += 1
+            return True
+        self._last = (timestamp, signature)
+        return False
+
+    def _matches(self, previous, current):
+        """
+        Returns True if every current smile matches the previous smile at the same position in the list.
+        """
+        if len(previous) != len(current):
+            return False
+        for (old_box, old_hash), (new_box, new_hash) in zip(previous, current):
+            if any(abs(a - b) > self.max_shift for a, b in zip(old_box, new_box)):
+                return False
+            if bin(old_hash ^ new_hash).count("1") > self.max_distance:
+                return False
+        return True
+
+def create_deduplicator():
+    """
+    Creates a DetectionDeduplicator from DEDUP_WINDOW, DEDUP_HASH_DISTANCE and DEDUP_MAX_SHIFT.
+    Returns:
+        DetectionDeduplicator or None: None if DEDUP_WINDOW is 0 (every detection is saved).
+    """
+    window = float(os.environ.get("DEDUP_WINDOW", 5.0))
+    if window <= 0:
+        return None
+    return DetectionDeduplicator(
+        max_distance=int(os.environ.get("DEDUP_HASH_DISTANCE", 6)),
+        max_shift=int(os.environ.get("DEDUP_MAX_SHIFT", 20)),
+        window=window,
+    )
@@ -0,0 +1,461 @@
+"""
+Detection Pipeline.
+Runs smile detection once per captured frame on a background worker,
+caches the most recent result, so API requests only perform a memory lookup,
+and fans each result out to streaming subscribers.
+"""
+
+import os
+import asyncio
+import threading
+import logging
+import time
+from datetime import datetime
+from functools import partial
+
+from app.services.camera_manager import camera_registry, DEFAULT_CAMERA_ID
+from app.services.smile_detector import detect_smile_on_frame
+from app.services.process_detector import get_process_detector
+from app.services.face_tracker import create_face_tracker
+from app.services.dedup import create_deduplicator
+from app.services.episodes import create_episode_aggregator, persist_raw_detections
+from app.services.metrics import metrics
+from app.services.single_flight import create_single_flight
+from app.models.detection_event import detection_event_writer, detection_image_writer, detection_image_filename
+
+def _detect_frame(frame, face_tracker=None):
+    """
+    Default detection function: uses the process pool when DETECTION_BACKEND=process,
+    otherwise detects in the calling thread with cascades checked out from the shared pool.
+    """
+    engine = get_process_detector()
+    if engine is not None:
+        return engine.detect(frame, face_tracker=face_tracker)
+    return detect_smile_on_frame(frame, face_tracker=face_tracker)
+
+def _timed_detect(detect, frame):
+    """
+    Runs a detection function, collecting the stage timings it records.
+    Returns:
+        tuple: (detection result, {stage: seconds})
+    """
+    with metrics.collect_timings() as timings:
+        started = time.perf_counter()
+        result = detect(frame)
+        metrics.observe("detect", time.perf_counter() - started)
+    return result, timings
+
+def persist_interval():
+    """
+    Returns the minimum seconds between saved detections of a stream while its number
+    of smiles stays the same (PERSIST_INTERVAL, default 1.0; 0 saves every detected frame).
+    """
+    return float(os.environ.get("PERSIST_INTERVAL", 1.0))
+
+def _persist_episode(episode):
+    """
+    Saves a closed smile episode: its representative image and one episodes row.
+    """
+    image_bytes = episode.pop("image", None)
+    image_path = None
+    if image_bytes is not None:
+        filename = detection_image_filename(datetime.fromtimestamp(episode["start"]), prefix=f"episode_{episode['camera_id']}")
+        if detection_image_writer.submit(image_bytes, filename=filename):
+            image_path = detection_image_writer.image_path(filename)
+    detection_event_writer.submit_episode(episode, image_path)
+
+class DetectionSubscriber:
+    """
+    Latest-only mailbox for one streaming client.
+    A result published while the previous one is still undelivered replaces it,
+    so slow consumers skip stale frames instead of queueing them.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._event = asyncio.Event()
+        self._latest = None
+        self.dropped = 0  # Results replaced before the client picked them up
+
+    def publish(self, result):
+        """
+        Hands a result to the subscriber. Safe to call from any thread.
+        """
+        with self._lock:
+            if self._latest is not None:
+                self.dropped += 1
+            self._latest = result
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def get(self):
+        """
+        Waits for and returns the newest undelivered result.
+        """
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            with self._lock:
+                result, self._latest = self._latest, None
+            if result is not None:
+                return result
+
+class DetectionPipeline:
+    """
+    Background detection stage fed by CameraManager's capture loop.
+    Keeps only the newest pending frame (older unprocessed frames are dropped)
+    and exposes the latest detection result to any number of readers.
+    """
+
+    def __init__(self, detect_func=None, camera_id=DEFAULT_CAMERA_ID, frame_buffer=None):
+        self._camera_id = camera_id
+        # Ring buffer the submitted frames live in; frames are copied out of it by sequence number
+        self._frame_buffer = frame_buffer
+        # One face tracker per pipeline: tracking state belongs to a single video stream
+        self._face_tracker = create_face_tracker() if detect_func is None else None
+        self._detect = detect_func if detect_func is not None else partial(_detect_frame, face_tracker=self._face_tracker)
+        # On-demand detections run in request threads, which must not touch the tracker
+        self._detect_untracked = detect_func if detect_func is not None else _detect_frame
+        # Skips saving near-identical consecutive detections of this stream
+        self._deduplicator = create_deduplicator()
+        # Merges consecutive detections of the same smile into episodes
+        self._episodes = create_episode_aggregator(camera_id, _persist_episode)
+        self._episodes_lock = threading.Lock()
+        # Persistence throttle state (worker thread only): smiles in the previous frame, time of the last save
+        self._smile_count = 0
+        self._last_persisted = None
+        self._cond = threading.Condition()
+        self._pending = None  # (frame, seq, timestamp) waiting for the worker
+        self._latest = None   # Cached result dict for the last processed frame
+        self._generation = 0  # Bumped on reset so in-flight results are discarded
+        self._subscribers = []
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the background detection worker.
+        Returns:
+            bool: True if started, False if already running.
+        """
+        with self._cond:
+            if self._running:
+                return False
+            self._running = True
+            self._thread = threading.Thread(target=self._worker_loop, daemon=True)
+            self._thread.start()
+            logging.info("[Pipeline] Detection worker started.")
+            return True
+
+    def stop(self):
+        """
+        Stops the background detection worker and waits for it to exit.
+        Returns:
+            bool: True if stopped, False if already stopped.
+        """
+        with self._cond:
+            if not self._running:
+                return False
+            self._running = False
+            self._cond.notify_all()
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            thread.join(timeout=2.0)
+        with self._episodes_lock:
+            self._episodes.close_all()
+        logging.info("[Pipeline] Detection worker stopped.")
+        return True
+
+    def is_running(self):
+        """
+        Returns whether the detection worker is running.
+        """
+        with self._cond:
+            return self._running
+
+    def submit(self, frame, seq, timestamp):
+        """
+        Queues a frame for detection, replacing any frame not yet processed.
+        Called from the camera capture thread, so it never blocks on detection.
+        """
+        with self._cond:
+            if self._pending is not None:
+                metrics.inc("smile_frames_dropped_total")
+            self._pending = (frame, seq, timestamp)
+            self._cond.notify()
+
+    def get_latest(self):
+        """
+        Returns the cached result of the most recently processed frame.
+        Returns:
+            dict or None: {"image": bytes or None, "coords": list, "seq": int, "timestamp": float,
+            "timings": {stage: seconds}}, or None if no frame has been processed yet.
+        """
+        with self._cond:
+            return self._latest
+
+    def subscribe(self):
+        """
+        Registers a streaming subscriber bound to the running event loop.
+        Must be called from within an async context.
+        Returns:
+            DetectionSubscriber: Receives every result produced from now on.
+        """
+        subscriber = DetectionSubscriber(asyncio.get_running_loop())
+        with self._cond:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """
+        Removes a streaming subscriber; unknown subscribers are ignored.
+        """
+        with self._cond:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def reset(self):
+        """
+        Drops the pending frame and cached result (e.g., when the camera stops).
+        """
+        with self._cond:
+            self._pending = None
+            self._latest = None
+            self._generation += 1
+            if self._face_tracker is not None:
+                self._face_tracker.reset()
+            self._smile_count = 0
+            self._last_persisted = None
+        with self._episodes_lock:
+            self._episodes.close_all()
+
+    def _worker_loop(self):
+        """
+        Background thread loop: waits for a pending frame and processes it.
+        """
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                frame, seq, timestamp = self._pending
+                self._pending = None
+                generation = self._generation
+            try:
+                self._process(frame, seq, timestamp, generation)
+            except Exception:
+                logging.exception("[Pipeline] Detection failed for captured frame.")
+
+    def _process(self, frame, seq, timestamp, generation):
+        """
+        Runs detection on one frame, persists positive detections, updates episodes and caches the result.
+        The frame is borrowed from the camera's ring buffer rather than copied, and handed
+        to detection read-only; detection copies it only if it has boxes to draw.
+        """
+        lease = None
+        if self._frame_buffer is not None:
+            lease = self._frame_buffer.acquire(seq)
+            if lease is None:
+                # The capture thread already reused the frame's ring buffer slot
+                metrics.inc("smile_frames_dropped_total")
+                return
+            frame = lease.frame
+        else:
+            frame = frame.view()
+            frame.flags.writeable = False
+        try:
+            self._process_frame(frame, seq, timestamp, generation)
+        finally:
+            if lease is not None:
+                lease.release()
+
+    def _process_frame(self, frame, seq, timestamp, generation):
+        """
+        Detection and bookkeeping for one read-only frame (see _process).
+        """
+        with self._cond:
+            cached = self._latest if self._latest is not None and self._latest["seq"] == seq else None
+        if cached is not None:
+            # A ?fresh=true request already detected this frame: reuse its result
+            result = (cached["image"], cached["coords"]) if cached["coords"] else None
+            timings = cached["timings"]
+        else:
+            # Joins an on-demand detection of this frame if a request already started one
+            result, timings = detection_flights.do(
+                (self._camera_id, seq), partial(_timed_detect, self._detect, frame), limited=False
+            )
+        metrics.inc("smile_frames_processed_total")
+        if result is None:
+            metrics.inc("smile_empty_results_total")
+            self._smile_count = 0
+            with self._episodes_lock:
+                self._episodes.expire(timestamp)
+            latest = {"image": None, "coords": [], "seq": seq, "timestamp": timestamp, "timings": timings}
+        else:
+            image_bytes, coords = result
+            metrics.inc("smile_detections_total")
+            with self._episodes_lock:
+                self._episodes.add(coords, image_bytes, timestamp)
+            if persist_raw_detections() and self._persist_due(coords, timestamp) and (
+                self._deduplicator is None or not self._deduplicator.is_duplicate(frame, coords, timestamp)
+            ):
+                image_key = detection_image_filename(datetime.fromtimestamp(timestamp), prefix=f"smile_{self._camera_id}")
+                if not detection_image_writer.submit(image_bytes, filename=image_key):
+                    image_key = None
+                detection_event_writer.submit(coords, timestamp, camera_id=self._camera_id, image_key=image_key)
+            latest = {"image": image_bytes, "coords": coords, "seq": seq, "timestamp": timestamp, "timings": timings}
+        with self._cond:
+            if generation != self._generation:
+                return
+            if self._latest is None or self._latest["seq"] <= seq:  # Never replace a newer on-demand result
+                self._latest = latest
+        self._publish(latest)
+
+    def _persist_due(self, coords, timestamp):
+        """
+        Throttles persistence of a stream's detections: a detection is saved when the number
+        of smiles changed since the previous processed frame, or once PERSIST_INTERVAL seconds
+        have passed since the last saved one. A steady smile is thus saved about once a second
+        instead of once per frame.
+        Returns:
+            bool: True if the detection should be saved.
+        """
+        changed = len(coords) != self._smile_count
+        self._smile_count = len(coords)
+        if not changed and self._last_persisted is not None and timestamp - self._last_persisted < persist_interval():
+            return False
+        self._last_persisted = timestamp
+        return True
+
+    def detect_now(self):
+        """
+        Detects smiles on the newest captured frame on demand, for clients that need a
+        result for the current frame rather than the last one the worker finished.
+        Concurrent calls for the same frame, and the worker if it is processing that frame,
+        share a single detection. The result is cached as the latest result, so later requests
+        and the worker reuse it; it is not persisted or streamed (the worker does that).
+
+        Returns:
+            dict or None: A result like get_latest(); the cached result if it is already
+            current or the frame left the ring buffer; None if nothing was captured yet.
+        Raises:
+            Overloaded: If DETECTION_MAX_INFLIGHT detections are already running, or the
+                shared result took longer than DETECTION_WAIT_TIMEOUT.
+        """
+        latest = self.get_latest()
+        if self._frame_buffer is None:
+            return latest
+        seq, timestamp = self._frame_buffer.latest_info()
+        if seq == 0 or (latest is not None and latest["seq"] >= seq):
+            return latest
+        with self._cond:
+            generation = self._generation
+        outcome = detection_flights.do((self._camera_id, seq), partial(self._detect_buffered, seq))
+        if outcome is None:
+            return self.get_latest()
+        result, timings = outcome
+        image_bytes, coords = result if result is not None else (None, [])
+        fresh = {"image": image_bytes, "coords": coords, "seq": seq, "timestamp": timestamp, "timings": timings}
+        with self._cond:
+            if generation == self._generation and (self._latest is None or self._latest["seq"] < seq):
+                self._latest = fresh
+        return fresh
+
+    def newest_frame_info(self):
+        """
+        Returns (seq, timestamp) of the newest captured frame, without detecting it
+        (the cached result's frame if frames are not buffered; (0, None) if none).
+        """
+        if self._frame_buffer is not None:
+            return self._frame_buffer.latest_info()
+        latest = self.get_latest()
+        return (latest["seq"], latest["timestamp"]) if latest is not None else (0, None)
+
+    def _detect_buffered(self, seq):
+        """
+        Runs an untracked detection on a buffered frame.
+        Returns:
+            tuple or None: (detection result, timings), or None if the frame was already overwritten.
+        """
+        lease = self._frame_buffer.acquire(seq)
+        if lease is None:
+            return None
+        with lease:
+            return _timed_detect(self._detect_untracked, lease.frame)
+
+    def _publish(self, result):
+        """
+        Fans a result out to all streaming subscribers.
+        """
+        with self._cond:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.publish(result)
+            except RuntimeError:
+                # Event loop already closed; the stream is gone
+                self.unsubscribe(subscriber)
+
+class PipelineRegistry:
+    """
+    One DetectionPipeline per registered camera, created as cameras are added
+    and started/stopped together with the application.
+    """
+
+    def __init__(self):
+        self._pipelines = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def attach(self, camera_id, camera):
+        """
+        Creates a pipeline for a camera and feeds it with the camera's frames.
+        Used as a CameraRegistry.on_camera_added callback.
+        """
+        pipeline = DetectionPipeline(camera_id=camera_id, frame_buffer=camera.frame_buffer)
+        camera.add_frame_listener(pipeline.submit)
+        with self._lock:
+            self._pipelines[camera_id] = pipeline
+            started = self._started
+        if started:
+            pipeline.start()
+        return pipeline
+
+    def get(self, camera_id):
+        """
+        Returns the pipeline for camera_id, or None.
+        """
+        with self._lock:
+            return self._pipelines.get(camera_id)
+
+    def start(self):
+        """
+        Starts the workers of all current and future pipelines.
+        """
+        with self._lock:
+            self._started = True
+            pipelines = list(self._pipelines.values())
+        for pipeline in pipelines:
+            pipeline.start()
+
+    def stop(self):
+        """
+        Stops the workers of all pipelines.
+        """
+        with self._lock:
+            self._started = False
+            pipelines = list(self._pipelines.values())
+        for pipeline in pipelines:
+            pipeline.stop()
+
+# Shared by all pipelines: coalesces detections of the same camera frame and bounds on-demand ones
+detection_flights = create_single_flight()
+
+# Singleton registry, fed by every frame each registered camera captures
+pipeline_registry = PipelineRegistry()
+camera_registry.on_camera_added(pipeline_registry.attach)
+
+# Pipeline of the default camera
+detection_pipeline = pipeline_registry.get(DEFAULT_CAMERA_ID)
@@ -0,0 +1,117 @@
+"""
+Detection Profiles.
+The cascade search parameters and smile filters used by detect_smile_on_frame,
+grouped so they can be tuned offline (benchmarks/tune_cascades.py) and loaded
+from a JSON file with DETECTION_PROFILE instead of being hard-coded.
+
+A profile file holds any subset of the fields below; missing fields keep their defaults:
+
+    {"face_scale_factor": 1.2, "face_min_neighbors": 6, "smile_min_neighbors": 20, ...}
+"""
+
+import os
+import json
+import logging
+import threading
+
+class DetectionProfile:
+    """
+    Detection parameters. The defaults are the values the detector has always used.
+    """
+
+    FIELDS = {
+        "face_scale_factor": 1.3,        # Face search pyramid step
+        "face_min_neighbors": 5,         # Face candidates required per detection
+        "smile_scale_factor": 1.3,       # Smile search pyramid step
+        "smile_min_neighbors": 25,       # Smile candidates required (higher: fewer false positives)
+        "smile_min_size": (25, 25),      # Ignore tiny "smiles"
+        "smile_max_size": (200, 200),    # Ignore huge "smiles"
+        "lower_face_split": 0.5,         # Smiles are searched below this fraction of the face height
+        "min_smile_aspect": 2.0,         # Smiles are wide: required width/height ratio
+    }
+
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, **params):
+        """
+        Args:
+            **params: Field overrides (see FIELDS).
+        Raises:
+            ValueError: On an unknown field or an out-of-range value.
+        """
+        unknown = set(params) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown detection profile fields: {', '.join(sorted(unknown))}")
+        for name, default in self.FIELDS.items():
+            value = params.get(name, default)
+            setattr(self, name, tuple(int(v) for v in value) if isinstance(default, tuple) else type(default)(value))
+        if self.face_scale_factor <= 1.0 or self.smile_scale_factor <= 1.0:
+            raise ValueError("Scale factors must be greater than 1.0")
+        if not 0.0 <= self.lower_face_split < 1.0:
+            raise ValueError("lower_face_split must be in [0, 1)")
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Creates a profile from a dict such as a parsed profile file.
+        """
+        return cls(**data)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a profile from a JSON file.
+        Raises:
+            OSError, ValueError: If the file cannot be read or is not a valid profile.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("A detection profile must be a JSON object")
+        return cls.from_dict(data)
+
+    def to_dict(self):
+        """
+        Returns the profile as a JSON-serializable dict.
+        """
+        return {name: list(value) if isinstance(value, tuple) else value
+                for name, value in ((name, getattr(self, name)) for name in self.FIELDS)}
+
+    def replace(self, **params):
+        """
+        Returns a copy of the profile with some fields changed.
+        """
+        return DetectionProfile(**{**self.to_dict(), **params})
+
+    def __eq__(self, other):
+        return isinstance(other, DetectionProfile) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"DetectionProfile({self.to_dict()})"
+
+DEFAULT_PROFILE = DetectionProfile()
+
+_lock = threading.Lock()
+_active = (None, DEFAULT_PROFILE)  # (DETECTION_PROFILE path it was loaded from, profile)
+
+def get_detection_profile():
+    """
+    Returns the profile configured with DETECTION_PROFILE (path to a JSON profile file),
+    or the defaults if unset. The file is loaded once per path; a file that cannot be
+    loaded falls back to the defaults (logged).
+    """
+    global _active
+    path = os.environ.get("DETECTION_PROFILE") or None
+    if _active[0] == path:
+        return _active[1]
+    with _lock:
+        if _active[0] != path:
+            profile = DEFAULT_PROFILE
+            if path is not None:
+                try:
+                    profile = DetectionProfile.load(path)
+                    logging.info(f"[DetectionProfile] Loaded detection profile {path}: {profile.to_dict()}")
+                except (OSError, ValueError, TypeError) as e:
+                    logging.error(f"[DetectionProfile] Could not load detection profile {path!r} ({e}); using defaults.")
+            _active = (path, profile)
+        return _active[1]
@@ -0,0 +1,121 @@
+"""
+Smile Episodes.
+Aggregates consecutive positive detections of the same face region into a single
+episode (start, end, frame count, best box, representative image), so one
+sustained smile becomes one record instead of one row per frame.
+"""
+
+import os
+
+class EpisodeAggregator:
+    """
+    Tracks open smile episodes for one camera.
+    A detection continues an open episode when its box is close to that episode's
+    last box; an episode closes once no matching detection arrives for `gap` seconds.
+    Not thread-safe: use one instance per stream.
+    """
+
+    def __init__(self, camera_id, on_close, gap=1.0):
+        """
+        Args:
+            camera_id (str): Camera the episodes belong to.
+            on_close (function): Called with each closed episode dict.
+            gap (float): Seconds without a matching detection after which an episode closes.
+        """
+        self.camera_id = camera_id
+        self.gap = gap
+        self._on_close = on_close
+        self._open = []
+
+    def add(self, coords, image_bytes, timestamp):
+        """
+        Feeds one positive detection (all smile boxes of a frame).
+
+        Args:
+            coords (list): Smile boxes as {"x", "y", "w", "h"} dictionaries.
+            image_bytes (bytes): Annotated JPEG of the frame.
+            timestamp (float): Frame capture time (epoch seconds).
+        """
+        self.expire(timestamp)
+        unmatched = list(self._open)
+        for box in coords:
+            episode = self._match(box, unmatched)
+            if episode is None:
+                self._open.append(self._new_episode(box, image_bytes, timestamp))
+                continue
+            unmatched.remove(episode)
+            episode["end"] = timestamp
+            episode["frames"] += 1
+            episode["last_box"] = box
+            if box["w"] * box["h"] > episode["best_box"]["w"] * episode["best_box"]["h"]:
+                episode["best_box"] = box
+                episode["image"] = image_bytes
+
+    def expire(self, timestamp):
+        """
+        Closes episodes that have not been continued for more than `gap` seconds.
+        Call for frames without smiles too, so episodes end on time.
+        """
+        still_open = []
+        for episode in self._open:
+            if timestamp - episode["end"] > self.gap:
+                self._close(episode)
+            else:
+                still_open.append(episode)
+        self._open = still_open
+
+    def close_all(self):
+        """
+        Closes every open episode (e.g., when the camera stops).
+        """
+        episodes, self._open = self._open, []
+        for episode in episodes:
+            self._close(episode)
+
+    def _new_episode(self, box, image_bytes, timestamp):
+        """
+        Starts an episode from its first detection.
+        """
+        return {
+            "camera_id": self.camera_id,
+            "start": timestamp,
+            "end": timestamp,
+            "frames": 1,
+            "best_box": box,
+            "last_box": box,
+            "image": image_bytes,
+        }
+
+    def _match(self, box, candidates):
+        """
+        Returns the candidate episode whose last box center is nearest to box's center,
+        if it lies within that box's width; otherwise None.
+        """
+        cx, cy = box["x"] + box["w"] / 2, box["y"] + box["h"] / 2
+        best, best_distance = None, None
+        for episode in candidates:
+            last = episode["last_box"]
+            distance = ((last["x"] + last["w"] / 2 - cx) ** 2 + (last["y"] + last["h"] / 2 - cy) ** 2) ** 0.5
+            if distance <= max(last["w"], box["w"]) and (best is None or distance < best_distance):
+                best, best_distance = episode, distance
+        return best
+
+    def _close(self, episode):
+        """
+        Hands a finished episode to the on_close callback.
+        """
+        episode.pop("last_box", None)
+        self._on_close(episode)
+
+def create_episode_aggregator(camera_id, on_close):
+    """
+    Creates an EpisodeAggregator using EPISODE_GAP (seconds, default 1.0).
+    """
+    return EpisodeAggregator(camera_id, on_close, gap=float(os.environ.get("EPISODE_GAP", 1.0)))
+
+def persist_raw_detections():
+    """
+    Returns whether per-frame detection rows and images are saved in addition to episodes
+    (PERSIST_RAW_DETECTIONS, default on).
+    """
+    return os.environ.get("PERSIST_RAW_DETECTIONS", "1").lower() not in ("0", "false", "no")
@@ -0,0 +1,239 @@
+"""
+Face Detector Backends.
+Registry of interchangeable face detection backends selected with FACE_DETECTOR.
+Every backend exposes the CascadeClassifier call used throughout the detection code,
+detectMultiScale(image, scaleFactor, minNeighbors, minSize=..., maxSize=...), so the
+smile stage, face tracking and the process-pool engine work with any of them.
+Cascades search the equalized grayscale frame; backends with input_color = True are
+given the BGR frame instead (see face_input). The smile stage always uses the Haar
+smile cascade on the grayscale frame.
+
+Backends:
+    haar: OpenCV's frontal face Haar cascade (default, no model files needed).
+    dnn:  OpenCV DNN SSD face detector (ResNet-10, 300x300) loaded from local model files
+          (DNN_FACE_MODEL, DNN_FACE_CONFIG), run on the CPU.
+
+Each backend records its own call count and time, reported by face_detector_info().
+"""
+
+import os
+import time
+import logging
+import threading
+import cv2
+import numpy as np
+
+DEFAULT_DNN_MODEL = os.path.join("models", "res10_300x300_ssd_iter_140000.caffemodel")
+DEFAULT_DNN_CONFIG = os.path.join("models", "deploy.prototxt")
+
+class FaceDetector:
+    """
+    Base class of face detector backends. Instances are not thread-safe: each one is
+    used by a single detection at a time (they live in the shared cascade pool).
+    """
+
+    name = None
+    description = ""
+    input_color = False  # True: search the BGR frame rather than the equalized grayscale one
+    _stats_lock = threading.Lock()
+    _stats = {}  # Backend name -> [calls, seconds], shared by all instances
+
+    def detectMultiScale(self, image, scaleFactor=1.3, minNeighbors=5, minSize=None, maxSize=None, **kwargs):
+        """
+        Detects faces in an image (grayscale, or BGR if input_color), with the CascadeClassifier call signature.
+        scaleFactor/minNeighbors are cascade search parameters; other backends may ignore them.
+        Returns:
+            list: Face boxes as (x, y, w, h), filtered to [minSize, maxSize].
+        """
+        started = time.perf_counter()
+        faces = self._detect(image, scaleFactor, minNeighbors, minSize, maxSize)
+        elapsed = time.perf_counter() - started
+        with FaceDetector._stats_lock:
+            entry = FaceDetector._stats.setdefault(self.name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+        return faces
+
+    def _detect(self, image, scale_factor, min_neighbors, min_size, max_size):
+        raise NotImplementedError
+
+class HaarFaceDetector(FaceDetector):
+    """
+    Viola-Jones Haar cascade face detector.
+    """
+
+    name = "haar"
+    description = "OpenCV frontal face Haar cascade; fast on small frames, but noisy (false positives on texture)"
+
+    def __init__(self, cascade=None):
+        self._cascade = cascade or cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def _detect(self, image, scale_factor, min_neighbors, min_size, max_size):
+        kwargs = {}
+        if min_size is not None:
+            kwargs["minSize"] = min_size
+        if max_size is not None:
+            kwargs["maxSize"] = max_size
+        return self._cascade.detectMultiScale(image, scale_factor, min_neighbors, **kwargs)
+
+class DnnFaceDetector(FaceDetector):
+    """
+    OpenCV DNN single-shot face detector (SSD output: [1, 1, N, 7] rows of
+    image id, class, confidence, x1, y1, x2, y2 in relative coordinates).
+    """
+
+    name = "dnn"
+    description = "OpenCV DNN ResNet-10 SSD face detector; constant cost per call, robust to pose and lighting"
+    input_color = True  # Trained on BGR images: equalized grayscale input costs accuracy
+
+    def __init__(self, net, confidence=0.5, input_size=300):
+        """
+        Args:
+            net (cv2.dnn.Net): Loaded SSD face network.
+            confidence (float): Minimum detection confidence.
+            input_size (int): Network input width and height.
+        """
+        self._net = net
+        self.confidence = confidence
+        self.input_size = input_size
+
+    @classmethod
+    def load(cls, model=None, config=None, confidence=None):
+        """
+        Loads the network from local model files (Caffe or TensorFlow SSD face models).
+
+        Args:
+            model (str): Weights file (default DNN_FACE_MODEL or models/res10_300x300_ssd_iter_140000.caffemodel).
+            config (str): Network description file (default DNN_FACE_CONFIG or models/deploy.prototxt).
+            confidence (float): Minimum confidence (default DNN_FACE_CONFIDENCE or 0.5).
+        Raises:
+            FileNotFoundError: If a model file is missing.
+        """
+        model = model or os.environ.get("DNN_FACE_MODEL", DEFAULT_DNN_MODEL)
+        config = config or os.environ.get("DNN_FACE_CONFIG", DEFAULT_DNN_CONFIG)
+        for path in (model, config):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"DNN face model file not found: {path}")
+        net = cv2.dnn.readNet(model, config)
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        confidence = confidence if confidence is not None else float(os.environ.get("DNN_FACE_CONFIDENCE", 0.5))
+        return cls(net, confidence=confidence)
+
+    def _detect(self, image, scale_factor, min_neighbors, min_size, max_size):
+        height, width = image.shape[:2]
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)  # Grayscale source frame: the network expects three channels
+        blob = cv2.dnn.blobFromImage(image, 1.0, (self.input_size, self.input_size), (104.0, 177.0, 123.0))
+        self._net.setInput(blob)
+        detections = self._net.forward().reshape(-1, 7)
+        faces = []
+        for _, _, confidence, x1, y1, x2, y2 in detections:
+            if confidence < self.confidence:
+                continue
+            x1, y1 = max(int(x1 * width), 0), max(int(y1 * height), 0)
+            x2, y2 = min(int(x2 * width), width), min(int(y2 * height), height)
+            w, h = x2 - x1, y2 - y1
+            if w <= 0 or h <= 0:
+                continue
+            if min_size is not None and (w < min_size[0] or h < min_size[1]):
+                continue
+            if max_size is not None and (w > max_size[0] or h > max_size[1]):
+                continue
+            faces.append((x1, y1, w, h))
+        return np.array(faces, dtype=np.int32).reshape(-1, 4)
+
+def face_input(face_detector, frame, gray):
+    """
+    Returns the image a face detector searches: the BGR frame for backends with
+    input_color, otherwise the equalized grayscale frame (as for cascades).
+
+    Args:
+        face_detector: Face detector (anything with detectMultiScale).
+        frame (np.ndarray): Source frame (BGR, or single-channel grayscale).
+        gray (np.ndarray): Equalized grayscale version of the frame.
+    """
+    if getattr(face_detector, "input_color", False) is True and frame.ndim == 3:  # Plain cascades lack the attribute
+        return frame
+    return gray
+
+# name -> function returning a new detector instance
+FACE_DETECTORS = {
+    HaarFaceDetector.name: HaarFaceDetector,
+    DnnFaceDetector.name: DnnFaceDetector.load,
+}
+_DESCRIPTIONS = {
+    HaarFaceDetector.name: HaarFaceDetector.description,
+    DnnFaceDetector.name: DnnFaceDetector.description,
+}
+# Requested backend name -> (backend actually created, load error or None), for face_detector_info()
+_loaded = {}
+
+def register_face_detector(name, loader, description=""):
+    """
+    Registers a face detector backend selectable with FACE_DETECTOR=name.
+
+    Args:
+        name (str): Backend name.
+        loader (function): Returns a new detector instance (anything with detectMultiScale).
+        description (str): Short cost/accuracy note shown by face_detector_info().
+    """
+    FACE_DETECTORS[name] = loader
+    _DESCRIPTIONS[name] = description
+
+def face_detector_name():
+    """
+    Returns the configured backend name (FACE_DETECTOR, default "haar").
+    """
+    return os.environ.get("FACE_DETECTOR", HaarFaceDetector.name).lower()
+
+def create_face_detector(name=None):
+    """
+    Creates an instance of a face detector backend.
+    An unknown backend, or one whose model cannot be loaded, falls back to Haar (logged).
+
+    Args:
+        name (str, optional): Backend name (default: FACE_DETECTOR).
+    """
+    name = name or face_detector_name()
+    loader = FACE_DETECTORS.get(name)
+    if loader is None:
+        logging.error(f"[FaceDetector] Unknown face detector {name!r}; using haar.")
+        _loaded[name] = (HaarFaceDetector.name, "Unknown face detector")
+        return HaarFaceDetector()
+    try:
+        detector = loader()
+    except (OSError, cv2.error) as e:
+        logging.error(f"[FaceDetector] Could not load face detector {name!r} ({e}); using haar.")
+        _loaded[name] = (HaarFaceDetector.name, str(e))
+        return HaarFaceDetector()
+    _loaded[name] = (name, None)
+    return detector
+
+def face_detector_info():
+    """
+    Describes every registered backend and its measured cost in this process.
+    "active" marks the backend actually in use: Haar if the configured one (FACE_DETECTOR,
+    "requested") fell back when it was loaded, with "fallback" and the load "error" on the
+    requested entry. Before any detector is created, the configured backend is reported active.
+    Returns:
+        list: [{"name", "description", "active", "requested", "fallback", "error", "calls", "mean_ms"}]
+    """
+    requested = face_detector_name()
+    active, error = _loaded.get(requested, (requested, None))
+    with FaceDetector._stats_lock:
+        stats = {name: tuple(entry) for name, entry in FaceDetector._stats.items()}
+    info = []
+    for name in FACE_DETECTORS:
+        calls, seconds = stats.get(name, (0, 0.0))
+        info.append({
+            "name": name,
+            "description": _DESCRIPTIONS.get(name, ""),
+            "active": name == active,
+            "requested": name == requested,
+            "fallback": name == requested and active != requested,
+            "error": error if name == requested else None,
+            "calls": calls,
+            "mean_ms": seconds * 1000.0 / calls if calls else None,
+        })
+    return info
@@ -0,0 +1,119 @@
+"""
+Face Tracker.
+Reuses face boxes between consecutive frames of one video stream so that
+full-frame face detection only runs every N frames or when a face is lost.
+"""
+
+import os
+
+class FaceTracker:
+    """
+    Tracks face boxes for a single video stream.
+    Between full detections, faces are searched only in expanded regions
+    around their previous boxes, which is far cheaper than scanning the whole frame.
+    Not thread-safe: use one tracker per stream.
+    """
+
+    def __init__(self, redetect_interval=10, search_margin=0.5):
+        """
+        Args:
+            redetect_interval (int): Run full-frame detection at least every N frames.
+            search_margin (float): ROI expansion around a previous box, as a fraction of its size.
+        """
+        self.redetect_interval = redetect_interval
+        self.search_margin = search_margin
+        self._boxes = []
+        self._frames_since_full = 0
+
+    def get_state(self):
+        """
+        Returns the tracking state (to hand a tracker's progress across processes).
+        """
+        return list(self._boxes), self._frames_since_full
+
+    def set_state(self, state):
+        """
+        Restores tracking state produced by get_state().
+        """
+        boxes, frames_since_full = state
+        self._boxes = list(boxes)
+        self._frames_since_full = frames_since_full
+
+    def detect_faces(self, gray, face_cascade, scale_factor=1.3, min_neighbors=5):
+        """
+        Returns face boxes for the frame, tracking previous faces when possible.
+
+        Args:
+            gray (np.ndarray): Equalized grayscale frame (the BGR frame for colour-input backends).
+            face_cascade (CascadeClassifier): Face detector to use.
+            scale_factor (float): Cascade scaleFactor for face searches.
+            min_neighbors (int): Cascade minNeighbors for face searches.
+        Returns:
+            list: Face boxes as (x, y, w, h) tuples.
+        """
+        if not self._boxes or self._frames_since_full + 1 >= self.redetect_interval:
+            return self._detect_full(gray, face_cascade, scale_factor, min_neighbors)
+        tracked = []
+        for box in self._boxes:
+            found = self._search_near(gray, face_cascade, box, scale_factor, min_neighbors)
+            if found is None:
+                # Lost a face: tracking confidence dropped, fall back to a full scan
+                return self._detect_full(gray, face_cascade, scale_factor, min_neighbors)
+            tracked.append(found)
+        self._boxes = tracked
+        self._frames_since_full += 1
+        return tracked
+
+    def reset(self):
+        """
+        Forgets tracked faces so the next frame gets a full detection.
+        """
+        self._boxes = []
+        self._frames_since_full = 0
+
+    def _detect_full(self, gray, face_cascade, scale_factor=1.3, min_neighbors=5):
+        """
+        Runs full-frame face detection and restarts tracking from its result.
+        """
+        faces = face_cascade.detectMultiScale(gray, scale_factor, min_neighbors)
+        self._boxes = [tuple(int(v) for v in face) for face in faces]
+        self._frames_since_full = 0
+        return list(self._boxes)
+
+    def _search_near(self, gray, face_cascade, box, scale_factor=1.3, min_neighbors=5):
+        """
+        Searches for a face of similar size in an expanded ROI around a previous box.
+        Returns:
+            tuple or None: The candidate closest to the previous box, in frame coordinates.
+        """
+        x, y, w, h = box
+        mx, my = int(w * self.search_margin), int(h * self.search_margin)
+        x0, y0 = max(x - mx, 0), max(y - my, 0)
+        x1, y1 = min(x + w + mx, gray.shape[1]), min(y + h + my, gray.shape[0])
+        roi = gray[y0:y1, x0:x1]
+        if roi.size == 0:
+            return None
+        faces = face_cascade.detectMultiScale(
+            roi, scale_factor, min_neighbors,
+            minSize=(int(w * 0.7), int(h * 0.7)),
+            maxSize=(int(w * 1.4), int(h * 1.4)),
+        )
+        if len(faces) == 0:
+            return None
+        cx, cy = x + w / 2, y + h / 2
+        fx, fy, fw, fh = min(
+            faces,
+            key=lambda f: (x0 + f[0] + f[2] / 2 - cx) ** 2 + (y0 + f[1] + f[3] / 2 - cy) ** 2,
+        )
+        return int(x0 + fx), int(y0 + fy), int(fw), int(fh)
+
+def create_face_tracker():
+    """
+    Creates a FaceTracker from FACE_TRACKING_INTERVAL (full detection every N frames).
+    Returns:
+        FaceTracker or None: None if tracking is disabled (interval unset, 0 or 1).
+    """
+    interval = int(os.environ.get("FACE_TRACKING_INTERVAL", 0))
+    if interval <= 1:
+        return None
+    return FaceTracker(redetect_interval=interval)
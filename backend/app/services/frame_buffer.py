@@ -0,0 +1,235 @@
+"""
+Frame Ring Buffer.
+Fixed-size ring of the last N captured frames held in one preallocated array,
+so the capture loop decodes each frame straight into a reused slot instead of
+allocating a new ndarray per frame.
+
+Each slot carries the sequence number (version) and capture timestamp of the frame
+it holds. A slot's sequence number is cleared before the capture thread overwrites
+it, so a reader that copies a frame can tell afterwards whether the copy is intact.
+Readers that do not need a copy borrow a slot instead: a lease hands out a read-only
+view and keeps the capture thread away from that slot until it is released.
+"""
+
+import threading
+import cv2
+import numpy as np
+
+class FrameLease:
+    """
+    A borrowed ring buffer slot. Use as a context manager, or call release().
+    The frame stays unchanged until the lease is released.
+    """
+
+    __slots__ = ("frame", "seq", "timestamp", "_buffer", "_ring", "_index")
+
+    def __init__(self, buffer, ring, index, frame, seq, timestamp):
+        self._buffer = buffer
+        self._ring = ring
+        self._index = index
+        self.frame = frame  # Read-only view of the slot
+        self.seq = seq
+        self.timestamp = timestamp
+
+    def release(self):
+        """
+        Returns the slot to the capture thread. Releasing twice is harmless.
+        """
+        if self._buffer is not None:
+            self._buffer._release(self._ring, self._index)
+            self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+def convert_frame(frame, gray=False, scale=1.0):
+    """
+    Returns a new grayscale and/or downscaled image of a (read-only) frame.
+    Only the result is allocated: no full-size BGR copy is made first.
+
+    Args:
+        frame (np.ndarray): BGR frame.
+        gray (bool): Convert to single-channel grayscale.
+        scale (float): Resize factor (e.g., 0.5 for half width and height).
+    Returns:
+        np.ndarray: The converted image (a plain copy if neither option is set).
+    """
+    if scale != 1.0:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if gray else frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if gray else frame.copy()
+
+class FrameRingBuffer:
+    """
+    Ring buffer of the most recent frames of one camera.
+    Written by a single capture thread; read by any number of threads.
+    Slots lent out through acquire() are skipped by the writer until released; while
+    every slot except the newest is lent out, new frames are not stored.
+    """
+
+    def __init__(self, capacity=4):
+        """
+        Args:
+            capacity (int): Number of frames kept (at least 3, so the newest frame
+                is never the slot being written even while one frame is lent out).
+        """
+        self.capacity = max(int(capacity), 3)
+        self._lock = threading.Lock()
+        self._frames = None                   # (capacity, height, width, channels) array, allocated on first frame
+        self._seqs = [0] * self.capacity      # 0: empty or being written
+        self._timestamps = [None] * self.capacity
+        self._pins = [0] * self.capacity     # Active leases per slot
+        self._head = None                     # Slot index of the newest frame
+        self._writing = None                  # Slot index handed out by begin_write
+
+    def begin_write(self):
+        """
+        Claims the oldest slot that is not lent out for the next frame and invalidates its contents.
+
+        Returns:
+            tuple: (writable, slot). writable is False if every other slot is lent out
+            (skip this frame). slot is the array to decode into, or None before the first
+            frame (the caller then passes a freshly decoded frame to commit()).
+        """
+        with self._lock:
+            start = 0 if self._head is None else self._head + 1
+            for offset in range(self.capacity):
+                index = (start + offset) % self.capacity
+                if index != self._head and not self._pins[index]:
+                    break
+            else:
+                self._writing = None
+                return False, None
+            self._seqs[index] = 0
+            self._timestamps[index] = None
+            self._writing = index
+            return True, self._frames[index] if self._frames is not None else None
+
+    def commit(self, frame, seq, timestamp):
+        """
+        Publishes the frame written into the slot claimed by begin_write().
+        A frame decoded elsewhere (first frame, or a resolution change) is copied in,
+        reallocating the ring if its shape or dtype changed.
+
+        Args:
+            frame (np.ndarray): The decoded frame (normally the slot itself).
+            seq (int): Frame sequence number (> 0).
+            timestamp (float): Capture time (epoch seconds).
+        Returns:
+            np.ndarray or None: The slot now holding the frame, or None if the buffer
+            was cleared since begin_write().
+        """
+        with self._lock:
+            index = self._writing
+            if index is None:
+                return None
+            if self._frames is None or self._frames.shape[1:] != frame.shape or self._frames.dtype != frame.dtype:
+                # Readers holding views of the old ring keep it alive; its slots are all invalidated here
+                self._frames = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+                self._seqs = [0] * self.capacity
+                self._timestamps = [None] * self.capacity
+                self._pins = [0] * self.capacity  # Leases on the old ring release into that ring only
+            slot = self._frames[index]
+            if frame.__array_interface__["data"][0] != slot.__array_interface__["data"][0]:
+                np.copyto(slot, frame)
+            self._seqs[index] = seq
+            self._timestamps[index] = timestamp
+            self._head = index
+            self._writing = None
+            return slot
+
+    def _find(self, seq):
+        """
+        Returns the slot index holding seq (the newest frame if seq is None), or None. Caller holds the lock.
+        """
+        if self._head is None:
+            return None
+        if seq is None:
+            return self._head if self._seqs[self._head] else None
+        try:
+            return self._seqs.index(seq)
+        except ValueError:
+            return None
+
+    def copy(self, seq=None):
+        """
+        Copies a buffered frame out of the ring.
+
+        Args:
+            seq (int, optional): Sequence number of the frame; None for the newest one.
+        Returns:
+            tuple or None: (frame copy, seq, timestamp), or None if the frame is not
+            (or, after copying, no longer) in the buffer.
+        """
+        with self._lock:
+            index = self._find(seq)
+            if index is None:
+                return None
+            view, seq, timestamp = self._frames[index], self._seqs[index], self._timestamps[index]
+        frame = view.copy()  # Outside the lock: the capture thread is never blocked on a memcpy
+        with self._lock:
+            if self._seqs[index] != seq:
+                return None
+        return frame, seq, timestamp
+
+    def acquire(self, seq=None):
+        """
+        Borrows a buffered frame without copying it.
+
+        Args:
+            seq (int, optional): Sequence number of the frame; None for the newest one.
+        Returns:
+            FrameLease or None: Lease with a read-only view of the frame, or None if the
+            frame is not in the buffer. Release it promptly.
+        """
+        with self._lock:
+            index = self._find(seq)
+            if index is None:
+                return None
+            self._pins[index] += 1
+            frame = self._frames[index]
+            frame.flags.writeable = False  # A fresh view: the ring itself stays writable
+            return FrameLease(self, self._frames, index, frame, self._seqs[index], self._timestamps[index])
+
+    def _release(self, ring, index):
+        """
+        Drops one lease on a slot (ignored if the ring was reallocated meanwhile).
+        """
+        with self._lock:
+            if ring is self._frames and self._pins[index]:
+                self._pins[index] -= 1
+
+    def window(self, count):
+        """
+        Copies up to count of the newest buffered frames, oldest first.
+        Frames overwritten while copying are left out.
+
+        Returns:
+            list: [(frame copy, seq, timestamp), ...]
+        """
+        with self._lock:
+            seqs = sorted(seq for seq in self._seqs if seq)[-count:] if count > 0 else []
+        return [item for item in (self.copy(seq) for seq in seqs) if item is not None]
+
+    def latest_info(self):
+        """
+        Returns (seq, timestamp) of the newest buffered frame, or (0, None) if empty.
+        """
+        with self._lock:
+            index = self._find(None)
+            return (self._seqs[index], self._timestamps[index]) if index is not None else (0, None)
+
+    def clear(self):
+        """
+        Invalidates every buffered frame (the preallocated array is kept for reuse).
+        Frames currently lent out stay unchanged until their leases are released.
+        """
+        with self._lock:
+            self._seqs = [0] * self.capacity
+            self._timestamps = [None] * self.capacity
+            self._head = None
+            self._writing = None
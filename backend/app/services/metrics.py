@@ -0,0 +1,198 @@
+"""
+Metrics.
+Low-overhead stage timers, counters and gauges for the detection path,
+rendered in the Prometheus text exposition format for GET /metrics.
+
+Stage timers also record into a per-thread collector when one is active, so
+the timings of a single frame can be attached to its result (Server-Timing).
+"""
+
+import time
+import threading
+
+# Histogram buckets for stage durations (seconds)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+COUNTERS = {
+    "smile_frames_captured_total": "Frames read from cameras",
+    "smile_frames_dropped_total": "Frames replaced before the detection worker reached them",
+    "smile_frames_processed_total": "Frames run through smile detection",
+    "smile_detections_total": "Processed frames with at least one smile",
+    "smile_empty_results_total": "Processed frames without a smile",
+    "smile_detections_coalesced_total": "Detection calls served by sharing an in-flight detection of the same frame",
+    "smile_detections_rejected_total": "On-demand detections turned away by the concurrency limit",
+}
+
+class _StageTimer:
+    """
+    Context manager timing one stage execution.
+    """
+
+    __slots__ = ("_metrics", "_stage", "_started")
+
+    def __init__(self, metrics, stage):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe(self._stage, time.perf_counter() - self._started)
+        return False
+
+class _Collector:
+    """
+    Context manager that captures the stage timings recorded by the current thread.
+    """
+
+    def __init__(self, local):
+        self._local = local
+        self.timings = {}
+
+    def __enter__(self):
+        self._previous = getattr(self._local, "timings", None)
+        self._local.timings = self.timings
+        return self.timings
+
+    def __exit__(self, *exc):
+        self._local.timings = self._previous
+        return False
+
+class Metrics:
+    """
+    Process-wide metrics registry: stage duration histograms, counters and scrape-time gauges.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stages = {}    # stage -> [bucket counts..., +Inf count], sum
+        self._counters = {}  # (name, labels tuple) -> value
+        self._gauges = {}    # name -> (help, function returning {labels tuple: value} or a number)
+
+    def time_stage(self, stage):
+        """
+        Returns a context manager that records the duration of the enclosed block.
+
+        Args:
+            stage (str): Stage name, e.g., "face" or "encode".
+        """
+        return _StageTimer(self, stage)
+
+    def observe(self, stage, seconds):
+        """
+        Records one stage duration (seconds).
+        """
+        timings = getattr(self._local, "timings", None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        index = len(self._buckets)
+        for i, bound in enumerate(self._buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = [[0] * (len(self._buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += seconds
+
+    def record_timings(self, timings):
+        """
+        Records stage durations measured elsewhere (e.g., in a worker process).
+        """
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def collect_timings(self):
+        """
+        Returns a context manager yielding a dict that receives every stage
+        duration recorded by this thread inside the block.
+        """
+        return _Collector(self._local)
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increments a counter.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def get(self, name, **labels):
+        """
+        Returns a counter's current value (0 if never incremented).
+        """
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def register_gauge(self, name, help_text, func):
+        """
+        Registers a gauge evaluated at scrape time.
+
+        Args:
+            name (str): Metric name.
+            help_text (str): HELP line.
+            func (function): Returns a number, or a dict mapping label tuples to numbers.
+        """
+        self._gauges[name] = (help_text, func)
+
+    def render(self):
+        """
+        Renders all metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            stages = {stage: (list(counts), total) for stage, (counts, total) in self._stages.items()}
+            counters = dict(self._counters)
+        lines = [
+            "# HELP smile_stage_seconds Time spent per detection path stage",
+            "# TYPE smile_stage_seconds histogram",
+        ]
+        for stage in sorted(stages):
+            counts, total = stages[stage]
+            cumulative = 0
+            for bound, count in zip(self._buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'smile_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'smile_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'smile_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+        for name, help_text in COUNTERS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            samples = sorted((labels, value) for (counter, labels), value in counters.items() if counter == name)
+            for labels, value in samples or [((), 0)]:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, (help_text, func) in sorted(self._gauges.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            value = func()
+            if isinstance(value, dict):
+                for labels, sample in sorted(value.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {sample}")
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels):
+    """
+    Formats ((name, value), ...) as a Prometheus label set.
+    """
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+def server_timing(timings, **extra):
+    """
+    Formats stage durations (seconds) as a Server-Timing header value (milliseconds).
+    """
+    entries = dict(timings or {})
+    entries.update(extra)
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in entries.items())
+
+# Shared registry for the whole process
+metrics = Metrics()
@@ -0,0 +1,247 @@
+"""
+Process-Pool Detection Engine.
+Optional backend that runs smile detection in worker processes so that
+concurrent detections (several cameras, batch jobs) scale with CPU cores
+instead of contending for the GIL. Frames are handed over through shared memory.
+
+Enable with DETECTION_BACKEND=process; DETECTION_WORKERS sets the pool size.
+"""
+
+import os
+import sys
+import queue
+import logging
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+
+from app.services.smile_detector import detect_smile_on_frame, decode_image, load_cascades, warm_up_cascades
+from app.services.metrics import metrics
+
+# ----------- Worker process side ------------
+
+_worker_cascades = None   # (face, smile) cascades owned by this worker process
+_worker_segments = {}     # Shared memory segments attached by this worker, by name
+
+def _init_worker():
+    """
+    Process pool initializer: loads this worker's own cascades once.
+    """
+    global _worker_cascades
+    _worker_cascades = load_cascades()
+
+def _attach_segment(name):
+    """
+    Attaches to a parent-owned shared memory segment without taking ownership of it.
+    """
+    segment = _worker_segments.get(name)
+    if segment is not None:
+        return segment
+    if sys.version_info >= (3, 13):
+        segment = shared_memory.SharedMemory(name=name, track=False)
+    else:
+        # Before 3.13 attaching registers the segment with the resource tracker,
+        # which would unlink it when this worker exits; the parent owns its lifetime.
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            segment = shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+    if len(_worker_segments) >= 64:
+        # Slots were reallocated by the parent; drop stale attachments
+        for stale in _worker_segments.values():
+            stale.close()
+        _worker_segments.clear()
+    _worker_segments[name] = segment
+    return segment
+
+def _detect_shared_frame(name, shape, dtype, encode_image, face_tracker):
+    """
+    Worker task: runs detection on a frame stored in shared memory.
+    Returns the detection result, the updated tracker state (None without tracker)
+    and the stage timings, which only the parent process exposes.
+    """
+    segment = _attach_segment(name)
+    frame = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+    face_cascade, smile_cascade = _worker_cascades
+    with metrics.collect_timings() as timings:
+        result = detect_smile_on_frame(
+            frame,
+            face_cascade=face_cascade,
+            smile_cascade=smile_cascade,
+            encode_image=encode_image,
+            face_tracker=face_tracker,
+        )
+    return result, face_tracker.get_state() if face_tracker is not None else None, timings
+
+def _warm_up_worker():
+    """
+    Worker task: warms up this worker's cascades and returns its process id.
+    """
+    warm_up_cascades(*_worker_cascades)
+    return os.getpid()
+
+def _detect_encoded_image(image_bytes):
+    """
+    Worker task: decodes one encoded image and returns its coords ([] if none), or None if undecodable.
+    """
+    frame = decode_image(image_bytes)
+    if frame is None:
+        return None
+    face_cascade, smile_cascade = _worker_cascades
+    result = detect_smile_on_frame(
+        frame,
+        face_cascade=face_cascade,
+        smile_cascade=smile_cascade,
+        encode_image=False,
+    )
+    return result[1] if result is not None else []
+
+# ----------- Parent process side ------------
+
+class ProcessPoolDetector:
+    """
+    Runs detect_smile_on_frame in a pool of worker processes.
+    Frames are copied once into a reusable shared memory slot instead of being pickled;
+    only the small result (JPEG bytes and coords) travels back.
+    """
+
+    def __init__(self, workers=None):
+        self._workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=multiprocessing.get_context("spawn"),  # Never fork a process that owns capture threads
+            initializer=_init_worker,
+        )
+        # Two slots per worker keep every worker busy while the next frame is being copied
+        self._slots = queue.Queue()
+        self._all_slots = []
+        for _ in range(self._workers * 2):
+            self._slots.put(None)  # Allocated lazily, sized to the first frame
+        self._lock = threading.Lock()
+        self._closed = False
+        logging.info(f"[ProcessDetector] Started process pool with {self._workers} workers.")
+
+    @property
+    def workers(self):
+        """
+        Returns the number of worker processes.
+        """
+        return self._workers
+
+    def detect(self, frame, encode_image=True, face_tracker=None):
+        """
+        Detects smiles in a frame using a worker process.
+        Same contract as detect_smile_on_frame; the caller's frame is never modified.
+
+        Args:
+            frame (np.ndarray): Image frame (BGR).
+            encode_image (bool): If False, skip drawing and JPEG encoding.
+            face_tracker (FaceTracker, optional): Stream tracker; its state travels
+                to the worker and back, so any worker can serve the next frame.
+        Returns:
+            tuple or None: (JPEG bytes or None, [coords]) or None if no smile detected.
+        """
+        if frame is None:
+            logging.warning("No frame received for smile detection.")
+            return None
+        frame = np.ascontiguousarray(frame)
+        slot = self._slots.get()  # Blocks when every slot is in flight (backpressure)
+        try:
+            slot = self._ensure_slot(slot, frame.nbytes)
+            np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.buf)[...] = frame
+            future = self._executor.submit(
+                _detect_shared_frame, slot.name, frame.shape, frame.dtype.str, encode_image, face_tracker
+            )
+            result, tracker_state, timings = future.result()
+            metrics.record_timings(timings)
+            if face_tracker is not None:
+                face_tracker.set_state(tracker_state)
+            return result
+        finally:
+            self._slots.put(slot)
+
+    def detect_encoded(self, images):
+        """
+        Detects smiles in many encoded images across the worker processes.
+
+        Args:
+            images (list[bytes]): Encoded images (JPEG, PNG, ...).
+        Returns:
+            list: Same format as smile_detector.detect_smiles_in_images.
+        """
+        if not images:
+            return []
+        return list(self._executor.map(_detect_encoded_image, images))
+
+    def warm_up(self):
+        """
+        Starts the worker processes (each loads its cascades) and runs a dummy detection in them.
+        Returns:
+            int: Number of distinct workers that ran a warmup task.
+        """
+        futures = [self._executor.submit(_warm_up_worker) for _ in range(self._workers)]
+        return len({future.result() for future in futures})
+
+    def close(self):
+        """
+        Shuts down the worker processes and releases all shared memory.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._executor.shutdown(wait=True)
+        for segment in self._all_slots:
+            segment.close()
+            segment.unlink()
+        self._all_slots = []
+        logging.info("[ProcessDetector] Process pool stopped.")
+
+    def _ensure_slot(self, slot, nbytes):
+        """
+        Returns a shared memory slot of at least nbytes, (re)allocating it if needed.
+        """
+        if slot is not None and slot.size >= nbytes:
+            return slot
+        with self._lock:
+            if slot is not None:
+                self._all_slots.remove(slot)
+                slot.close()
+                slot.unlink()
+            slot = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._all_slots.append(slot)
+        return slot
+
+# ----------- Shared engine ------------
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_process_detector():
+    """
+    Returns the shared ProcessPoolDetector when DETECTION_BACKEND=process, creating it on first use.
+    Returns:
+        ProcessPoolDetector or None: None when the in-process backend is configured.
+    """
+    global _engine
+    if os.environ.get("DETECTION_BACKEND", "thread") != "process":
+        return None
+    with _engine_lock:
+        if _engine is None:
+            workers = int(os.environ.get("DETECTION_WORKERS", 0)) or None
+            _engine = ProcessPoolDetector(workers=workers)
+        return _engine
+
+def shutdown_process_detector():
+    """
+    Shuts down the shared ProcessPoolDetector, if one was created.
+    """
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.close()
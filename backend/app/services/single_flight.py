@@ -0,0 +1,110 @@
+"""
+Single-Flight Detection.
+Coalesces concurrent requests for the same work: while one caller computes the
+result for a key (e.g., a camera's frame K), every other caller asking for that
+key waits for and shares the same result instead of starting its own.
+New computations are bounded by a concurrency limit; callers beyond it are
+turned away immediately so they can fall back to a cached (stale) result or a 503.
+"""
+
+import os
+import threading
+from app.services.metrics import metrics
+
+class Overloaded(Exception):
+    """
+    Raised when a computation cannot start (concurrency limit reached)
+    or its shared result did not arrive within the wait timeout.
+    """
+
+class _Flight:
+    """
+    One in-progress computation and the outcome its waiters receive.
+    """
+
+    __slots__ = ("done", "result", "error", "limited")
+
+    def __init__(self, limited):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.limited = limited
+
+class SingleFlight:
+    """
+    Thread-safe single-flight group with a limit on concurrently running computations.
+    """
+
+    def __init__(self, max_inflight=None, wait_timeout=None):
+        """
+        Args:
+            max_inflight (int, optional): Maximum limited computations running at once (None: unbounded).
+            wait_timeout (float, optional): Seconds a limited caller waits for a shared result (None: forever).
+        """
+        self.max_inflight = max_inflight
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._running = 0  # Limited computations in progress
+
+    def do(self, key, func, limited=True):
+        """
+        Returns func()'s result, computing it at most once across concurrent callers with the same key.
+        Exceptions raised by func reach every caller of that flight.
+
+        Args:
+            key (hashable): Identity of the work, e.g., (camera_id, frame seq).
+            func (function): Computes the result; called without arguments.
+            limited (bool): Count against max_inflight and wait at most wait_timeout.
+                Background workers that must not be turned away pass False.
+        Raises:
+            Overloaded: If a new limited computation would exceed max_inflight, or waiting timed out.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                if limited and self.max_inflight is not None and self._running >= self.max_inflight:
+                    metrics.inc("smile_detections_rejected_total")
+                    raise Overloaded("Too many detections in flight")
+                flight = self._flights[key] = _Flight(limited)
+                if limited:
+                    self._running += 1
+        if not leader:
+            metrics.inc("smile_detections_coalesced_total")
+            if not flight.done.wait(self.wait_timeout if limited else None):
+                metrics.inc("smile_detections_rejected_total")
+                raise Overloaded("Timed out waiting for an in-flight detection")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = func()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.limited:
+                    self._running -= 1
+            flight.done.set()
+
+    def inflight(self):
+        """
+        Returns the number of computations currently in progress.
+        """
+        with self._lock:
+            return len(self._flights)
+
+def create_single_flight():
+    """
+    Creates a SingleFlight from DETECTION_MAX_INFLIGHT (default 2; 0 = unbounded)
+    and DETECTION_WAIT_TIMEOUT (seconds, default 2).
+    """
+    max_inflight = int(os.environ.get("DETECTION_MAX_INFLIGHT", 2))
+    return SingleFlight(
+        max_inflight=max_inflight if max_inflight > 0 else None,
+        wait_timeout=float(os.environ.get("DETECTION_WAIT_TIMEOUT", 2.0)),
+    )
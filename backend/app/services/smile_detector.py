@@ -5,78 +5,244 @@ Improved: More accurate smile detection using OpenCV.
 
 import cv2
 import logging
+import os
+import threading
+import time
+import numpy as np
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from app.services.detection_profile import get_detection_profile
+from app.services.face_detectors import create_face_detector, face_input
+from app.services.metrics import metrics
 
-# Use the alternative smile cascade (sometimes more accurate)
-smile_cascade_global = cv2.CascadeClassifier(
-    cv2.data.haarcascades + 'haarcascade_smile.xml'
-)
-face_cascade_global = cv2.CascadeClassifier(
-    cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-)
+def load_cascades():
+    """
+    Loads a new (face detector, smile cascade) pair.
+    The face detector is the backend selected with FACE_DETECTOR (Haar cascade by default).
+    """
+    return (
+        create_face_detector(),
+        # Use the alternative smile cascade (sometimes more accurate)
+        cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_smile.xml'),
+    )
+
+class CascadePool:
+    """
+    Bounded pool of (face, smile) cascade pairs shared by all detection threads.
+    A CascadeClassifier must not run detectMultiScale from two threads at once, so each
+    detection checks out a pair of its own; OpenCV releases the GIL while scanning, so
+    detections holding different pairs run truly in parallel. Pairs are loaded on demand,
+    up to the pool size; beyond it, callers wait for a pair to be returned.
+    """
+
+    def __init__(self, size=None, loader=load_cascades):
+        """
+        Args:
+            size (int, optional): Maximum pairs (default CASCADE_POOL_SIZE or CPU count, read on first use).
+            loader (function): Returns a new (face, smile) pair.
+        """
+        self._size = size
+        self._loader = loader
+        self._cond = threading.Condition()
+        self._idle = []    # Returned pairs, reused most recently returned first
+        self._created = 0
+
+    @property
+    def size(self):
+        """
+        Returns the maximum number of cascade pairs.
+        """
+        if self._size is None:
+            self._size = max(int(os.environ.get("CASCADE_POOL_SIZE", os.cpu_count() or 1)), 1)
+        return self._size
+
+    def acquire(self):
+        """
+        Checks out a cascade pair, loading a new one if none is idle and the pool is not full.
+        Blocks while every pair is in use. Return it with release().
+        """
+        with self._cond:
+            while not self._idle and self._created >= self.size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self._loader()  # Outside the lock: loading takes tens of milliseconds
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, cascades):
+        """
+        Returns a pair checked out with acquire().
+        """
+        with self._cond:
+            self._idle.append(cascades)
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self):
+        """
+        Context manager yielding a (face, smile) pair for the duration of the block.
+        """
+        cascades = self.acquire()
+        try:
+            yield cascades
+        finally:
+            self.release(cascades)
+
+    def stats(self):
+        """
+        Returns pool occupancy.
+        Returns:
+            dict: {"size", "created", "idle", "in_use"}
+        """
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "in_use": self._created - len(self._idle),
+            }
+
+def find_smile_candidates(smile_cascade, roi_gray, profile):
+    """
+    Runs the smile cascade on a lower-face region.
+
+    Args:
+        smile_cascade (CascadeClassifier): Smile cascade.
+        roi_gray (np.ndarray): Equalized grayscale lower-face region.
+        profile (DetectionProfile): Smile search parameters.
+    Returns:
+        list: Candidate boxes as (x, y, w, h), relative to the region.
+    """
+    # Improved detection parameters
+    return smile_cascade.detectMultiScale(
+        roi_gray,
+        scaleFactor=profile.smile_scale_factor,    # More thorough scan
+        minNeighbors=profile.smile_min_neighbors,  # Require more neighbor rectangles to reduce false positives
+        minSize=profile.smile_min_size,            # Ignore tiny "smiles" (less likely to be real)
+        maxSize=profile.smile_max_size,            # Ignore huge "smiles"
+        flags=cv2.CASCADE_SCALE_IMAGE
+    )
+
+def select_smile(smiles, profile):
+    """
+    Picks the smile of a face among its candidate boxes.
+
+    Args:
+        smiles (list): Candidate boxes from find_smile_candidates().
+        profile (DetectionProfile): Smile filters.
+    Returns:
+        tuple or None: The largest candidate wide enough to be a smile, or None.
+    """
+    best_box = None
+    for (sx, sy, sw, sh) in smiles:
+        aspect_ratio = sw / float(sh)
+        # Smiles are typically wide, so require a high aspect ratio
+        if aspect_ratio > profile.min_smile_aspect:
+            # Keep the largest smile (if multiple detected)
+            if (best_box is None) or (sw * sh > best_box[2] * best_box[3]):
+                best_box = (sx, sy, sw, sh)
+    return best_box
 
 def detect_smile_on_frame(
     frame,
     face_cascade=None,
     smile_cascade=None,
     imencode_func=None,
+    encode_image=True,
+    face_tracker=None,
+    detection_scale=None,
+    profile=None,
 ):
     """
     Detects faces and smiles in the given frame.
     Draws bounding boxes on detected smiles and returns encoded image and coordinates.
 
     Args:
-        frame (np.ndarray): Image frame (BGR).
-        face_cascade (CascadeClassifier, optional): Inject for testing or override default.
+        frame (np.ndarray): Image frame (BGR, or single-channel grayscale). Boxes are drawn on it
+            in place; a read-only frame is left untouched and copied for drawing instead.
+        face_cascade (CascadeClassifier or FaceDetector, optional): Inject for testing or override
+            default (the configured face detector backend of a pair checked out from the shared pool).
         smile_cascade (CascadeClassifier, optional): Inject for testing or override default.
         imencode_func (function, optional): Inject for testing/mocking cv2.imencode.
+        encode_image (bool): If False, skip drawing and JPEG encoding (coords-only callers).
+        face_tracker (FaceTracker, optional): Reuse face boxes from previous frames of the same stream.
+        detection_scale (float, optional): Search faces on a frame downscaled by this factor (0-1],
+            then run smile detection on full-resolution lower-face ROIs. Defaults to DETECTION_SCALE or 1.0.
+            Returned coords are always in original-frame space.
+        profile (DetectionProfile, optional): Cascade parameters and smile filters
+            (default: the DETECTION_PROFILE profile, or the built-in defaults).
     Returns:
         tuple: (JPEG image bytes, [coords]) or None if no smile detected.
+        With encode_image=False the image bytes are None.
     """
     if frame is None:
         logging.warning("No frame received for smile detection.")
         return None
-    
-    fc = face_cascade if face_cascade is not None else face_cascade_global
-    sc = smile_cascade if smile_cascade is not None else smile_cascade_global
+    if face_cascade is None or smile_cascade is None:
+        with cascade_pool.checkout() as (pooled_face, pooled_smile):
+            return detect_smile_on_frame(
+                frame,
+                face_cascade=face_cascade if face_cascade is not None else pooled_face,
+                smile_cascade=smile_cascade if smile_cascade is not None else pooled_smile,
+                imencode_func=imencode_func,
+                encode_image=encode_image,
+                face_tracker=face_tracker,
+                detection_scale=detection_scale,
+                profile=profile,
+            )
+
+    fc = face_cascade
+    sc = smile_cascade
     imencode = imencode_func if imencode_func is not None else cv2.imencode
+    profile = profile if profile is not None else get_detection_profile()
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    gray = cv2.equalizeHist(gray)  # Improve contrast for detection
+    with metrics.time_stage("preprocess"):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        gray = cv2.equalizeHist(gray)  # Improve contrast for detection
 
-    faces = fc.detectMultiScale(gray, 1.3, 5)
+        face_image = face_input(fc, frame, gray)  # Cascades search gray, colour backends (DNN) the BGR frame
+        scale = detection_scale if detection_scale is not None else float(os.environ.get("DETECTION_SCALE", 1.0))
+        if 0 < scale < 1:
+            # Faces are large: find them on a smaller image, then map boxes back to full resolution
+            face_image = cv2.resize(face_image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            scale = 1.0
+
+    with metrics.time_stage("face"):
+        if face_tracker is not None:
+            faces = face_tracker.detect_faces(face_image, fc, profile.face_scale_factor, profile.face_min_neighbors)
+        else:
+            faces = fc.detectMultiScale(face_image, profile.face_scale_factor, profile.face_min_neighbors)
+    if scale != 1.0:
+        faces = [(int(x / scale), int(y / scale), int(w / scale), int(h / scale)) for (x, y, w, h) in faces]
     coords = []
+    smile_started = time.perf_counter()
 
     for (x, y, w, h) in faces:
-        # Focus only on the lower 50% of the face where smiles are likely
-        lower_face_start = int(h * 0.5)
+        # Focus only on the lower part of the face (lower 50% by default) where smiles are likely
+        lower_face_start = int(h * profile.lower_face_split)
         roi_gray = gray[y + lower_face_start:y + h, x:x + w]
 
-        # Improved detection parameters
-        smiles = sc.detectMultiScale(
-            roi_gray,
-            scaleFactor=1.3,     # More thorough scan
-            minNeighbors=25,     # Require more neighbor rectangles to reduce false positives
-            minSize=(25, 25),    # Ignore tiny "smiles" (less likely to be real)
-            maxSize=(200, 200),  # Ignore huge "smiles"
-            flags=cv2.CASCADE_SCALE_IMAGE
-        )
-
-        #print(f"Faces found: {len(faces)} | Smile regions: {len(smiles)} | Valid smiles: {len([s for s in smiles if (s[2]/s[3]) > 2.0])}")
-
-        best_box = None
-        for (sx, sy, sw, sh) in smiles:
-            aspect_ratio = sw / float(sh)
-            # Smiles are typically wide, so require a high aspect ratio
-            if aspect_ratio > 2.0:
-                # Keep the largest smile (if multiple detected)
-                if (best_box is None) or (sw * sh > best_box[2] * best_box[3]):
-                    best_box = (sx, sy, sw, sh)
+        smiles = find_smile_candidates(sc, roi_gray, profile)
+        best_box = select_smile(smiles, profile)
 
         if best_box and len(smiles) >= 1:  # Require at least 1 valid smile
             sx, sy, sw, sh = best_box
             # Adjust sy for the lower face ROI offset
             sy_adjusted = sy + lower_face_start
-            cv2.rectangle(frame, (x + sx, y + sy_adjusted), (x + sx + sw, y + sy_adjusted + sh), (0, 255, 0), 2)
+            if encode_image:
+                if not frame.flags.writeable:
+                    # Borrowed (read-only) frame: draw on a private copy, made only once there is something to draw
+                    with metrics.time_stage("frame_copy"):
+                        frame = frame.copy()
+                color = (0, 255, 0) if frame.ndim == 3 else 255
+                cv2.rectangle(frame, (x + sx, y + sy_adjusted), (x + sx + sw, y + sy_adjusted + sh), color, 2)
             coords.append({
                 "x": int(x + sx),
                 "y": int(y + sy_adjusted),
@@ -84,8 +250,15 @@ def detect_smile_on_frame(
                 "h": int(sh)
             })
 
+    if len(faces):
+        metrics.observe("smile", time.perf_counter() - smile_started)
+
+    if coords and not encode_image:
+        return None, coords
+
     if coords:
-        success, img_encoded = imencode('.jpg', frame)
+        with metrics.time_stage("encode"):
+            success, img_encoded = imencode('.jpg', frame)
         if success:
             return img_encoded.tobytes(), coords
         else:
@@ -93,3 +266,109 @@ def detect_smile_on_frame(
             return None
 
     return None
+
+
+# Cascade pairs for every in-process detection (pipeline workers, request threads, batch and offline workers)
+cascade_pool = CascadePool()
+
+def warm_up_cascades(face_cascade, smile_cascade, frame=None):
+    """
+    Runs every detection stage once on a synthetic frame (face search, smile search, JPEG encoding
+    and decoding), so OpenCV's one-time initialization is not paid by the first real detection.
+    Stage metrics are not recorded.
+
+    Args:
+        face_cascade (CascadeClassifier or FaceDetector): Face detector to warm up.
+        smile_cascade (CascadeClassifier): Smile cascade to warm up.
+        frame (np.ndarray, optional): BGR frame to use (default: 320x240 noise).
+    """
+    if frame is None:
+        frame = np.random.default_rng(0).integers(0, 256, (240, 320, 3), dtype=np.uint8)
+    profile = get_detection_profile()
+    gray = cv2.equalizeHist(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    face_cascade.detectMultiScale(gray, profile.face_scale_factor, profile.face_min_neighbors)
+    find_smile_candidates(smile_cascade, gray[gray.shape[0] // 2:], profile)  # Faces are unlikely on noise
+    _, encoded = cv2.imencode('.jpg', frame)
+    cv2.imdecode(encoded, cv2.IMREAD_REDUCED_GRAYSCALE_2)  # Uploaded frames are decoded too
+
+def warm_up(pairs=1):
+    """
+    Loads cascade pairs into the shared pool and warms each one up.
+
+    Args:
+        pairs (int): Pairs to load (at most the pool size).
+    Returns:
+        int: Number of pairs warmed up.
+    """
+    pairs = min(max(int(pairs), 1), cascade_pool.size)
+    checked_out = [cascade_pool.acquire() for _ in range(pairs)]  # Held together, so each one is a distinct pair
+    try:
+        for face_cascade, smile_cascade in checked_out:
+            warm_up_cascades(face_cascade, smile_cascade)
+    finally:
+        for cascades in checked_out:
+            cascade_pool.release(cascades)
+    return pairs
+
+# Decode flags by (reduction factor, grayscale)
+_DECODE_FLAGS = {
+    (1, False): cv2.IMREAD_COLOR,
+    (1, True): cv2.IMREAD_GRAYSCALE,
+    (2, False): cv2.IMREAD_REDUCED_COLOR_2,
+    (2, True): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (4, False): cv2.IMREAD_REDUCED_COLOR_4,
+    (4, True): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    (8, False): cv2.IMREAD_REDUCED_COLOR_8,
+    (8, True): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+DECODE_REDUCTIONS = (1, 2, 4, 8)
+
+def decode_image(image_bytes, reduce=1, gray=False):
+    """
+    Decodes encoded image bytes (JPEG, PNG, ...) into a frame.
+    The bytes are wrapped, not copied; a reduced decode produces the smaller image directly
+    (JPEG is decoded at reduced scale, so the full-size image is never materialized).
+
+    Args:
+        image_bytes (bytes): Encoded image data.
+        reduce (int): Decode at 1/reduce of the width and height (1, 2, 4 or 8).
+        gray (bool): Decode to single-channel grayscale instead of BGR.
+    Returns:
+        np.ndarray or None: Decoded frame, or None if the data is not a valid image.
+    Raises:
+        ValueError: If reduce is not 1, 2, 4 or 8.
+    """
+    flags = _DECODE_FLAGS.get((reduce, bool(gray)))
+    if flags is None:
+        raise ValueError(f"reduce must be one of {DECODE_REDUCTIONS}")
+    if not image_bytes:
+        return None
+    return cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flags)
+
+def _detect_encoded_image(image_bytes):
+    """
+    Batch worker: decodes one image and returns its smile coords ([] if none), or None if undecodable.
+    """
+    frame = decode_image(image_bytes)
+    if frame is None:
+        return None
+    result = detect_smile_on_frame(frame, encode_image=False)
+    return result[1] if result is not None else []
+
+def detect_smiles_in_images(images, max_workers=None):
+    """
+    Runs smile detection over many encoded images using a thread pool.
+    OpenCV releases the GIL while decoding and scanning, so workers run in parallel.
+
+    Args:
+        images (list[bytes]): Encoded images (JPEG, PNG, ...).
+        max_workers (int, optional): Worker threads (default BATCH_DETECTION_WORKERS or CPU count).
+    Returns:
+        list: One entry per input, in order: list of coords ([] if no smile),
+        or None if the image could not be decoded.
+    """
+    if not images:
+        return []
+    max_workers = max_workers or int(os.environ.get("BATCH_DETECTION_WORKERS", os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(images))) as executor:
+        return list(executor.map(_detect_encoded_image, images))
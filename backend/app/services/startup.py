@@ -0,0 +1,134 @@
+"""
+Startup and Readiness.
+Times the startup phases (background writers, detection engine, pipelines, warmup)
+and tracks whether the service is ready for detection traffic.
+
+Warmup runs in a background thread once the server accepts connections, so the
+liveness check (GET /) answers at once while the readiness check (GET /ready)
+returns 503 until the detector is loaded and has run a dummy detection.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from app.services.process_detector import get_process_detector
+from app.services.smile_detector import warm_up
+
+class StartupTracker:
+    """
+    Records how long each startup phase took and whether startup has completed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._created = time.perf_counter()
+        self._phases = {}         # Phase name -> seconds, in completion order
+        self._ready_after = None  # Seconds from creation (module import) until ready
+        self._error = None
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager timing one startup phase (logged and reported by status()).
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._phases[name] = elapsed
+            logging.info(f"[Startup] {name} took {elapsed * 1000:.1f} ms")
+
+    def mark_ready(self):
+        """
+        Marks startup as complete.
+        """
+        with self._lock:
+            self._ready_after = time.perf_counter() - self._created
+            self._error = None
+        logging.info(f"[Startup] Ready after {self._ready_after * 1000:.1f} ms")
+
+    def mark_failed(self, error):
+        """
+        Records a startup failure; the service stays not ready.
+        """
+        with self._lock:
+            self._error = str(error)
+        logging.error(f"[Startup] Startup failed: {error}")
+
+    @property
+    def ready(self):
+        """
+        Returns True once startup has completed.
+        """
+        with self._lock:
+            return self._ready_after is not None
+
+    def run_in_background(self, name, func):
+        """
+        Runs func as a timed phase in a daemon thread, then marks startup as complete
+        (or failed, if func raised).
+
+        Returns:
+            threading.Thread: The started thread.
+        """
+        def run():
+            try:
+                with self.phase(name):
+                    func()
+            except Exception as e:
+                self.mark_failed(e)
+            else:
+                self.mark_ready()
+        thread = threading.Thread(target=run, daemon=True, name=f"startup-{name}")
+        thread.start()
+        return thread
+
+    def phases(self):
+        """
+        Returns the completed phases.
+        Returns:
+            dict: {phase: seconds}
+        """
+        with self._lock:
+            return dict(self._phases)
+
+    def status(self):
+        """
+        Returns the readiness report.
+        Returns:
+            dict: {"ready", "startup_ms" (import to ready, None until ready),
+            "phases": {phase: ms}, "error" (None unless startup failed)}
+        """
+        with self._lock:
+            return {
+                "ready": self._ready_after is not None,
+                "startup_ms": self._ready_after * 1000.0 if self._ready_after is not None else None,
+                "phases": {name: seconds * 1000.0 for name, seconds in self._phases.items()},
+                "error": self._error,
+            }
+
+def warm_up_detection():
+    """
+    Warms up the configured detection backend: every worker of the process-pool engine,
+    or WARMUP_CASCADE_PAIRS (default 1) cascade pairs of the in-process pool.
+    """
+    engine = get_process_detector()
+    if engine is not None:
+        count = engine.warm_up()
+        logging.info(f"[Startup] Warmed up {count} detection worker processes.")
+    else:
+        count = warm_up(int(os.environ.get("WARMUP_CASCADE_PAIRS", 1)))
+        logging.info(f"[Startup] Warmed up {count} cascade pairs.")
+
+def warmup_enabled():
+    """
+    Returns False if STARTUP_WARMUP=0 (ready as soon as the server has started).
+    """
+    return os.environ.get("STARTUP_WARMUP", "1") != "0"
+
+# Startup state of this process
+startup_tracker = StartupTracker()
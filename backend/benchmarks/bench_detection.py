@@ -0,0 +1,295 @@
+"""
+Detection Hot-Path Benchmarks.
+Measures detect_smile_on_frame per stage (preprocessing, face search, smile search,
+JPEG encoding) and the /detect_smile route, on synthetic frames at several
+resolutions and face counts and, optionally, on recorded frames.
+Results are written as JSON; --compare flags regressions against a stored baseline.
+
+Usage:
+    python -m benchmarks.bench_detection --output results.json
+    python -m benchmarks.bench_detection --frames recorded/ --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+from unittest.mock import patch
+import cv2
+import numpy as np
+
+from app.services.smile_detector import detect_smile_on_frame
+
+DEFAULT_RESOLUTIONS = ("640x480", "1280x720", "1920x1080")
+DEFAULT_FACE_COUNTS = (0, 1, 4)
+STAGES = ("total", "preprocess", "face", "smile", "encode")
+
+def percentiles(samples):
+    """
+    Summarizes latency samples (seconds) as milliseconds percentiles and throughput.
+    Returns:
+        dict: {"n", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms", "fps"}
+    """
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    mean = float(values.mean())
+    return {
+        "n": int(values.size),
+        "mean_ms": mean,
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+        "fps": 1000.0 / mean if mean > 0 else None,
+    }
+
+class _StageClock:
+    """
+    Accumulates time spent in one stage during a single detection call.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def timed(self, func):
+        """
+        Wraps func so that its run time is added to this clock.
+        """
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.elapsed += time.perf_counter() - started
+        return wrapper
+
+class _TimedCascade:
+    """
+    Cascade proxy that times detectMultiScale and can pin the returned boxes.
+    Pinned boxes let synthetic frames exercise the per-face smile, drawing and
+    encoding stages while the real cascade search still runs (and is timed).
+    """
+
+    def __init__(self, cascade, clock, pinned=None):
+        self._cascade = cascade
+        self._clock = clock
+        self._pinned = pinned
+
+    def detectMultiScale(self, *args, **kwargs):
+        found = self._clock.timed(self._cascade.detectMultiScale)(*args, **kwargs)
+        return found if self._pinned is None else self._pinned
+
+def synthetic_frame(width, height, faces, seed=0):
+    """
+    Builds a reproducible textured frame and face boxes laid out on a grid.
+    Returns:
+        tuple: (frame, [(x, y, w, h), ...])
+    """
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, size=(height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8)
+    frame = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    boxes = []
+    if faces:
+        columns = int(np.ceil(np.sqrt(faces)))
+        size = min(width, height) // (columns + 1)
+        for i in range(faces):
+            row, column = divmod(i, columns)
+            boxes.append((column * size + size // 2, row * size + size // 2, size, size))
+    return frame, boxes
+
+def load_recorded_frames(directory, limit=20):
+    """
+    Loads up to limit images from a directory of recorded frames, in name order.
+    """
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        if len(frames) >= limit:
+            break
+        frame = cv2.imread(os.path.join(directory, name))
+        if frame is not None:
+            frames.append((name, frame))
+    return frames
+
+def bench_detection(frame, face_boxes=None, iterations=30, warmup=3, face_cascade=None, smile_cascade=None):
+    """
+    Times detect_smile_on_frame on one frame, per stage.
+
+    Args:
+        frame (np.ndarray): BGR frame (not modified).
+        face_boxes (list, optional): Face boxes to pin (synthetic frames), each reported with one
+            smile; None keeps real detections.
+        iterations (int): Timed runs.
+        warmup (int): Untimed runs first.
+        face_cascade, smile_cascade (CascadeClassifier, optional): Cascades to benchmark (default: OpenCV's).
+    Returns:
+        dict: Stage name -> percentiles() summary.
+    """
+    face_cascade = face_cascade or cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    smile_cascade = smile_cascade or cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_smile.xml')
+    samples = {stage: [] for stage in STAGES}
+    smile_boxes = None
+    if face_boxes:
+        _, _, w, h = face_boxes[0]
+        smile_boxes = [(w // 4, h // 10, w // 2, w // 5)]  # Wide box inside the lower-face ROI
+    for run in range(warmup + iterations):
+        face_clock, smile_clock, encode_clock = _StageClock(), _StageClock(), _StageClock()
+        started = time.perf_counter()
+        detect_smile_on_frame(
+            frame.copy(),
+            face_cascade=_TimedCascade(face_cascade, face_clock, pinned=face_boxes),
+            smile_cascade=_TimedCascade(smile_cascade, smile_clock, pinned=smile_boxes),
+            imencode_func=encode_clock.timed(cv2.imencode),
+            detection_scale=1.0,
+        )
+        total = time.perf_counter() - started
+        if run < warmup:
+            continue
+        samples["total"].append(total)
+        samples["face"].append(face_clock.elapsed)
+        samples["smile"].append(smile_clock.elapsed)
+        samples["encode"].append(encode_clock.elapsed)
+        samples["preprocess"].append(max(total - face_clock.elapsed - smile_clock.elapsed - encode_clock.elapsed, 0.0))
+    return {stage: percentiles(values) for stage, values in samples.items()}
+
+def bench_route(image_bytes, iterations=200, warmup=20):
+    """
+    Times GET /detect_smile serving a cached result, fresh (200) and conditional (304),
+    through the in-process ASGI test client.
+    Returns:
+        dict: {"route_200": percentiles(), "route_304": percentiles()}
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # One log line per request would skew the timings
+
+    client = TestClient(app)
+    latest = {"image": image_bytes, "coords": [{"x": 10, "y": 20, "w": 60, "h": 25}], "seq": 1, "timestamp": time.time()}
+    results = {}
+    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=latest):
+        for name, headers, expected in (("route_200", {}, 200), ("route_304", {"If-None-Match": '"1"'}, 304)):
+            samples = []
+            for run in range(warmup + iterations):
+                started = time.perf_counter()
+                response = client.get("/detect_smile", headers=headers)
+                elapsed = time.perf_counter() - started
+                if response.status_code != expected:
+                    raise RuntimeError(f"/detect_smile returned {response.status_code}, expected {expected}")
+                if run >= warmup:
+                    samples.append(elapsed)
+            results[name] = percentiles(samples)
+    return results
+
+def run_suite(resolutions=DEFAULT_RESOLUTIONS, face_counts=DEFAULT_FACE_COUNTS, frames_dir=None,
+              iterations=30, warmup=3, route_iterations=200, seed=0):
+    """
+    Runs every benchmark case.
+    Returns:
+        dict: {"meta": {...}, "results": {case name: {stage: summary}}}
+    """
+    results = {}
+    for resolution in resolutions:
+        width, height = (int(v) for v in resolution.split("x"))
+        for faces in face_counts:
+            frame, boxes = synthetic_frame(width, height, faces, seed=seed)
+            results[f"synthetic/{resolution}/faces={faces}"] = bench_detection(frame, boxes, iterations, warmup)
+    if frames_dir:
+        for name, frame in load_recorded_frames(frames_dir):
+            height, width = frame.shape[:2]
+            results[f"recorded/{name}/{width}x{height}"] = bench_detection(frame, None, iterations, warmup)
+    if route_iterations:
+        frame, _ = synthetic_frame(640, 480, 0, seed=seed)
+        image_bytes = cv2.imencode(".jpg", frame)[1].tobytes()
+        results["route/detect_smile"] = bench_route(image_bytes, route_iterations, max(route_iterations // 10, 1))
+    meta = {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "cv2_threads": cv2.getNumThreads(),
+        "iterations": iterations,
+        "seed": seed,
+    }
+    return {"meta": meta, "results": results}
+
+def compare(current, baseline, threshold=0.10, metric="p50_ms"):
+    """
+    Flags cases/stages whose latency metric grew by more than threshold versus the baseline.
+    Cases or stages missing from either run are ignored.
+
+    Returns:
+        list: [{"case", "stage", "baseline", "current", "change"}] for each regression.
+    """
+    regressions = []
+    for case, stages in current["results"].items():
+        for stage, summary in stages.items():
+            old = baseline.get("results", {}).get(case, {}).get(stage, {}).get(metric)
+            new = summary.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change > threshold:
+                regressions.append({"case": case, "stage": stage, "baseline": old, "current": new, "change": change})
+    return regressions
+
+def _print_table(report):
+    """
+    Prints a human-readable summary of the total/route rows.
+    """
+    print(f"{'case':<45} {'stage':<10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'fps':>9}")
+    for case, stages in report["results"].items():
+        for stage, s in stages.items():
+            print(f"{case:<45} {stage:<10} {s['p50_ms']:>9.2f} {s['p90_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['fps'] or 0:>9.1f}")
+
+def main(argv=None):
+    """
+    Command-line entry point. Exits with status 1 if --compare finds regressions.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the smile detection hot path.")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--resolutions", default=",".join(DEFAULT_RESOLUTIONS), help="Comma-separated WxH list")
+    parser.add_argument("--faces", default=",".join(str(n) for n in DEFAULT_FACE_COUNTS), help="Comma-separated face counts")
+    parser.add_argument("--frames", help="Directory of recorded frames to benchmark as well")
+    parser.add_argument("--iterations", type=int, default=30, help="Timed runs per detection case")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed runs per detection case")
+    parser.add_argument("--route-iterations", type=int, default=200, help="Timed /detect_smile requests (0 skips)")
+    parser.add_argument("--threads", type=int, help="cv2.setNumThreads value (pin for reproducible numbers)")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic frame seed")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown (default 0.10)")
+    parser.add_argument("--metric", default="p50_ms", help="Metric compared against the baseline (default p50_ms)")
+    args = parser.parse_args(argv)
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+    report = run_suite(
+        resolutions=[r for r in args.resolutions.split(",") if r],
+        face_counts=[int(n) for n in args.faces.split(",") if n],
+        frames_dir=args.frames,
+        iterations=args.iterations,
+        warmup=args.warmup,
+        route_iterations=args.route_iterations,
+        seed=args.seed,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    _print_table(report)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, threshold=args.threshold, metric=args.metric)
+        for r in regressions:
+            print(f"REGRESSION {r['case']} [{r['stage']}]: {r['baseline']:.2f} -> {r['current']:.2f} ms ({r['change']:+.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions above {args.threshold:.0%} ({args.metric}) against {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
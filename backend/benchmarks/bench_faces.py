@@ -0,0 +1,108 @@
+"""
+Face Detector Backend Comparison.
+Runs every registered face detector backend (app.services.face_detectors) on the same
+frames and reports its cost (per-frame latency) and, on a labeled image set,
+its accuracy (precision/recall of face boxes at IoU >= 0.5).
+
+Usage:
+    python -m benchmarks.bench_faces --labeled labeled_frames/ --output faces.json
+    python -m benchmarks.bench_faces --backends haar,dnn --resolutions 640x480
+"""
+
+import sys
+import json
+import time
+import argparse
+import cv2
+
+from app.services.face_detectors import FACE_DETECTORS, face_input
+from benchmarks.bench_detection import percentiles, synthetic_frame
+from benchmarks.labeled import load_labeled_images, match_boxes, precision_recall
+
+def evaluate_face_detector(detector, samples, iterations=1):
+    """
+    Measures one detector on labeled samples.
+
+    Args:
+        detector: Face detector (anything with detectMultiScale).
+        samples (list): [(name, frame, {"faces": [...]})] as returned by load_labeled_images.
+        iterations (int): Timed runs per sample (the first run's boxes are scored).
+    Returns:
+        dict: {"latency": percentiles(), "precision", "recall", "true_positives", "false_positives", "false_negatives"}
+    """
+    samples_s, totals = [], [0, 0, 0]
+    for _, frame, labels in samples:
+        gray = cv2.equalizeHist(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        image = face_input(detector, frame, gray)  # Same input as the detection path
+        for run in range(iterations):
+            started = time.perf_counter()
+            faces = detector.detectMultiScale(image, 1.3, 5)
+            samples_s.append(time.perf_counter() - started)
+            if run == 0:
+                for i, count in enumerate(match_boxes([tuple(int(v) for v in f) for f in faces], labels["faces"])):
+                    totals[i] += count
+    precision, recall = precision_recall(*totals)
+    return {
+        "latency": percentiles(samples_s),
+        "precision": precision,
+        "recall": recall,
+        "true_positives": totals[0],
+        "false_positives": totals[1],
+        "false_negatives": totals[2],
+    }
+
+def run_comparison(backends=None, labeled_dir=None, resolutions=("640x480", "1280x720"), iterations=20):
+    """
+    Compares face detector backends. Backends that cannot be loaded (e.g., missing model files) are reported as such.
+    Returns:
+        dict: {backend: {"synthetic/<WxH>": {"latency": ...}, "labeled": {...}} or {"error": str}}
+    """
+    report = {}
+    for name in backends or list(FACE_DETECTORS):
+        try:
+            detector = FACE_DETECTORS[name]()
+        except (KeyError, OSError, cv2.error) as e:
+            report[name] = {"error": str(e)}
+            continue
+        results = {}
+        for resolution in resolutions:
+            width, height = (int(v) for v in resolution.split("x"))
+            frame, _ = synthetic_frame(width, height, 0)
+            results[f"synthetic/{resolution}"] = evaluate_face_detector(detector, [("synthetic", frame, {"faces": []})], iterations)
+        if labeled_dir:
+            results["labeled"] = evaluate_face_detector(detector, load_labeled_images(labeled_dir))
+        report[name] = results
+    return report
+
+def main(argv=None):
+    """
+    Command-line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Compare face detector backends by cost and accuracy.")
+    parser.add_argument("--backends", help="Comma-separated backend names (default: all registered)")
+    parser.add_argument("--labeled", help="Labeled image directory (with labels.json) for precision/recall")
+    parser.add_argument("--resolutions", default="640x480,1280x720", help="Comma-separated WxH list for latency")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed runs per synthetic frame")
+    parser.add_argument("--output", default="face_detectors.json", help="JSON results file")
+    args = parser.parse_args(argv)
+
+    report = run_comparison(
+        backends=[b for b in args.backends.split(",") if b] if args.backends else None,
+        labeled_dir=args.labeled,
+        resolutions=[r for r in args.resolutions.split(",") if r],
+        iterations=args.iterations,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, results in report.items():
+        if "error" in results:
+            print(f"{name:<8} unavailable: {results['error']}")
+            continue
+        for case, r in results.items():
+            accuracy = f"  precision {r['precision']:.2f}  recall {r['recall']:.2f}" if case == "labeled" else ""
+            print(f"{name:<8} {case:<22} p50 {r['latency']['p50_ms']:8.2f} ms{accuracy}")
+    print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
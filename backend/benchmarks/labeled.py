@@ -0,0 +1,76 @@
+"""
+Labeled Image Sets.
+Loading and scoring helpers for local labeled images, shared by the accuracy benchmarks.
+
+A labeled set is a directory of images with a labels.json file mapping each image
+file name to its ground-truth boxes:
+
+    {"frame_001.jpg": {"faces": [[x, y, w, h], ...], "smiles": [[x, y, w, h], ...]}, ...}
+
+Images without an entry are skipped; a missing key means no boxes of that kind.
+"""
+
+import os
+import json
+import cv2
+
+LABELS_FILE = "labels.json"
+
+def load_labeled_images(directory, limit=None):
+    """
+    Loads the labeled images of a directory, in file name order.
+    Returns:
+        list: [(name, frame, {"faces": [...], "smiles": [...]})]
+    Raises:
+        FileNotFoundError: If the directory has no labels.json.
+    """
+    with open(os.path.join(directory, LABELS_FILE)) as f:
+        labels = json.load(f)
+    samples = []
+    for name in sorted(labels):
+        if limit is not None and len(samples) >= limit:
+            break
+        frame = cv2.imread(os.path.join(directory, name))
+        if frame is None:
+            continue
+        entry = labels[name]
+        samples.append((name, frame, {
+            "faces": [tuple(box) for box in entry.get("faces", [])],
+            "smiles": [tuple(box) for box in entry.get("smiles", [])],
+        }))
+    return samples
+
+def iou(a, b):
+    """
+    Returns the intersection over union of two (x, y, w, h) boxes.
+    """
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+def match_boxes(predicted, truth, threshold=0.5):
+    """
+    Greedily matches predicted to ground-truth boxes by IoU.
+    Returns:
+        tuple: (true positives, false positives, false negatives)
+    """
+    unmatched = list(truth)
+    true_positives = 0
+    for box in predicted:
+        best = max(unmatched, key=lambda t: iou(box, t), default=None)
+        if best is not None and iou(box, best) >= threshold:
+            unmatched.remove(best)
+            true_positives += 1
+    return true_positives, len(predicted) - true_positives, len(unmatched)
+
+def precision_recall(true_positives, false_positives, false_negatives):
+    """
+    Returns (precision, recall); each is 1.0 when its denominator is zero.
+    """
+    predicted = true_positives + false_positives
+    actual = true_positives + false_negatives
+    return (true_positives / predicted if predicted else 1.0, true_positives / actual if actual else 1.0)
@@ -0,0 +1,213 @@
+"""
+Cascade Parameter Tuning.
+Sweeps the detection profile (app.services.detection_profile) over a labeled image set,
+measures smile precision/recall (IoU against the labeled smile boxes) and per-frame
+latency for every configuration, and reports the Pareto front: the configurations
+that no other configuration beats on precision, recall and latency at once.
+One front configuration is written as a profile file loadable with DETECTION_PROFILE.
+
+Each stage is computed once per distinct set of parameters it depends on: face boxes per
+face setting, smile candidates per face setting and smile search setting. The aspect filter
+is applied to cached candidates. A configuration's latency is the sum of the measured
+stage times it would run (preprocessing, face search, smile searches).
+
+Usage:
+    python -m benchmarks.tune_cascades --labeled labeled_frames/ --profile detection_profile.json
+    python -m benchmarks.tune_cascades --labeled labeled_frames/ --grid grid.json --max-latency-ms 15
+"""
+
+import sys
+import json
+import time
+import argparse
+import itertools
+import cv2
+
+from app.services.detection_profile import DetectionProfile, DEFAULT_PROFILE
+from app.services.face_detectors import face_input
+from app.services.smile_detector import find_smile_candidates, select_smile, load_cascades
+from benchmarks.labeled import load_labeled_images, match_boxes, precision_recall
+
+# Values swept per profile field; fields left out keep their default value
+DEFAULT_GRID = {
+    "face_scale_factor": [1.1, 1.2, 1.3],
+    "face_min_neighbors": [3, 5, 7],
+    "smile_scale_factor": [1.1, 1.3, 1.5],
+    "smile_min_neighbors": [15, 20, 25, 30],
+    "smile_min_size": [[15, 15], [25, 25]],
+    "lower_face_split": [0.4, 0.5, 0.6],
+    "min_smile_aspect": [1.5, 2.0, 2.5],
+}
+
+def parameter_grid(grid):
+    """
+    Expands a grid into profiles (every combination of the listed values).
+
+    Args:
+        grid (dict): {field: [values]}; unlisted fields keep their defaults.
+    Returns:
+        list: DetectionProfile instances, in grid order.
+    """
+    names = list(grid)
+    return [DEFAULT_PROFILE.replace(**dict(zip(names, values))) for values in itertools.product(*(grid[n] for n in names))]
+
+def evaluate_profiles(samples, profiles, face_detector, smile_cascade, iou_threshold=0.5):
+    """
+    Scores every profile on labeled samples.
+
+    Args:
+        samples (list): [(name, frame, {"smiles": [...]})] as returned by load_labeled_images.
+        profiles (list): DetectionProfile instances.
+        face_detector: Face detector (anything with detectMultiScale).
+        smile_cascade (CascadeClassifier): Smile cascade.
+        iou_threshold (float): Minimum IoU for a detected smile to match a labeled one.
+    Returns:
+        list: One dict per profile: {"profile", "precision", "recall", "f1", "latency_ms",
+        "true_positives", "false_positives", "false_negatives"}.
+    """
+    grays, preprocess_s = [], 0.0
+    for _, frame, _ in samples:
+        started = time.perf_counter()
+        grays.append(cv2.equalizeHist(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)))  # Same input as the detection path
+        preprocess_s += time.perf_counter() - started
+
+    face_cache = {}   # (image, face params) -> (faces, seconds)
+    smile_cache = {}  # (image, face params, smile params) -> ([(face, lower_face_start, candidates)], seconds)
+
+    def faces_of(i, profile):
+        key = (i, profile.face_scale_factor, profile.face_min_neighbors)
+        if key not in face_cache:
+            started = time.perf_counter()
+            image = face_input(face_detector, samples[i][1], grays[i])  # Same input as the detection path
+            faces = face_detector.detectMultiScale(image, profile.face_scale_factor, profile.face_min_neighbors)
+            face_cache[key] = ([tuple(int(v) for v in f) for f in faces], time.perf_counter() - started)
+        return key, face_cache[key]
+
+    def smiles_of(i, profile):
+        face_key, (faces, face_s) = faces_of(i, profile)
+        key = face_key + (profile.lower_face_split, profile.smile_scale_factor, profile.smile_min_neighbors,
+                          profile.smile_min_size, profile.smile_max_size)
+        if key not in smile_cache:
+            started = time.perf_counter()
+            found = []
+            for (x, y, w, h) in faces:
+                lower_face_start = int(h * profile.lower_face_split)
+                roi_gray = grays[i][y + lower_face_start:y + h, x:x + w]
+                found.append(((x, y), lower_face_start, find_smile_candidates(smile_cascade, roi_gray, profile)))
+            smile_cache[key] = (found, time.perf_counter() - started)
+        found, smile_s = smile_cache[key]
+        return found, face_s + smile_s
+
+    results = []
+    for profile in profiles:
+        totals, seconds = [0, 0, 0], preprocess_s
+        for i, (_, _, labels) in enumerate(samples):
+            found, stage_s = smiles_of(i, profile)
+            seconds += stage_s
+            predicted = []
+            for (x, y), lower_face_start, candidates in found:
+                best_box = select_smile(candidates, profile)
+                if best_box:
+                    sx, sy, sw, sh = (int(v) for v in best_box)
+                    predicted.append((x + sx, y + sy + lower_face_start, sw, sh))
+            for k, count in enumerate(match_boxes(predicted, labels["smiles"], iou_threshold)):
+                totals[k] += count
+        precision, recall = precision_recall(*totals)
+        results.append({
+            "profile": profile.to_dict(),
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "latency_ms": seconds * 1000.0 / len(samples) if samples else 0.0,
+            "true_positives": totals[0],
+            "false_positives": totals[1],
+            "false_negatives": totals[2],
+        })
+    return results
+
+def _dominates(a, b):
+    """
+    Returns True if result a is at least as good as b on precision, recall and latency, and better on one.
+    """
+    at_least = a["precision"] >= b["precision"] and a["recall"] >= b["recall"] and a["latency_ms"] <= b["latency_ms"]
+    better = a["precision"] > b["precision"] or a["recall"] > b["recall"] or a["latency_ms"] < b["latency_ms"]
+    return at_least and better
+
+def pareto_front(results):
+    """
+    Returns the results not dominated by any other result, fastest first.
+    """
+    front = [r for r in results if not any(_dominates(other, r) for other in results)]
+    return sorted(front, key=lambda r: (r["latency_ms"], -r["f1"]))
+
+def select_profile(front, max_latency_ms=None):
+    """
+    Picks the front entry with the best F1 within the latency budget (ties: the faster one).
+    If no entry fits the budget, the fastest entry is returned.
+
+    Returns:
+        dict or None: The chosen result, or None for an empty front.
+    """
+    within = [r for r in front if max_latency_ms is None or r["latency_ms"] <= max_latency_ms]
+    if not within:
+        return min(front, key=lambda r: r["latency_ms"], default=None)
+    return max(within, key=lambda r: (r["f1"], -r["latency_ms"]))
+
+def run_tuning(labeled_dir, grid=None, iou_threshold=0.5, limit=None):
+    """
+    Evaluates the grid on a labeled directory with the configured face detector backend.
+    Returns:
+        dict: {"evaluated", "samples", "baseline": default profile result, "front": [results]}
+    """
+    samples = load_labeled_images(labeled_dir, limit=limit)
+    profiles = parameter_grid(grid or DEFAULT_GRID)
+    if DEFAULT_PROFILE not in profiles:
+        profiles.append(DEFAULT_PROFILE)
+    face_detector, smile_cascade = load_cascades()
+    results = evaluate_profiles(samples, profiles, face_detector, smile_cascade, iou_threshold)
+    baseline = next(r for r in results if r["profile"] == DEFAULT_PROFILE.to_dict())
+    return {"evaluated": len(results), "samples": len(samples), "baseline": baseline, "front": pareto_front(results)}
+
+def main(argv=None):
+    """
+    Command-line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Tune cascade parameters for accuracy vs. latency.")
+    parser.add_argument("--labeled", required=True, help="Labeled image directory (with labels.json)")
+    parser.add_argument("--grid", help="JSON file of {field: [values]} replacing the default grid")
+    parser.add_argument("--iou", type=float, default=0.5, help="Minimum IoU for a smile to count as found")
+    parser.add_argument("--limit", type=int, help="Use at most this many labeled images")
+    parser.add_argument("--max-latency-ms", type=float, help="Latency budget for the selected profile")
+    parser.add_argument("--output", default="tuning.json", help="JSON report (baseline and Pareto front)")
+    parser.add_argument("--profile", default="detection_profile.json", help="Selected profile file (for DETECTION_PROFILE)")
+    args = parser.parse_args(argv)
+
+    grid = None
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+        DetectionProfile(**{name: values[0] for name, values in grid.items()})  # Fail early on unknown fields
+    report = run_tuning(args.labeled, grid=grid, iou_threshold=args.iou, limit=args.limit)
+    if not report["samples"]:
+        print(f"No labeled images found in {args.labeled}")
+        return 1
+    selected = select_profile(report["front"], args.max_latency_ms)
+    report["selected"] = selected
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    with open(args.profile, "w") as f:
+        json.dump(selected["profile"], f, indent=2)
+
+    baseline = report["baseline"]
+    print(f"{report['evaluated']} configurations on {report['samples']} images; {len(report['front'])} on the Pareto front")
+    print(f"{'default':<9} {baseline['latency_ms']:8.2f} ms  precision {baseline['precision']:.2f}  "
+          f"recall {baseline['recall']:.2f}  f1 {baseline['f1']:.2f}")
+    for r in report["front"]:
+        marker = "selected" if r is selected else ""
+        print(f"{marker:<9} {r['latency_ms']:8.2f} ms  precision {r['precision']:.2f}  "
+              f"recall {r['recall']:.2f}  f1 {r['f1']:.2f}  {json.dumps(r['profile'])}")
+    print(f"Report written to {args.output}; selected profile written to {args.profile}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
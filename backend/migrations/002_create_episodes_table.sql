@@ -0,0 +1,13 @@
+-- 002_create_episodes_table.sql
+CREATE TABLE IF NOT EXISTS episodes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    camera_id TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    frame_count INTEGER NOT NULL,
+    best_x INTEGER NOT NULL,
+    best_y INTEGER NOT NULL,
+    best_w INTEGER NOT NULL,
+    best_h INTEGER NOT NULL,
+    image_path TEXT
+);
@@ -0,0 +1,105 @@
+"""
+API route tests for upload detection endpoints (single raw frame and batch).
+Mocks the detection service to isolate API logic.
+"""
+
+import json
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.main import app
+
+client = TestClient(app)
+
+def test_detect_smile_batch_success():
+    """
+    Ensures /detect_smile/batch returns per-image coords and decode errors in upload order.
+    """
+    fake_coords = [{"x": 1, "y": 2, "w": 3, "h": 4}]
+    files = [
+        ("files", ("a.jpg", b"aaa", "image/jpeg")),
+        ("files", ("b.jpg", b"bbb", "image/jpeg")),
+        ("files", ("c.txt", b"ccc", "text/plain")),
+    ]
+    with patch("app.routes.batch.detect_smiles_in_images", return_value=[fake_coords, [], None]) as fake_detect:
+        response = client.post("/detect_smile/batch", files=files)
+        assert response.status_code == 200
+        fake_detect.assert_called_once_with([b"aaa", b"bbb", b"ccc"])
+    assert response.json() == {"results": [
+        {"filename": "a.jpg", "coords": fake_coords},
+        {"filename": "b.jpg", "coords": []},
+        {"filename": "c.txt", "error": "Could not decode image"},
+    ]}
+
+def test_detect_smile_batch_too_many_images(monkeypatch):
+    """
+    Ensures /detect_smile/batch rejects batches larger than MAX_BATCH_IMAGES with 413.
+    """
+    monkeypatch.setenv("MAX_BATCH_IMAGES", "1")
+    files = [("files", ("a.jpg", b"a", "image/jpeg")), ("files", ("b.jpg", b"b", "image/jpeg"))]
+    response = client.post("/detect_smile/batch", files=files)
+    assert response.status_code == 413
+
+def test_detect_smile_batch_exception():
+    """
+    Ensures /detect_smile/batch returns 500 if detection raises.
+    """
+    with patch("app.routes.batch.detect_smiles_in_images", side_effect=Exception("fail")):
+        response = client.post("/detect_smile/batch", files=[("files", ("a.jpg", b"a", "image/jpeg"))])
+        assert response.status_code == 500
+
+def jpeg_bytes(width=160, height=120):
+    """
+    Returns a blank JPEG of the given size.
+    """
+    return cv2.imencode(".jpg", np.zeros((height, width, 3), dtype=np.uint8))[1].tobytes()
+
+def test_detect_smile_upload_returns_coords_in_upload_pixels():
+    """
+    Ensures POST /detect_smile decodes straight to reduced grayscale and scales coords back up.
+    """
+    fake_coords = [{"x": 10, "y": 20, "w": 30, "h": 10}]
+    with patch("app.routes.batch.detect_smile_on_frame", return_value=(None, fake_coords)) as fake_detect:
+        response = client.post("/detect_smile?reduce=4&gray=true", content=jpeg_bytes(),
+                               headers={"Content-Type": "image/jpeg"})
+    assert response.status_code == 200
+    assert response.json() == {"coords": [{"x": 40, "y": 80, "w": 120, "h": 40}]}
+    frame = fake_detect.call_args[0][0]
+    assert frame.shape == (30, 40) and fake_detect.call_args[1]["encode_image"] is False
+
+def test_detect_smile_upload_annotated_image_and_no_smile():
+    """
+    Ensures annotate=true returns the JPEG with coords in a header, and 204 without a smile.
+    """
+    coords = [{"x": 1, "y": 2, "w": 3, "h": 4}]
+    with patch("app.routes.batch.detect_smile_on_frame", return_value=(b"jpeg", coords)):
+        response = client.post("/detect_smile?annotate=true", content=jpeg_bytes(),
+                               headers={"Content-Type": "image/jpeg"})
+    assert response.status_code == 200 and response.content == b"jpeg"
+    assert response.headers["content-type"] == "image/jpeg"
+    assert json.loads(response.headers["x-smile-coords"]) == coords
+    response = client.post("/detect_smile?annotate=true", content=jpeg_bytes(),
+                           headers={"Content-Type": "application/octet-stream"})
+    assert response.status_code == 204
+
+def test_detect_smile_upload_annotated_coords_match_reduced_image():
+    """
+    Ensures annotated coords refer to the returned (reduced) JPEG, with the scale to the upload in a header.
+    """
+    coords = [{"x": 10, "y": 20, "w": 30, "h": 10}]
+    with patch("app.routes.batch.detect_smile_on_frame", return_value=(b"jpeg", coords)):
+        response = client.post("/detect_smile?annotate=true&reduce=2", content=jpeg_bytes(),
+                               headers={"Content-Type": "image/jpeg"})
+    assert response.status_code == 200
+    assert json.loads(response.headers["x-smile-coords"]) == coords
+    assert response.headers["x-smile-coords-scale"] == "2"
+
+def test_detect_smile_upload_rejects_bad_input():
+    """
+    Ensures undecodable bodies and unsupported reductions return 400.
+    """
+    response = client.post("/detect_smile", content=b"garbage", headers={"Content-Type": "image/png"})
+    assert response.status_code == 400 and response.json() == {"error": "Could not decode image"}
+    response = client.post("/detect_smile?reduce=3", content=jpeg_bytes(), headers={"Content-Type": "image/jpeg"})
+    assert response.status_code == 400
@@ -0,0 +1,66 @@
+"""
+Unit tests for the detection benchmark suite.
+Runs the suite with tiny frames and few iterations so it stays fast.
+"""
+
+import json
+from benchmarks.bench_detection import percentiles, synthetic_frame, run_suite, compare, main
+
+def test_percentiles():
+    """
+    Ensures latency samples are summarized in milliseconds with throughput.
+    """
+    summary = percentiles([0.001] * 9 + [0.011])
+    assert summary["n"] == 10
+    assert summary["p50_ms"] == 1.0
+    assert summary["max_ms"] == 11.0
+    assert round(summary["fps"]) == 500
+
+def test_synthetic_frame_is_reproducible():
+    """
+    Ensures synthetic frames depend only on the seed and face boxes fit in the frame.
+    """
+    first, boxes = synthetic_frame(160, 120, 4, seed=3)
+    second, _ = synthetic_frame(160, 120, 4, seed=3)
+    assert first.shape == (120, 160, 3)
+    assert (first == second).all()
+    assert len(boxes) == 4
+    assert all(x + w <= 160 and y + h <= 120 for x, y, w, h in boxes)
+
+def test_run_suite_reports_every_stage():
+    """
+    Ensures each detection case reports all stages and the route cases are measured.
+    """
+    report = run_suite(resolutions=["160x120"], face_counts=[0, 2], iterations=2, warmup=0, route_iterations=2)
+    assert set(report["results"]) == {"synthetic/160x120/faces=0", "synthetic/160x120/faces=2", "route/detect_smile"}
+    assert set(report["results"]["synthetic/160x120/faces=2"]) == {"total", "preprocess", "face", "smile", "encode"}
+    assert set(report["results"]["route/detect_smile"]) == {"route_200", "route_304"}
+    assert report["meta"]["opencv"]
+
+def test_compare_flags_regressions_only_above_threshold():
+    """
+    Ensures only stages slower than the threshold are reported, and missing cases are ignored.
+    """
+    baseline = {"results": {"a": {"total": {"p50_ms": 10.0}, "smile": {"p50_ms": 0.0}}}}
+    current = {"results": {
+        "a": {"total": {"p50_ms": 12.0}, "smile": {"p50_ms": 5.0}},
+        "new": {"total": {"p50_ms": 1.0}},
+    }}
+    assert [r["stage"] for r in compare(current, baseline, threshold=0.1)] == ["total"]
+    assert compare(current, baseline, threshold=0.25) == []
+
+def test_main_writes_results_and_fails_on_regression(tmp_path):
+    """
+    Ensures the CLI writes JSON results and exits with 1 when the baseline was much faster.
+    """
+    output = tmp_path / "results.json"
+    args = ["--output", str(output), "--resolutions", "80x60", "--faces", "1", "--iterations", "2",
+            "--warmup", "0", "--route-iterations", "0"]
+    assert main(args) == 0
+    report = json.loads(output.read_text())
+    for stages in report["results"].values():
+        for summary in stages.values():
+            summary["p50_ms"] /= 100  # Pretend the baseline was 100x faster
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(report))
+    assert main(args + ["--compare", str(baseline)]) == 1
@@ -5,7 +5,41 @@ Mocks cv2.VideoCapture and threading as needed.
 
 import pytest
 import threading
-from app.services.camera_manager import CameraManager
+import cv2
+import numpy as np
+from app.services.camera_manager import CameraManager, CameraRegistry
+
+def make_frame(value):
+    """
+    Returns a small BGR frame filled with value.
+    """
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+class ScriptedCap:
+    """
+    Fake capture that delivers the given frames through grab()/retrieve(),
+    decoding into the passed buffer like OpenCV, then stops the camera.
+    """
+
+    def __init__(self, camera, frames):
+        self.camera = camera
+        self.frames = list(frames)
+        self.grabbed = None
+        self.retrieved = 0
+
+    def grab(self):
+        if not self.frames:
+            self.camera._running = False
+            return False
+        self.grabbed = self.frames.pop(0)
+        return True
+
+    def retrieve(self, image=None):
+        self.retrieved += 1
+        if image is not None and image.shape == self.grabbed.shape:
+            image[:] = self.grabbed
+            return True, image
+        return True, self.grabbed.copy()
 
 def test_start_and_stop(monkeypatch):
     """
@@ -14,7 +48,9 @@ def test_start_and_stop(monkeypatch):
     """
     class DummyCap:
         def isOpened(self): return True
-        def read(self): return (True, "dummy_frame")
+        def grab(self): return True
+        def retrieve(self, image=None): return (True, make_frame(1))
+        def set(self, *args): return True
         def release(self): pass
 
     cm = CameraManager()
@@ -31,13 +67,46 @@ def test_start_already_running(monkeypatch):
     """
     class DummyCap:
         def isOpened(self): return True
-        def read(self): return (True, "frame")
+        def grab(self): return True
+        def retrieve(self, image=None): return (True, make_frame(1))
+        def set(self, *args): return True
         def release(self): pass
     cm = CameraManager()
     monkeypatch.setattr("cv2.VideoCapture", lambda *_: DummyCap())
     assert cm.start() == True
     assert cm.start() == False  # Should not allow start again
 
+def test_restart_does_not_revive_old_capture_thread(monkeypatch):
+    """
+    Tests that stop() waits for the capture thread, so a quick restart runs exactly one
+    capture thread and the old one never clears the new capture's frames.
+    """
+    class ReleasableCap:
+        def __init__(self, *_):
+            self.released = False
+        def isOpened(self): return True
+        def grab(self):
+            threading.Event().wait(0.01)  # Like a device: grab() blocks until the next frame
+            return not self.released
+        def retrieve(self, image=None): return (True, make_frame(7))
+        def set(self, *args): return True
+        def release(self): self.released = True
+
+    monkeypatch.setattr("cv2.VideoCapture", ReleasableCap)
+    cm = CameraManager(0)
+    assert cm.start() is True
+    first = cm._thread
+    assert cm.stop() is True
+    assert not first.is_alive()
+    assert cm.start() is True
+    cleared = []
+    original_clear = cm.frame_buffer.clear
+    cm.frame_buffer.clear = lambda: (cleared.append(1), original_clear())
+    threading.Event().wait(0.1)
+    assert cleared == [] and (cm.get_frame() == 7).all()
+    assert sum(t.is_alive() for t in (first, cm._thread)) == 1
+    cm.stop()
+
 def test_stop_already_stopped():
     """
     Tests that calling stop() when camera is not running returns False.
@@ -47,59 +116,37 @@ def test_stop_already_stopped():
 
 def test_capture_loop_handles_failed_read(monkeypatch):
     """
-    Tests that _capture_loop sets _frame to None and continues if frame read fails.
+    Tests that _capture_loop drops the buffered frames and continues if a frame read fails.
     """
-    class DummyCap:
-        def isOpened(self): return True
-        def read(self): return (False, None)  # Simulate read failure
-        def release(self): pass
-
     cm = CameraManager()
-    cm._cap = DummyCap()
+    cm._cap = ScriptedCap(cm, [make_frame(1)])
     cm._running = True
-
-    # Patch time.sleep to avoid delays
     monkeypatch.setattr("time.sleep", lambda _: None)
-    # Force only one loop iteration by toggling _running off in read()
-    def fake_read():
-        cm._running = False
-        return (False, None)
-    cm._cap.read = fake_read
 
     cm._capture_loop()
-    assert cm._frame is None
+    assert cm.get_frame() is None
+    assert cm.get_frame_info()[0] == 1
 
 def test_capture_loop_logs_failed_read(monkeypatch, caplog):
     """
     Tests that _capture_loop logs a warning when frame read fails.
     Ensures coverage for logging.warning call in _capture_loop.
     """
-    class DummyCap:
-        def isOpened(self): return True
-        def read(self): return (False, None)
-        def release(self): pass
-
     cm = CameraManager()
-    cm._cap = DummyCap()
+    cm._cap = ScriptedCap(cm, [])
     cm._running = True
-
     monkeypatch.setattr("time.sleep", lambda _: None)
-    def fake_read():
-        cm._running = False
-        return (False, None)
-    cm._cap.read = fake_read
 
     with caplog.at_level("WARNING"):
         cm._capture_loop()
         assert any("Failed to read frame from webcam." in m for m in caplog.messages)
-    assert cm._frame is None
+    assert cm.get_frame() is None
 
 def test_get_frame_returns_none_when_no_frame():
     """
     Tests that get_frame returns None when no frame is available.
     """
     cm = CameraManager()
-    cm._frame = None
     assert cm.get_frame() is None
 
 def test_is_running_returns_false():
@@ -112,11 +159,221 @@ def test_is_running_returns_false():
 
 def test_get_frame_returns_copy_when_frame_exists():
     """
-    Tests that get_frame returns a (shallow) copy of the frame if available.
+    Tests that get_frame returns a copy of the latest buffered frame.
     """
     cm = CameraManager()
-    dummy_frame = [1, 2, 3]
-    cm._frame = dummy_frame
+    cm.frame_buffer.begin_write()
+    slot = cm.frame_buffer.commit(make_frame(7), 1, 1.0)
     result = cm.get_frame()
-    assert result == dummy_frame
-    assert result is not dummy_frame  # Ensure a copy is returned
+    assert (result == 7).all()
+    assert not np.shares_memory(result, slot)  # Ensure a copy is returned
+
+def test_get_frame_converts_and_borrow_frame_lends_view():
+    """
+    Tests that get_frame can return grayscale/downscaled copies, and that borrow_frame
+    lends a read-only view of the buffered frame without copying it.
+    """
+    cm = CameraManager()
+    cm.frame_buffer.begin_write()
+    slot = cm.frame_buffer.commit(make_frame(7), 1, 1.0)
+    assert cm.get_frame(gray=True).shape == (4, 6)
+    assert cm.get_frame(gray=True, scale=0.5).shape == (2, 3)
+    with cm.borrow_frame() as lease:
+        assert np.shares_memory(lease.frame, slot)
+        assert not lease.frame.flags.writeable
+        assert lease.seq == 1
+    assert cm.borrow_frame(seq=99) is None
+
+def test_capture_loop_assigns_sequence_numbers(monkeypatch):
+    """
+    Tests that each captured frame gets an increasing sequence number and timestamp,
+    and that listeners receive the same identity.
+    """
+    cm = CameraManager()
+    received = []
+    cm._cap = ScriptedCap(cm, [make_frame(1), make_frame(2)])
+    cm._running = True
+    cm.add_frame_listener(lambda frame, seq, ts: received.append((int(frame[0, 0, 0]), seq)))
+    monkeypatch.setattr("time.sleep", lambda _: None)
+
+    assert cm.get_frame_info() == (0, None)
+    cm._capture_loop()
+    seq, timestamp = cm.get_frame_info()
+    assert seq == 2
+    assert timestamp is not None
+    assert received == [(1, 1), (2, 2)]
+
+def test_capture_loop_decodes_into_ring_buffer(monkeypatch):
+    """
+    Tests that frames are decoded into reused ring buffer slots, and that the
+    newest frames (or a window of them) can be copied out by sequence number.
+    """
+    monkeypatch.setenv("FRAME_BUFFER_SIZE", "3")
+    cm = CameraManager()
+    slots = []
+    cm._cap = ScriptedCap(cm, [make_frame(v) for v in range(1, 6)])
+    cm._running = True
+    cm.add_frame_listener(lambda frame, seq, ts: slots.append(frame.__array_interface__["data"][0]))
+    monkeypatch.setattr("time.sleep", lambda _: None)
+
+    cm.frame_buffer.clear = lambda: None  # Keep the frames when the script runs out
+    cm._capture_loop()
+    assert len(set(slots)) == 3  # Five frames, three preallocated slots
+    assert slots[3] == slots[0]
+    assert cm.copy_frame(2) is None  # Overwritten
+    assert (cm.copy_frame(5) == 5).all()
+    assert [int(frame[0, 0, 0]) for frame, _, _ in cm.get_frames(2)] == [4, 5]
+    assert [seq for _, seq, _ in cm.get_frames(10)] == [3, 4, 5]
+
+def test_live_source_drains_frames_above_camera_fps(monkeypatch):
+    """
+    Tests that with CAMERA_FPS set, a live source grabs every frame but only decodes the ones due.
+    """
+    clock = iter([0.0, 0.0, 0.01, 0.02, 0.05, 0.06])
+    monkeypatch.setattr("time.monotonic", lambda: next(clock, 1.0))
+    monkeypatch.setattr("time.sleep", lambda _: None)
+    cm = CameraManager()
+    cm._cap = ScriptedCap(cm, [make_frame(v) for v in range(1, 6)])
+    cm._frame_interval, cm._drain = 0.04, True
+    cm._running = True
+    cm.frame_buffer.clear = lambda: None
+
+    cm._capture_loop()
+    assert cm._cap.retrieved == 2
+    assert cm.get_frame_info()[0] == 2
+    assert (cm.get_frame() == 4).all()
+    assert cm.measured_fps == pytest.approx(20.0)
+
+def test_file_source_is_paced_at_its_frame_rate(monkeypatch, tmp_path):
+    """
+    Tests that a video file is played back at its own frame rate and a device
+    source keeps only one frame in the driver queue.
+    """
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"")
+    calls = []
+
+    class DummyCap:
+        def __init__(self, source): pass
+        def isOpened(self): return True
+        def get(self, prop): return 25.0
+        def set(self, prop, value): calls.append((prop, value))
+        def grab(self): return False
+        def release(self): pass
+
+    monkeypatch.delenv("CAMERA_FPS", raising=False)
+    monkeypatch.setattr("cv2.VideoCapture", DummyCap)
+    monkeypatch.setattr("time.sleep", lambda _: None)
+    cm = CameraManager(str(video))
+    assert cm.start() is True
+    cm.stop()
+    assert cm._frame_interval == pytest.approx(0.04) and cm._drain is False
+    assert calls == []
+
+    device = CameraManager(0)
+    assert device.start() is True
+    device.stop()
+    assert device._frame_interval is None and device._drain is True
+    assert calls == [(cv2.CAP_PROP_BUFFERSIZE, 1)]
+
+def test_listener_failure_does_not_stop_capture(monkeypatch):
+    """
+    Tests that an exception raised by a frame listener is contained.
+    """
+    cm = CameraManager()
+    cm._cap = ScriptedCap(cm, [make_frame(1), make_frame(2)])
+    cm._running = True
+    cm.add_frame_listener(lambda *args: (_ for _ in ()).throw(RuntimeError("boom")))
+    monkeypatch.setattr("time.sleep", lambda _: None)
+    cm.frame_buffer.clear = lambda: None
+
+    cm._capture_loop()
+    assert cm.get_frame_info()[0] == 2
+    assert (cm.get_frame() == 2).all()
+
+def test_start_uses_configured_source(monkeypatch):
+    """
+    Tests that start() opens the configured source, and that an explicit source overrides it.
+    """
+    opened = []
+
+    class DummyCap:
+        def __init__(self, source): opened.append(source)
+        def isOpened(self): return True
+        def set(self, *args): return True
+        def grab(self): return False
+        def release(self): pass
+
+    monkeypatch.setattr("cv2.VideoCapture", DummyCap)
+    monkeypatch.setattr("time.sleep", lambda _: None)
+    cm = CameraManager("video.mp4")
+    assert cm.start() is True
+    cm.stop()
+    assert cm.start(source="2") is True
+    cm.stop()
+    assert opened == ["video.mp4", 2]
+    assert cm.source == 2
+
+def test_default_source_from_environment(monkeypatch):
+    """
+    Tests that a camera without explicit source uses CAMERA_SOURCE, else device 0.
+    """
+    monkeypatch.delenv("CAMERA_SOURCE", raising=False)
+    assert CameraManager().source == 0
+    monkeypatch.setenv("CAMERA_SOURCE", "rtsp://host/stream")
+    assert CameraManager().source == "rtsp://host/stream"
+
+def test_registry_get_or_create():
+    """
+    Tests that the registry creates cameras per ID, derives device indices from numeric IDs,
+    and refuses unknown non-numeric IDs without a source.
+    """
+    registry = CameraRegistry()
+    added = []
+    registry.on_camera_added(lambda camera_id, camera: added.append(camera_id))
+
+    cam = registry.get_or_create("1")
+    assert cam.source == 1
+    assert registry.get_or_create("1") is cam
+    assert registry.get_or_create("door") is None
+    door = registry.get_or_create("door", "rtsp://host/door")
+    assert door.source == "rtsp://host/door"
+    assert registry.ids() == ["1", "door"]
+    assert added == ["1", "door"]
+
+def test_registry_get_or_create_is_atomic(monkeypatch):
+    """
+    Tests that concurrent get_or_create calls for a new ID build and announce a single camera.
+    """
+    registry = CameraRegistry()
+    added = []
+    registry.on_camera_added(lambda camera_id, camera: added.append(camera))
+    original_init = CameraManager.__init__
+    def slow_init(self, source=None):
+        threading.Event().wait(0.02)  # Widen the window between lookup and registration
+        original_init(self, source)
+    monkeypatch.setattr(CameraManager, "__init__", slow_init)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get_or_create("2"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(camera) for camera in results}) == 1
+    assert added == [results[0]]
+
+def test_registry_stop_all():
+    """
+    Tests that stop_all stops every registered camera.
+    """
+    registry = CameraRegistry()
+    stopped = []
+
+    class FakeCamera:
+        def __init__(self, name): self.name = name
+        def stop(self): stopped.append(self.name)
+
+    registry.add("a", FakeCamera("a"))
+    registry.add("b", FakeCamera("b"))
+    registry.stop_all()
+    assert stopped == ["a", "b"]
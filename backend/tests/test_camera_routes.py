@@ -4,9 +4,12 @@ Mocks CameraManager and dependencies to isolate API logic.
 """
 
 import pytest
+import time
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
 from app.main import app
+from app.services.detection_pipeline import detection_pipeline
+from app.services.single_flight import Overloaded
 
 client = TestClient(app)
 
@@ -86,71 +89,244 @@ def test_detect_smile_camera_not_started():
 
 def test_detect_smile_no_frame():
     """
-    Ensures /detect_smile returns 204 if no frame is available from the camera.
+    Ensures /detect_smile returns 204 if the pipeline has not processed a frame yet.
     """
     with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
-         patch("app.routes.camera.camera_manager.get_frame", return_value=None):
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=None):
         response = client.get("/detect_smile")
         assert response.status_code == 204
 
 def test_detect_smile_no_smile_detected():
     """
-    Ensures /detect_smile returns 204 if no smile is detected in the frame.
+    Ensures /detect_smile returns 204 if no smile was detected in the latest frame.
     """
+    latest = {"image": None, "coords": [], "seq": 1, "timestamp": 1.0}
     with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
-         patch("app.routes.camera.camera_manager.get_frame", return_value="frame"), \
-         patch("app.routes.camera.detect_smile_on_frame", return_value=None):
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=latest):
         response = client.get("/detect_smile")
         assert response.status_code == 204
 
 def test_detect_smile_success():
     """
-    Ensures /detect_smile returns 200 OK and correct headers when a smile is detected.
+    Ensures /detect_smile returns 200 OK and correct headers for a cached smile result.
     """
     fake_img_bytes = b"\xff\xd8\xff"
     fake_coords = [{"x": 1, "y": 2, "w": 3, "h": 4}]
+    latest = {"image": fake_img_bytes, "coords": fake_coords, "seq": 3, "timestamp": 12.5}
     with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
-         patch("app.routes.camera.camera_manager.get_frame", return_value="frame"), \
-         patch("app.routes.camera.detect_smile_on_frame", return_value=(fake_img_bytes, fake_coords)):
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=latest):
         response = client.get("/detect_smile")
         assert response.status_code == 200
         assert response.content == fake_img_bytes
         assert response.headers.get("x-smile-coords") is not None
+        assert response.headers.get("x-frame-timestamp") == "12.5"
+        assert response.headers.get("x-frame-seq") == "3"
+        assert response.headers.get("etag") == '"3"'
+
+def test_detect_smile_server_timing(monkeypatch):
+    """
+    Ensures SERVER_TIMING=1 adds the served frame's stage timings and the request time.
+    """
+    latest = {"image": b"\xff\xd8\xff", "coords": [{"x": 1, "y": 2, "w": 3, "h": 4}], "seq": 3, "timestamp": 12.5,
+              "timings": {"face": 0.0125, "encode": 0.002}}
+    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=latest):
+        assert "server-timing" not in client.get("/detect_smile").headers
+        monkeypatch.setenv("SERVER_TIMING", "1")
+        header = client.get("/detect_smile").headers["server-timing"]
+    assert header.startswith("face;dur=12.50, encode;dur=2.00, app;dur=")
+
+def test_detect_smile_fresh_runs_on_demand_detection():
+    """
+    Ensures ?fresh=true serves the on-demand detection of the newest frame.
+    """
+    latest = {"image": b"\xff\xd8\xff", "coords": [{"x": 1, "y": 2, "w": 3, "h": 4}], "seq": 8, "timestamp": 13.0}
+    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.detect_now", return_value=latest) as fake_detect:
+        response = client.get("/detect_smile?fresh=true")
+    fake_detect.assert_called_once_with()
+    assert response.status_code == 200
+    assert response.headers["x-frame-seq"] == "8"
+    assert "x-result-stale" not in response.headers
+
+def test_detect_smile_fresh_not_modified_skips_detection():
+    """
+    Ensures ?fresh=true answers 304 from the newest frame's seq, without detecting, when the client has it.
+    """
+    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.newest_frame_info", return_value=(8, 13.0)), \
+         patch("app.routes.camera.detection_pipeline.detect_now") as fake_detect:
+        response = client.get("/detect_smile?fresh=true", headers={"If-None-Match": 'W/"8"'})
+        assert response.status_code == 304 and response.headers["x-frame-seq"] == "8"
+        assert client.get("/detect_smile?fresh=true&since=8").status_code == 304
+        fake_detect.assert_not_called()
+        fake_detect.return_value = {"image": None, "coords": [], "seq": 8, "timestamp": 13.0}
+        assert client.get("/detect_smile?fresh=true&since=7").status_code == 204
+        fake_detect.assert_called_once_with()
+
+def test_detect_smile_fresh_overload_serves_stale_or_503(monkeypatch):
+    """
+    Ensures an overloaded on-demand detection falls back to the cached result (marked stale),
+    or returns 503 with DETECTION_OVERLOAD_POLICY=reject.
+    """
+    cached = {"image": b"\xff\xd8\xff", "coords": [{"x": 1, "y": 2, "w": 3, "h": 4}], "seq": 7, "timestamp": 12.0}
+    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.detect_now", side_effect=Overloaded("busy")), \
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=cached):
+        response = client.get("/detect_smile?fresh=true")
+        assert response.status_code == 200
+        assert response.headers["x-result-stale"] == "1"
+        assert response.headers["x-frame-seq"] == "7"
+        monkeypatch.setenv("DETECTION_OVERLOAD_POLICY", "reject")
+        response = client.get("/detect_smile?fresh=true")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+def test_detect_smile_not_modified_with_etag():
+    """
+    Ensures /detect_smile returns 304 when If-None-Match matches the latest frame.
+    """
+    latest = {"image": b"\xff\xd8\xff", "coords": [{"x": 1, "y": 2, "w": 3, "h": 4}], "seq": 3, "timestamp": 12.5}
+    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=latest):
+        response = client.get("/detect_smile", headers={"If-None-Match": '"3"'})
+        assert response.status_code == 304
+        assert response.content == b""
+
+def test_detect_smile_modified_with_stale_etag():
+    """
+    Ensures /detect_smile returns the new result when If-None-Match refers to an older frame.
+    """
+    latest = {"image": b"\xff\xd8\xff", "coords": [{"x": 1, "y": 2, "w": 3, "h": 4}], "seq": 4, "timestamp": 12.5}
+    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=latest):
+        response = client.get("/detect_smile", headers={"If-None-Match": '"3"'})
+        assert response.status_code == 200
+
+def test_detect_smile_if_none_match_lists_weak_tags_and_wildcard():
+    """
+    Ensures If-None-Match is compared weakly against every listed tag, and "*" always matches.
+    """
+    latest = {"image": b"\xff\xd8\xff", "coords": [{"x": 1, "y": 2, "w": 3, "h": 4}], "seq": 3, "timestamp": 12.5}
+    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=latest):
+        for header in ('"1", "3"', 'W/"3"', '"2" ,W/"3"', "*"):
+            assert client.get("/detect_smile", headers={"If-None-Match": header}).status_code == 304, header
+        for header in ('"1", "2"', '"33"', "3"):
+            assert client.get("/detect_smile", headers={"If-None-Match": header}).status_code == 200, header
+
+def test_detect_smile_not_modified_with_since():
+    """
+    Ensures /detect_smile returns 304 when the since parameter is at or past the latest frame.
+    """
+    latest = {"image": None, "coords": [], "seq": 5, "timestamp": 12.5}
+    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.get_latest", return_value=latest):
+        assert client.get("/detect_smile?since=5").status_code == 304
+        assert client.get("/detect_smile?since=4").status_code == 204
 
 def test_detect_smile_exception():
     """
-    Ensures /detect_smile returns 500 if an exception is raised during detection.
+    Ensures /detect_smile returns 500 if an exception is raised while reading the result.
     """
     with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
-         patch("app.routes.camera.camera_manager.get_frame", side_effect=Exception("fail")):
+         patch("app.routes.camera.detection_pipeline.get_latest", side_effect=Exception("fail")):
         response = client.get("/detect_smile")
         assert response.status_code == 500
 
-def test_detect_smile_success_logs_and_saves(monkeypatch):
+def test_stop_camera_resets_pipeline():
     """
-    Ensures /detect_smile calls log_detection_event and save_detection_image when smile is detected.
+    Ensures /stop_camera clears the cached detection result so it is not served after restart.
+    """
+    with patch("app.routes.camera.camera_manager.stop", return_value=True), \
+         patch("app.routes.camera.detection_pipeline.reset") as fake_reset:
+        response = client.post("/stop_camera")
+        assert response.status_code == 200
+        fake_reset.assert_called_once()
+
+# ----------- Detection Stream Tests ------------
+
+def wait_for_subscribers(count, timeout=2.0):
+    """
+    Waits until the pipeline has the given number of streaming subscribers.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if len(detection_pipeline._subscribers) == count:
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_detect_smile_stream_pushes_events():
+    """
+    Ensures /ws/detect_smile pushes JSON events for every published result.
     """
-    fake_img_bytes = b"\xff\xd8\xff"
     fake_coords = [{"x": 1, "y": 2, "w": 3, "h": 4}]
-    called = {"log": False, "save": False}
+    with client.websocket_connect("/ws/detect_smile") as ws:
+        assert wait_for_subscribers(1)
+        detection_pipeline._publish({"image": b"\xff\xd8\xff", "coords": fake_coords, "seq": 1, "timestamp": 2.0})
+        event = ws.receive_json()
+        assert event == {"seq": 1, "timestamp": 2.0, "coords": fake_coords}
+    assert wait_for_subscribers(0)
 
-    def fake_log(coords):
-        called["log"] = True
-        assert coords == fake_coords
+def test_detect_smile_stream_with_frames():
+    """
+    Ensures /ws/detect_smile?frames=true follows smile events with the JPEG bytes.
+    """
+    fake_img_bytes = b"\xff\xd8\xff"
+    with client.websocket_connect("/ws/detect_smile?frames=true") as ws:
+        assert wait_for_subscribers(1)
+        detection_pipeline._publish({"image": fake_img_bytes, "coords": [{"x": 1, "y": 2, "w": 3, "h": 4}], "seq": 2, "timestamp": 2.0})
+        assert ws.receive_json()["seq"] == 2
+        assert ws.receive_bytes() == fake_img_bytes
+    assert wait_for_subscribers(0)
 
-    def fake_save(img):
-        called["save"] = True
-        assert img == fake_img_bytes
-        return "/tmp/fake.jpg"
+# ----------- Multi-Camera Tests ------------
 
-    with patch("app.routes.camera.camera_manager.is_running", return_value=True), \
-         patch("app.routes.camera.camera_manager.get_frame", return_value="frame"), \
-         patch("app.routes.camera.detect_smile_on_frame", return_value=(fake_img_bytes, fake_coords)), \
-         patch("app.routes.camera.log_detection_event", fake_log), \
-         patch("app.routes.camera.save_detection_image", fake_save):
-        response = client.get("/detect_smile")
+def test_start_camera_by_id_requires_source():
+    """
+    Ensures starting an unknown, non-numeric camera without a source returns 400.
+    """
+    response = client.post("/cameras/unknown-cam/start")
+    assert response.status_code == 400
+
+def test_start_camera_by_id_with_source():
+    """
+    Ensures /cameras/{id}/start registers the camera and starts it with the given source.
+    """
+    camera = MagicMock()
+    camera.start.return_value = True
+    with patch("app.routes.camera.camera_registry.get_or_create", return_value=camera) as fake_get:
+        response = client.post("/cameras/door/start", params={"source": "rtsp://host/door"})
         assert response.status_code == 200
-        assert response.content == fake_img_bytes
-        assert response.headers.get("x-smile-coords") is not None
-        assert called["log"] is True
-        assert called["save"] is True
+        fake_get.assert_called_once_with("door", "rtsp://host/door")
+        camera.start.assert_called_once_with(source="rtsp://host/door")
+
+def test_camera_by_id_not_found():
+    """
+    Ensures stop and detect return 404 for unregistered cameras.
+    """
+    assert client.post("/cameras/missing/stop").status_code == 404
+    assert client.get("/cameras/missing/detect_smile").status_code == 404
+
+def test_detect_smile_by_id_uses_camera_pipeline():
+    """
+    Ensures /cameras/{id}/detect_smile serves that camera's pipeline result.
+    """
+    camera = MagicMock()
+    camera.is_running.return_value = True
+    pipeline = MagicMock()
+    pipeline.get_latest.return_value = {"image": b"\xff\xd8\xff", "coords": [{"x": 1, "y": 2, "w": 3, "h": 4}], "seq": 1, "timestamp": 1.0}
+    with patch("app.routes.camera.camera_registry.get", return_value=camera), \
+         patch("app.routes.camera.pipeline_registry.get", return_value=pipeline):
+        response = client.get("/cameras/door/detect_smile")
+        assert response.status_code == 200
+        assert response.content == b"\xff\xd8\xff"
+
+def test_list_cameras_includes_default():
+    """
+    Ensures /cameras lists the default camera.
+    """
+    response = client.get("/cameras")
+    assert response.status_code == 200
+    assert {"id": "default", "running": False} in response.json()["cameras"]
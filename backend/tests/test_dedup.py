@@ -0,0 +1,62 @@
+"""
+Unit tests for near-duplicate suppression of saved detections.
+Uses small synthetic frames with controlled smile regions.
+"""
+
+import numpy as np
+from app.services.dedup import dhash, DetectionDeduplicator, create_deduplicator
+
+def make_frame(seed):
+    """
+    Returns a reproducible random 100x100 BGR frame.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(100, 100, 3), dtype=np.uint8)
+
+COORDS = [{"x": 10, "y": 20, "w": 40, "h": 20}]
+
+def test_dhash_similar_and_different_regions():
+    """
+    Ensures dhash is stable under small brightness changes and differs for different content.
+    """
+    frame = make_frame(1)
+    brighter = np.clip(frame.astype(int) + 3, 0, 255).astype(np.uint8)
+    assert bin(dhash(frame) ^ dhash(brighter)).count("1") <= 6
+    assert bin(dhash(frame) ^ dhash(make_frame(2))).count("1") > 6
+    assert dhash(frame[0:0, 0:0]) == 0
+
+def test_repeated_detection_is_suppressed_within_window():
+    """
+    Ensures the same smile in the same place is skipped until the window expires.
+    """
+    dedup = DetectionDeduplicator(max_distance=6, max_shift=20, window=5.0)
+    frame = make_frame(1)
+    assert dedup.is_duplicate(frame, COORDS, 100.0) is False
+    assert dedup.is_duplicate(frame, COORDS, 101.0) is True
+    assert dedup.is_duplicate(frame, COORDS, 104.9) is True
+    assert dedup.is_duplicate(frame, COORDS, 106.0) is False  # Window expired: save again
+    assert dedup.suppressed == 2
+
+def test_moved_or_changed_smile_is_not_duplicate():
+    """
+    Ensures a moved box, a different-looking region or a different smile count is saved.
+    """
+    dedup = DetectionDeduplicator(max_distance=6, max_shift=5, window=5.0)
+    frame = make_frame(1)
+    dedup.is_duplicate(frame, COORDS, 100.0)
+    moved = [{"x": 30, "y": 20, "w": 40, "h": 20}]
+    assert dedup.is_duplicate(frame, moved, 100.5) is False
+    assert dedup.is_duplicate(make_frame(3), moved, 101.0) is False
+    assert dedup.is_duplicate(make_frame(3), moved + COORDS, 101.5) is False
+
+def test_create_deduplicator_from_environment(monkeypatch):
+    """
+    Ensures dedup is configured from the environment and disabled by DEDUP_WINDOW=0.
+    """
+    monkeypatch.setenv("DEDUP_WINDOW", "2.5")
+    monkeypatch.setenv("DEDUP_HASH_DISTANCE", "4")
+    dedup = create_deduplicator()
+    assert dedup.window == 2.5
+    assert dedup.max_distance == 4
+    monkeypatch.setenv("DEDUP_WINDOW", "0")
+    assert create_deduplicator() is None
@@ -1,52 +1,29 @@
 """
 Unit tests for detection event logging and image saving.
-Covers table creation, error handling, and file persistence.
+Covers table creation, error handling, batched writing, and file persistence.
 """
 
 import sqlite3
 import os
+import json
+import time
 import pytest
-from app.models.detection_event import log_detection_event, save_detection_image
+from datetime import datetime
+from unittest.mock import patch
+from app.models.detection_event import ensure_schema, log_detection_event, save_detection_image, DetectionEventWriter, DetectionImageWriter
+from app.models.image_store import ImagePackStore
 
-def test_log_detection_event_creates_table_and_inserts(tmp_path):
+def test_log_detection_event_submits_to_writer():
     """
-    Ensures log_detection_event creates table and inserts detection data in a temp SQLite DB.
+    Ensures log_detection_event queues the event on the shared writer instead of opening a connection.
     """
-    db_path = tmp_path / "test_smiles.db"
     coords = [{"x": 1, "y": 2, "w": 3, "h": 4}]
-    log_detection_event(coords, db_path=str(db_path))
-
-    conn = sqlite3.connect(str(db_path))
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM detections")
-    rows = cursor.fetchall()
-    assert len(rows) == 1
-    # Check coords column matches what we inserted
-    assert coords == eval(rows[0][2]) or coords == __import__('json').loads(rows[0][2])
-    conn.close()
-
-def test_log_detection_event_empty_coords(tmp_path):
-    """
-    Ensures log_detection_event handles empty coords gracefully (still inserts row).
-    """
-    db_path = tmp_path / "empty_smiles.db"
-    log_detection_event([], db_path=str(db_path))
-    conn = sqlite3.connect(str(db_path))
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM detections")
-    rows = cursor.fetchall()
-    assert len(rows) == 1
-    conn.close()
-
-def test_log_detection_event_db_error(monkeypatch, tmp_path):
-    """
-    Ensures log_detection_event handles DB connection errors gracefully.
-    """
-    def fail_connect(*args, **kwargs):
-        raise sqlite3.OperationalError("test error")
-    monkeypatch.setattr(sqlite3, "connect", fail_connect)
-    # Should not raise, but log the error
-    log_detection_event([{"x": 1}], db_path=str(tmp_path / "bad.db"))
+    with patch("app.models.detection_event.detection_event_writer") as fake_writer, \
+         patch("app.models.detection_event.sqlite3.connect") as fake_connect:
+        fake_writer.submit.return_value = True
+        assert log_detection_event(coords, 42.0, camera_id="lobby") is True
+    fake_writer.submit.assert_called_once_with(coords, 42.0, camera_id="lobby")
+    fake_connect.assert_not_called()
 
 def test_save_detection_image_creates_file(tmp_path):
     """
@@ -76,3 +53,265 @@ def test_save_detection_image_handles_failure(monkeypatch):
     monkeypatch.setattr("builtins.open", lambda *a, **kw: (_ for _ in ()).throw(OSError("fail")))
     path = save_detection_image(b"abc")
     assert path is None
+
+def test_writer_batches_and_flushes(tmp_path):
+    """
+    Ensures DetectionEventWriter commits queued events on flush using one WAL-mode connection.
+    """
+    db_path = tmp_path / "writer.db"
+    writer = DetectionEventWriter(db_path=str(db_path), batch_size=100, flush_interval=60)
+    writer.start()
+    try:
+        for i in range(5):
+            assert writer.submit([{"x": i, "y": 0, "w": 1, "h": 1}]) is True
+        assert writer.flush() is True
+        assert writer.written == 5
+    finally:
+        writer.stop()
+
+    conn = sqlite3.connect(str(db_path))
+    rows = conn.execute("SELECT x FROM detection_boxes ORDER BY event_id").fetchall()
+    mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+    assert [r[0] for r in rows] == [0, 1, 2, 3, 4]
+    assert mode == "wal"
+
+def test_writer_commits_when_batch_is_full(tmp_path):
+    """
+    Ensures a full batch is committed without waiting for the flush interval.
+    """
+    writer = DetectionEventWriter(db_path=str(tmp_path / "batch.db"), batch_size=2, flush_interval=60)
+    writer.start()
+    try:
+        writer.submit([])
+        writer.submit([])
+        deadline = time.time() + 2
+        while writer.written < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert writer.written == 2
+    finally:
+        writer.stop()
+
+def test_writer_commits_after_flush_interval(tmp_path):
+    """
+    Ensures pending events are committed once they are flush_interval old.
+    """
+    writer = DetectionEventWriter(db_path=str(tmp_path / "interval.db"), batch_size=100, flush_interval=0.05)
+    writer.start()
+    try:
+        writer.submit([])
+        deadline = time.time() + 2
+        while writer.written < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        assert writer.written == 1
+    finally:
+        writer.stop()
+
+def test_writer_stop_flushes_pending_events(tmp_path):
+    """
+    Ensures stop() commits events still in the queue.
+    """
+    db_path = tmp_path / "stop.db"
+    writer = DetectionEventWriter(db_path=str(db_path), batch_size=100, flush_interval=60)
+    writer.start()
+    writer.submit([{"x": 1, "y": 2, "w": 3, "h": 4}], timestamp=1704067200.0, camera_id="cam")
+    assert writer.stop() is True
+    assert writer.stop() is False
+    conn = sqlite3.connect(str(db_path))
+    assert conn.execute("SELECT camera_id, ts FROM detection_events").fetchall() == [("cam", 1704067200.0)]
+    conn.close()
+
+def test_writer_drops_events_when_queue_full(tmp_path):
+    """
+    Ensures submit never blocks: events beyond max_queue are dropped and counted.
+    """
+    writer = DetectionEventWriter(db_path=str(tmp_path / "full.db"), max_queue=1)
+    assert writer.submit([]) is True
+    assert writer.submit([]) is False
+    assert writer.dropped == 1
+    assert writer.flush() is False  # Not running
+
+def test_writer_stop_returns_when_writer_died_with_full_queue(tmp_path):
+    """
+    Ensures stop() and flush() do not block when the writer thread has exited and the queue is full.
+    """
+    writer = DetectionEventWriter(db_path=str(tmp_path / "missing" / "events.db"), max_queue=1)
+    writer.start()  # Cannot open the database: the writer thread exits at once
+    writer._thread.join(2.0)
+    assert writer.submit([{"x": 1, "y": 2, "w": 3, "h": 4}]) is True
+    started = time.monotonic()
+    assert writer.flush(timeout=0.2) is False
+    assert writer.stop(timeout=0.2) is True
+    assert time.monotonic() - started < 1.0
+
+def test_image_writer_saves_in_background(tmp_path):
+    """
+    Ensures DetectionImageWriter saves queued images and counts them.
+    """
+    writer = DetectionImageWriter(save_dir=str(tmp_path), max_queue=10)
+    writer.start()
+    try:
+        assert writer.submit(b"img1") is True
+        assert writer.submit(b"img2") is True
+    finally:
+        writer.stop()
+    assert writer.stats() == {"queued": 2, "written": 2, "dropped": 0, "pending": 0}
+    contents = sorted(open(tmp_path / name, "rb").read() for name in os.listdir(tmp_path))
+    assert contents == [b"img1", b"img2"]
+
+def test_image_writer_drop_oldest(tmp_path):
+    """
+    Ensures the drop_oldest policy discards the oldest queued image when full.
+    """
+    writer = DetectionImageWriter(save_dir=str(tmp_path), max_queue=2, overflow_policy="drop_oldest")
+    for data in (b"a", b"b", b"c"):
+        assert writer.submit(data) is True
+    assert [item[0] for item in writer._pending] == [b"b", b"c"]
+    assert writer.stats()["dropped"] == 1
+
+def test_image_writer_drop_newest(tmp_path):
+    """
+    Ensures the drop_newest policy rejects the submitted image when full.
+    """
+    writer = DetectionImageWriter(save_dir=str(tmp_path), max_queue=2, overflow_policy="drop_newest")
+    assert writer.submit(b"a") is True
+    assert writer.submit(b"b") is True
+    assert writer.submit(b"c") is False
+    assert [item[0] for item in writer._pending] == [b"a", b"b"]
+    assert writer.stats()["dropped"] == 1
+
+def test_image_writer_block_waits_for_space(tmp_path):
+    """
+    Ensures the block policy waits until the writer frees a slot instead of dropping.
+    """
+    writer = DetectionImageWriter(save_dir=str(tmp_path), max_queue=1, overflow_policy="block")
+    writer.start()
+    try:
+        for i in range(5):
+            assert writer.submit(bytes([i])) is True
+    finally:
+        writer.stop()
+    assert writer.stats()["dropped"] == 0
+    assert writer.stats()["written"] == 5
+
+def test_image_writer_rejects_unknown_policy(tmp_path):
+    """
+    Ensures an unknown overflow policy is reported at start.
+    """
+    writer = DetectionImageWriter(save_dir=str(tmp_path), overflow_policy="sometimes")
+    with pytest.raises(ValueError):
+        writer.start()
+
+def test_writer_persists_episodes(tmp_path):
+    """
+    Ensures submit_episode writes one episodes row alongside detection rows in the same batch.
+    """
+    db_path = tmp_path / "episodes.db"
+    writer = DetectionEventWriter(db_path=str(db_path), flush_interval=60)
+    writer.start()
+    episode = {"camera_id": "cam", "start": 1.0, "end": 3.0, "frames": 12, "best_box": {"x": 1, "y": 2, "w": 30, "h": 10}}
+    try:
+        writer.submit([])
+        assert writer.submit_episode(episode, "detected_smiles/episode.jpg") is True
+        writer.submit([])
+        assert writer.flush() is True
+    finally:
+        writer.stop()
+    conn = sqlite3.connect(str(db_path))
+    rows = conn.execute("SELECT camera_id, start_time, end_time, frame_count, best_w, image_path FROM episodes").fetchall()
+    detections = conn.execute("SELECT COUNT(*) FROM detection_events").fetchone()[0]
+    conn.close()
+    assert rows == [("cam", 1.0, 3.0, 12, 30, "detected_smiles/episode.jpg")]
+    assert detections == 2
+
+def test_ensure_schema_migrates_legacy_table(tmp_path):
+    """
+    Ensures a legacy detections table (ISO text + JSON coords) is copied into the
+    normalized tables once and then renamed.
+    """
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE detections (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, coords TEXT)")
+    conn.execute(
+        "INSERT INTO detections (timestamp, coords) VALUES (?, ?)",
+        ("2024-01-01T12:00:00.500000", json.dumps([{"x": 1, "y": 2, "w": 3, "h": 4}, {"x": 5, "y": 6, "w": 7, "h": 8}])),
+    )
+    conn.execute("INSERT INTO detections (timestamp, coords) VALUES (?, ?)", ("2024-01-01T12:00:01", "[]"))
+    conn.commit()
+
+    ensure_schema(conn)
+    ensure_schema(conn)  # Second run must not copy again
+    events = conn.execute("SELECT id, camera_id, ts, box_count FROM detection_events ORDER BY id").fetchall()
+    boxes = conn.execute("SELECT event_id, x, y, w, h FROM detection_boxes ORDER BY id").fetchall()
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+
+    expected_ts = datetime(2024, 1, 1, 12, 0, 0, 500000).timestamp()  # Legacy timestamps are local time
+    assert [(e[0], e[1], e[3]) for e in events] == [(1, "default", 2), (2, "default", 0)]
+    assert events[0][2] == pytest.approx(expected_ts, abs=1e-3)
+    assert boxes == [(1, 1, 2, 3, 4), (1, 5, 6, 7, 8)]
+    assert "detections" not in tables and "detections_legacy" in tables
+
+def test_ensure_schema_migrates_again_without_collisions(tmp_path):
+    """
+    Ensures a legacy table reappearing after a migration is copied with shifted ids
+    and renamed next to the earlier legacy copy.
+    """
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    legacy = "CREATE TABLE detections (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, coords TEXT)"
+    conn.execute(legacy)
+    conn.execute("INSERT INTO detections (timestamp, coords) VALUES (?, ?)", ("2024-01-01T12:00:00", "[]"))
+    conn.commit()
+    ensure_schema(conn)
+    conn.execute(legacy)
+    conn.execute("INSERT INTO detections (timestamp, coords) VALUES (?, ?)", ("2024-01-02T12:00:00", json.dumps([{"x": 1, "y": 2, "w": 3, "h": 4}])))
+    conn.commit()
+
+    ensure_schema(conn)
+    events = conn.execute("SELECT id, box_count FROM detection_events ORDER BY id").fetchall()
+    boxes = conn.execute("SELECT event_id FROM detection_boxes").fetchall()
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert events == [(1, 0), (2, 1)] and boxes == [(2,)]
+    assert {"detections_legacy", "detections_legacy_2"} <= tables and "detections" not in tables
+
+def test_ensure_schema_rolls_back_a_failed_migration(tmp_path):
+    """
+    Ensures a failing migration leaves neither the new tables nor a renamed legacy table behind.
+    """
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    conn.execute("CREATE TABLE detections (id INTEGER PRIMARY KEY, timestamp TEXT)")  # No coords column
+    conn.commit()
+    with pytest.raises(sqlite3.OperationalError):
+        ensure_schema(conn)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {"detections"} and not conn.in_transaction
+    conn.close()
+
+def test_image_writer_appends_to_pack_store(tmp_path):
+    """
+    Ensures the image writer appends to the pack store, indexes each image by key,
+    and load() reads it back through that index.
+    """
+    db_path = str(tmp_path / "packs.db")
+    event_writer = DetectionEventWriter(db_path=db_path, flush_interval=60)
+    store = ImagePackStore(str(tmp_path / "packs"))
+    writer = DetectionImageWriter(save_dir=str(tmp_path), pack_store=store, event_writer=event_writer)
+    event_writer.start()
+    writer.start()
+    try:
+        assert writer.submit(b"jpeg-one", filename="smile_a.jpg") is True
+        assert writer.submit(b"jpeg-two", filename="smile_b.jpg") is True
+        deadline = time.time() + 2
+        while writer.written < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert event_writer.flush() is True
+        conn = sqlite3.connect(db_path)
+        assert writer.load("smile_b.jpg", conn) == b"jpeg-two"
+        assert writer.load("missing.jpg", conn) is None
+        conn.close()
+    finally:
+        writer.stop()
+        event_writer.stop()
+    assert writer.image_path("smile_a.jpg") == "smile_a.jpg"  # Pack key, not a file path
+    assert not any(name.endswith(".jpg") for name in os.listdir(tmp_path))
@@ -0,0 +1,342 @@
+"""
+Unit tests for the background DetectionPipeline.
+Uses injected detection functions and patched persistence helpers.
+"""
+
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from unittest.mock import patch
+from app.services.frame_buffer import FrameRingBuffer
+from app.services.detection_pipeline import DetectionPipeline, DetectionSubscriber, PipelineRegistry
+
+def wait_for(predicate, timeout=2.0):
+    """
+    Polls predicate until it returns True or the timeout expires.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_get_latest_is_none_before_any_frame():
+    """
+    Ensures no result is cached before the first frame is processed.
+    """
+    pipeline = DetectionPipeline(detect_func=lambda frame: None)
+    assert pipeline.get_latest() is None
+
+def test_start_and_stop():
+    """
+    Ensures the worker can be started and stopped exactly once each.
+    """
+    pipeline = DetectionPipeline(detect_func=lambda frame: None)
+    assert pipeline.start() is True
+    assert pipeline.start() is False
+    assert pipeline.is_running() is True
+    assert pipeline.stop() is True
+    assert pipeline.stop() is False
+
+def test_worker_caches_smile_result_and_persists():
+    """
+    Ensures a submitted frame is detected once, persisted, and cached with its timestamp.
+    """
+    fake_img_bytes = b"\xff\xd8\xff"
+    fake_coords = [{"x": 1, "y": 2, "w": 3, "h": 4}]
+    calls = []
+
+    def fake_detect(frame):
+        calls.append(frame)
+        return fake_img_bytes, fake_coords
+
+    pipeline = DetectionPipeline(detect_func=fake_detect)
+    with patch("app.services.detection_pipeline.detection_event_writer") as fake_writer, \
+         patch("app.services.detection_pipeline.detection_image_writer") as fake_images:
+        pipeline.start()
+        try:
+            pipeline.submit(np.zeros((4, 4, 3), dtype=np.uint8), 7, 42.0)
+            assert wait_for(lambda: pipeline.get_latest() is not None)
+        finally:
+            pipeline.stop()
+        image_key = fake_images.submit.call_args_list[0].kwargs["filename"]
+        fake_writer.submit.assert_called_once_with(fake_coords, 42.0, camera_id="default", image_key=image_key)
+        assert fake_images.submit.call_args_list[0].args == (fake_img_bytes,)  # stop() also saves the episode image
+        assert image_key.startswith("smile_default_")
+        fake_writer.submit_episode.assert_called_once()
+
+    latest = dict(pipeline.get_latest())
+    timings = latest.pop("timings")
+    assert latest == {"image": fake_img_bytes, "coords": fake_coords, "seq": 7, "timestamp": 42.0}
+    assert set(timings) == {"detect"}  # The injected detector records no inner stages
+    assert len(calls) == 1
+
+def test_worker_caches_empty_result_without_persisting():
+    """
+    Ensures frames without smiles produce an empty cached result and no persistence.
+    """
+    pipeline = DetectionPipeline(detect_func=lambda frame: None)
+    with patch("app.services.detection_pipeline.detection_event_writer") as fake_writer:
+        pipeline.start()
+        try:
+            pipeline.submit(np.zeros((4, 4, 3), dtype=np.uint8), 1, 1.0)
+            assert wait_for(lambda: pipeline.get_latest() is not None)
+        finally:
+            pipeline.stop()
+        fake_writer.submit.assert_not_called()
+    assert pipeline.get_latest()["coords"] == []
+
+def test_submit_keeps_only_newest_pending_frame():
+    """
+    Ensures frames submitted before the worker runs are coalesced to the newest one.
+    """
+    seen = []
+    pipeline = DetectionPipeline(detect_func=lambda frame: seen.append(frame[0, 0, 0]))
+    pipeline.submit(np.full((2, 2, 3), 1, dtype=np.uint8), 1, 1.0)
+    pipeline.submit(np.full((2, 2, 3), 2, dtype=np.uint8), 2, 2.0)
+    pipeline.start()
+    try:
+        assert wait_for(lambda: pipeline.get_latest() is not None)
+    finally:
+        pipeline.stop()
+    assert seen == [2]
+    assert pipeline.get_latest()["seq"] == 2
+    assert pipeline.get_latest()["timestamp"] == 2.0
+
+def test_reset_clears_cached_result():
+    """
+    Ensures reset() drops the cached result.
+    """
+    pipeline = DetectionPipeline(detect_func=lambda frame: None)
+    pipeline._latest = {"image": None, "coords": [], "timestamp": 1.0}
+    pipeline.reset()
+    assert pipeline.get_latest() is None
+
+def test_detection_does_not_modify_shared_frame():
+    """
+    Ensures detection gets the camera's shared frame read-only, so drawn boxes can never leak into it.
+    """
+    def drawing_detect(frame):
+        with pytest.raises(ValueError):
+            frame[:] = 255
+        private = frame.copy()
+        private[:] = 255
+        return None
+
+    pipeline = DetectionPipeline(detect_func=drawing_detect)
+    frame = np.zeros((2, 2, 3), dtype=np.uint8)
+    pipeline._process(frame, 1, 1.0, pipeline._generation)
+    assert not frame.any()
+    assert pipeline.get_latest() is not None
+
+def test_overwritten_buffered_frame_is_skipped():
+    """
+    Ensures a frame whose ring buffer slot was reused before the worker reached it is
+    dropped instead of being processed with another frame's pixels, and that a processed
+    frame stays lent out (not overwritten) while detection runs.
+    """
+    buffer = FrameRingBuffer(capacity=3)
+    seen = []
+
+    def detect(frame):
+        seen.append(int(frame[0, 0, 0]))
+        assert buffer.begin_write()[0] and buffer.begin_write()[1] is not frame  # Writer avoids the lent slot
+        return None
+
+    pipeline = DetectionPipeline(detect_func=detect, frame_buffer=buffer)
+    for seq in (1, 2, 3, 4):
+        buffer.begin_write()
+        slot = buffer.commit(np.full((2, 2, 3), seq, dtype=np.uint8), seq, float(seq))
+    pipeline._process(slot, 1, 1.0, pipeline._generation)
+    assert seen == [] and pipeline.get_latest() is None
+    pipeline._process(slot, 4, 4.0, pipeline._generation)
+    assert seen == [4] and pipeline.get_latest()["seq"] == 4
+    assert buffer._pins == [0, 0, 0]
+
+def test_detect_now_shares_one_detection_per_frame():
+    """
+    Ensures concurrent on-demand detections of the newest frame run detection once and share
+    the result, and that an already-current cached result is returned without detecting.
+    """
+    buffer = FrameRingBuffer(capacity=3)
+    buffer.begin_write()
+    buffer.commit(np.full((2, 2, 3), 5, dtype=np.uint8), 5, 5.0)
+    release = threading.Event()
+    calls = []
+
+    def slow_detect(frame):
+        calls.append(int(frame[0, 0, 0]))
+        release.wait(2.0)
+        return b"img", [{"x": 0, "y": 0, "w": 1, "h": 1}]
+
+    pipeline = DetectionPipeline(detect_func=slow_detect, camera_id="flight-test", frame_buffer=buffer)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pipeline.detect_now())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert wait_for(lambda: calls)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(2.0)
+    assert calls == [5]
+    assert len(results) == 4 and all(r["seq"] == 5 and r["image"] == b"img" for r in results)
+
+    pipeline._latest = {"image": None, "coords": [], "seq": 5, "timestamp": 5.0}
+    assert pipeline.detect_now() is pipeline._latest
+    assert calls == [5]
+
+def test_detect_now_result_is_reused_by_later_calls_and_the_worker():
+    """
+    Ensures an on-demand detection is cached, so later calls and the worker do not detect that frame again.
+    """
+    buffer = FrameRingBuffer(capacity=3)
+    buffer.begin_write()
+    buffer.commit(np.full((2, 2, 3), 5, dtype=np.uint8), 5, 5.0)
+    calls = []
+
+    def fake_detect(frame):
+        calls.append(int(frame[0, 0, 0]))
+        return b"img", [{"x": 0, "y": 0, "w": 1, "h": 1}]
+
+    pipeline = DetectionPipeline(detect_func=fake_detect, camera_id="reuse-test", frame_buffer=buffer)
+    for _ in range(3):
+        assert pipeline.detect_now()["seq"] == 5
+    assert calls == [5] and pipeline.get_latest()["seq"] == 5
+    assert pipeline.newest_frame_info() == (5, 5.0)
+    with patch("app.services.detection_pipeline.detection_event_writer") as fake_writer, \
+         patch("app.services.detection_pipeline.detection_image_writer"):
+        pipeline._process(None, 5, 5.0, pipeline._generation)
+    assert calls == [5]
+    fake_writer.submit.assert_called_once()  # The worker still persists the reused result
+
+def test_subscriber_receives_published_results():
+    """
+    Ensures results processed by the pipeline are pushed to subscribers.
+    """
+    async def scenario():
+        pipeline = DetectionPipeline(detect_func=lambda frame: None)
+        subscriber = pipeline.subscribe()
+        pipeline._process(np.zeros((2, 2, 3), dtype=np.uint8), 9, 3.0, pipeline._generation)
+        return await asyncio.wait_for(subscriber.get(), timeout=1.0)
+
+    result = asyncio.run(scenario())
+    assert result["seq"] == 9
+    assert result["coords"] == []
+
+def test_subscriber_drops_stale_results():
+    """
+    Ensures a slow subscriber only receives the newest result and counts the dropped ones.
+    """
+    async def scenario():
+        subscriber = DetectionSubscriber(asyncio.get_running_loop())
+        for seq in range(1, 4):
+            subscriber.publish({"seq": seq})
+        result = await asyncio.wait_for(subscriber.get(), timeout=1.0)
+        return result, subscriber.dropped
+
+    result, dropped = asyncio.run(scenario())
+    assert result == {"seq": 3}
+    assert dropped == 2
+
+def test_unsubscribe_stops_delivery():
+    """
+    Ensures unsubscribed clients are no longer published to.
+    """
+    async def scenario():
+        pipeline = DetectionPipeline(detect_func=lambda frame: None)
+        subscriber = pipeline.subscribe()
+        pipeline.unsubscribe(subscriber)
+        pipeline._publish({"seq": 1})
+        return subscriber._latest
+
+    assert asyncio.run(scenario()) is None
+
+def test_pipeline_registry_attaches_and_starts_pipelines():
+    """
+    Ensures each attached camera gets its own pipeline fed by its frames,
+    and pipelines attached after start() begin running immediately.
+    """
+    class FakeCamera:
+        frame_buffer = None
+        def __init__(self): self.listeners = []
+        def add_frame_listener(self, callback): self.listeners.append(callback)
+
+    registry = PipelineRegistry()
+    first_camera = FakeCamera()
+    first = registry.attach("a", first_camera)
+    assert first_camera.listeners == [first.submit]
+    registry.start()
+    try:
+        second = registry.attach("b", FakeCamera())
+        assert first.is_running() and second.is_running()
+        assert registry.get("b") is second
+        assert registry.get("missing") is None
+    finally:
+        registry.stop()
+    assert not first.is_running() and not second.is_running()
+
+def test_steady_smile_is_persisted_on_change_and_interval(monkeypatch):
+    """
+    Ensures a smile seen on every frame is saved when it appears, when the smile count changes,
+    and once per PERSIST_INTERVAL, not once per frame.
+    """
+    monkeypatch.setenv("PERSIST_INTERVAL", "1.0")
+    monkeypatch.setenv("DEDUP_WINDOW", "0")
+    one, two = [{"x": 0, "y": 0, "w": 2, "h": 2}], [{"x": 0, "y": 0, "w": 2, "h": 2}, {"x": 2, "y": 2, "w": 2, "h": 2}]
+    frames = [(10.0, one), (10.1, one), (10.2, two), (10.3, two), (11.25, two), (11.3, []), (11.4, one)]
+    results = iter(frames)
+
+    def fake_detect(frame):
+        coords = next(results)[1]
+        return (b"img", coords) if coords else None
+
+    pipeline = DetectionPipeline(detect_func=fake_detect)
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    with patch("app.services.detection_pipeline.detection_event_writer") as fake_writer, \
+         patch("app.services.detection_pipeline.detection_image_writer"):
+        for seq, (timestamp, _) in enumerate(frames, start=1):
+            pipeline._process(frame, seq, timestamp, pipeline._generation)
+    assert [c.args[1] for c in fake_writer.submit.call_args_list] == [10.0, 10.2, 11.25, 11.4]
+    assert pipeline.get_latest()["seq"] == len(frames)
+
+def test_duplicate_detections_are_not_persisted(monkeypatch):
+    """
+    Ensures repeated identical detections are cached for clients but saved only once.
+    """
+    monkeypatch.setenv("PERSIST_INTERVAL", "0")  # Only deduplication limits saving here
+    coords = [{"x": 0, "y": 0, "w": 2, "h": 2}]
+    pipeline = DetectionPipeline(detect_func=lambda frame: (b"img", coords))
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    with patch("app.services.detection_pipeline.detection_event_writer") as fake_writer, \
+         patch("app.services.detection_pipeline.detection_image_writer") as fake_images:
+        pipeline._process(frame, 1, 10.0, pipeline._generation)
+        pipeline._process(frame, 2, 10.5, pipeline._generation)
+    assert fake_writer.submit.call_count == 1
+    assert fake_images.submit.call_count == 1
+    assert pipeline.get_latest()["seq"] == 2
+
+def test_stop_persists_open_episode(monkeypatch):
+    """
+    Ensures open episodes are closed and persisted with their image when the pipeline stops.
+    """
+    monkeypatch.setenv("PERSIST_RAW_DETECTIONS", "0")
+    coords = [{"x": 0, "y": 0, "w": 2, "h": 2}]
+    pipeline = DetectionPipeline(detect_func=lambda frame: (b"img", coords), camera_id="cam")
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    with patch("app.services.detection_pipeline.detection_event_writer") as fake_writer, \
+         patch("app.services.detection_pipeline.detection_image_writer") as fake_images:
+        fake_images.image_path.side_effect = lambda name: f"dir/{name}"
+        pipeline.start()
+        pipeline._process(frame, 1, 10.0, pipeline._generation)
+        pipeline._process(frame, 2, 10.1, pipeline._generation)
+        pipeline.stop()
+    fake_writer.submit.assert_not_called()  # Raw detections disabled
+    episode, image_path = fake_writer.submit_episode.call_args[0]
+    assert episode["camera_id"] == "cam"
+    assert episode["frames"] == 2
+    assert image_path.startswith("dir/episode_cam_")
+    assert fake_images.submit.call_args[0][0] == b"img"
@@ -0,0 +1,102 @@
+"""
+Unit tests for detection profiles and the cascade tuning harness.
+Cascades are mocked, so no labeled images are needed.
+"""
+
+import json
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+from app.services.detection_profile import DetectionProfile, DEFAULT_PROFILE, get_detection_profile
+from app.services.smile_detector import detect_smile_on_frame
+from benchmarks.tune_cascades import parameter_grid, evaluate_profiles, pareto_front, select_profile
+
+def fake_cascades(faces, smiles):
+    """
+    Returns (face, smile) mock cascades returning fixed boxes.
+    """
+    face_cascade, smile_cascade = MagicMock(), MagicMock()
+    face_cascade.detectMultiScale.return_value = faces
+    smile_cascade.detectMultiScale.return_value = smiles
+    return face_cascade, smile_cascade
+
+def test_profile_defaults_round_trip_and_validation(tmp_path):
+    """
+    Ensures defaults match the historical parameters, files round-trip, and bad fields are rejected.
+    """
+    assert DEFAULT_PROFILE.smile_min_neighbors == 25 and DEFAULT_PROFILE.smile_min_size == (25, 25)
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"face_min_neighbors": 3, "smile_max_size": [150, 150]}))
+    profile = DetectionProfile.load(path)
+    assert profile.face_min_neighbors == 3 and profile.smile_max_size == (150, 150)
+    assert profile.face_scale_factor == 1.3
+    assert DetectionProfile.from_dict(profile.to_dict()) == profile
+    with pytest.raises(ValueError):
+        DetectionProfile(smile_neighbours=3)
+    with pytest.raises(ValueError):
+        DetectionProfile(face_scale_factor=1.0)
+
+def test_profile_from_environment_falls_back_on_errors(monkeypatch, tmp_path):
+    """
+    Ensures DETECTION_PROFILE is loaded, and an unreadable file yields the defaults.
+    """
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"min_smile_aspect": 1.5}))
+    monkeypatch.setenv("DETECTION_PROFILE", str(path))
+    assert get_detection_profile().min_smile_aspect == 1.5
+    monkeypatch.setenv("DETECTION_PROFILE", str(tmp_path / "missing.json"))
+    assert get_detection_profile() is DEFAULT_PROFILE
+    monkeypatch.delenv("DETECTION_PROFILE")
+    assert get_detection_profile() is DEFAULT_PROFILE
+
+def test_detection_uses_profile_parameters():
+    """
+    Ensures cascade parameters, the lower-face split and the aspect filter come from the profile.
+    """
+    face_cascade, smile_cascade = fake_cascades([(0, 0, 100, 100)], [(10, 5, 30, 20)])  # Aspect 1.5
+    frame = np.zeros((120, 120, 3), dtype=np.uint8)
+    assert detect_smile_on_frame(frame, face_cascade, smile_cascade, encode_image=False) is None
+    profile = DetectionProfile(face_scale_factor=1.1, face_min_neighbors=3, smile_min_neighbors=15,
+                               lower_face_split=0.6, min_smile_aspect=1.2)
+    _, coords = detect_smile_on_frame(frame, face_cascade, smile_cascade, encode_image=False, profile=profile)
+    assert coords == [{"x": 10, "y": 65, "w": 30, "h": 20}]
+    assert face_cascade.detectMultiScale.call_args[0][1:] == (1.1, 3)
+    roi = smile_cascade.detectMultiScale.call_args[0][0]
+    assert roi.shape == (40, 100) and smile_cascade.detectMultiScale.call_args[1]["minNeighbors"] == 15
+
+def test_evaluate_profiles_matches_detector_and_caches_stages():
+    """
+    Ensures the tuner scores the same boxes detect_smile_on_frame returns, searching once per stage setting.
+    """
+    face_cascade, smile_cascade = fake_cascades([(10, 10, 80, 80)], [(20, 10, 40, 15)])
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    _, coords = detect_smile_on_frame(frame, face_cascade, smile_cascade, encode_image=False)
+    truth = [(c["x"], c["y"], c["w"], c["h"]) for c in coords]
+    samples = [("a.jpg", frame, {"faces": [], "smiles": truth}), ("b.jpg", frame, {"faces": [], "smiles": []})]
+    face_cascade.reset_mock()
+    smile_cascade.reset_mock()
+    profiles = parameter_grid({"min_smile_aspect": [2.0, 3.0], "smile_min_neighbors": [20, 25]})
+    results = evaluate_profiles(samples, profiles, face_cascade, smile_cascade)
+    assert len(results) == 4
+    default = next(r for r in results if r["profile"] == DEFAULT_PROFILE.to_dict())
+    assert (default["true_positives"], default["false_positives"], default["false_negatives"]) == (1, 1, 0)
+    strict = [r for r in results if r["profile"]["min_smile_aspect"] == 3.0]
+    assert all(r["precision"] == 1.0 and r["recall"] == 0.0 for r in strict)  # Aspect 2.67 is filtered out
+    assert face_cascade.detectMultiScale.call_count == 2  # One face setting, two images
+    assert smile_cascade.detectMultiScale.call_count == 4  # Two smile settings, two images
+
+def test_pareto_front_and_selection():
+    """
+    Ensures dominated configurations are dropped and selection respects the latency budget.
+    """
+    results = [
+        {"precision": 0.9, "recall": 0.8, "f1": 0.85, "latency_ms": 20.0},
+        {"precision": 0.8, "recall": 0.6, "f1": 0.69, "latency_ms": 5.0},
+        {"precision": 0.7, "recall": 0.6, "f1": 0.65, "latency_ms": 8.0},  # Dominated by the 5 ms entry
+    ]
+    front = pareto_front(results)
+    assert [r["latency_ms"] for r in front] == [5.0, 20.0]
+    assert select_profile(front)["latency_ms"] == 20.0
+    assert select_profile(front, max_latency_ms=10)["latency_ms"] == 5.0
+    assert select_profile(front, max_latency_ms=1)["latency_ms"] == 5.0
+    assert select_profile([]) is None
@@ -0,0 +1,68 @@
+"""
+Unit tests for smile episode aggregation.
+Feeds synthetic detections with controlled boxes and timestamps.
+"""
+
+from app.services.episodes import EpisodeAggregator, create_episode_aggregator, persist_raw_detections
+
+def box(x, y, w=40, h=20):
+    """
+    Returns a smile box dictionary.
+    """
+    return {"x": x, "y": y, "w": w, "h": h}
+
+def test_consecutive_detections_form_one_episode():
+    """
+    Ensures nearby detections merge into one episode that closes after the gap.
+    """
+    closed = []
+    agg = EpisodeAggregator("cam", closed.append, gap=1.0)
+    agg.add([box(10, 10)], b"a", 100.0)
+    agg.add([box(12, 11, 50, 25)], b"b", 100.5)
+    agg.add([box(14, 12)], b"c", 101.0)
+    agg.expire(101.5)
+    assert closed == []
+    agg.expire(102.5)
+    assert closed == [{
+        "camera_id": "cam",
+        "start": 100.0,
+        "end": 101.0,
+        "frames": 3,
+        "best_box": box(12, 11, 50, 25),
+        "image": b"b",
+    }]
+
+def test_separate_faces_form_separate_episodes():
+    """
+    Ensures distant boxes in the same frame are tracked as separate episodes.
+    """
+    closed = []
+    agg = EpisodeAggregator("cam", closed.append, gap=1.0)
+    agg.add([box(10, 10), box(300, 10)], b"a", 100.0)
+    agg.add([box(11, 10), box(301, 10)], b"b", 100.2)
+    agg.close_all()
+    assert sorted(e["best_box"]["x"] for e in closed) == [10, 300]
+    assert [e["frames"] for e in closed] == [2, 2]
+
+def test_gap_starts_new_episode():
+    """
+    Ensures a detection after the gap starts a new episode instead of extending the old one.
+    """
+    closed = []
+    agg = EpisodeAggregator("cam", closed.append, gap=1.0)
+    agg.add([box(10, 10)], b"a", 100.0)
+    agg.add([box(10, 10)], b"b", 105.0)
+    assert len(closed) == 1
+    agg.close_all()
+    assert [e["start"] for e in closed] == [100.0, 105.0]
+
+def test_environment_configuration(monkeypatch):
+    """
+    Ensures EPISODE_GAP and PERSIST_RAW_DETECTIONS are honoured.
+    """
+    monkeypatch.setenv("EPISODE_GAP", "2.5")
+    assert create_episode_aggregator("cam", print).gap == 2.5
+    monkeypatch.delenv("PERSIST_RAW_DETECTIONS", raising=False)
+    assert persist_raw_detections() is True
+    monkeypatch.setenv("PERSIST_RAW_DETECTIONS", "0")
+    assert persist_raw_detections() is False
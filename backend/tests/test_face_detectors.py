@@ -0,0 +1,127 @@
+"""
+Unit tests for the face detector backend registry and the DNN backend.
+The DNN network is faked, so no model files are needed.
+"""
+
+import cv2
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+from app.services.face_detectors import (
+    FACE_DETECTORS, HaarFaceDetector, DnnFaceDetector, create_face_detector,
+    register_face_detector, face_detector_info,
+)
+from app.services.face_tracker import FaceTracker
+from app.services.smile_detector import detect_smile_on_frame
+from benchmarks.bench_faces import evaluate_face_detector
+from benchmarks.labeled import match_boxes, precision_recall
+
+def fake_net(rows):
+    """
+    Returns a fake SSD network whose forward() yields the given detection rows.
+    """
+    net = MagicMock()
+    net.forward.return_value = np.array(rows, dtype=np.float32).reshape(1, 1, -1, 7)
+    return net
+
+def test_dnn_detector_scales_and_filters_detections():
+    """
+    Ensures SSD rows are mapped to pixel boxes, and low-confidence or out-of-range boxes are dropped.
+    """
+    net = fake_net([
+        [0, 1, 0.9, 0.1, 0.2, 0.5, 0.7],    # 80x100 face at (20, 40) in a 200x200 image
+        [0, 1, 0.3, 0.0, 0.0, 0.5, 0.5],    # Below confidence
+        [0, 1, 0.8, 0.9, 0.9, 0.95, 0.95],  # 10x10: below minSize
+    ])
+    detector = DnnFaceDetector(net, confidence=0.5)
+    faces = detector.detectMultiScale(np.zeros((200, 200), dtype=np.uint8), 1.3, 5, minSize=(20, 20))
+    assert [tuple(f) for f in faces] == [(20, 40, 80, 100)]
+    blob = net.setInput.call_args[0][0]
+    assert blob.shape == (1, 3, 300, 300)
+
+def test_dnn_detector_works_with_face_tracker():
+    """
+    Ensures a non-cascade backend plugs into face tracking through detectMultiScale.
+    """
+    detector = DnnFaceDetector(fake_net([[0, 1, 0.9, 0.25, 0.25, 0.75, 0.75]]))
+    tracker = FaceTracker(redetect_interval=5)
+    assert tracker.detect_faces(np.zeros((100, 100), dtype=np.uint8), detector) == [(25, 25, 50, 50)]
+
+def test_dnn_detector_gets_the_colour_frame():
+    """
+    Ensures the detection path feeds the DNN backend the (downscaled) BGR frame, not equalized gray.
+    """
+    net = fake_net([[0, 1, 0.9, 0.25, 0.25, 0.75, 0.75]])
+    smile_cascade = MagicMock()
+    smile_cascade.detectMultiScale.return_value = []
+    frame = np.zeros((100, 120, 3), dtype=np.uint8)
+    frame[:] = (10, 200, 50)
+    detect_smile_on_frame(frame, DnnFaceDetector(net), smile_cascade, encode_image=False, detection_scale=0.5)
+    blob = net.setInput.call_args[0][0]
+    assert blob[0, :, 150, 150] == pytest.approx([10 - 104.0, 200 - 177.0, 50 - 123.0])
+    assert smile_cascade.detectMultiScale.call_args[0][0].ndim == 2  # Smiles are still searched on gray
+
+def test_dnn_load_requires_model_files(tmp_path):
+    """
+    Ensures loading fails with FileNotFoundError when the model files are absent.
+    """
+    with pytest.raises(FileNotFoundError):
+        DnnFaceDetector.load(model=str(tmp_path / "missing.caffemodel"), config=str(tmp_path / "missing.prototxt"))
+
+def test_create_face_detector_selects_and_falls_back(monkeypatch, tmp_path):
+    """
+    Ensures FACE_DETECTOR selects a backend, and unknown or unloadable backends fall back to Haar.
+    """
+    monkeypatch.delenv("FACE_DETECTOR", raising=False)
+    assert isinstance(create_face_detector(), HaarFaceDetector)
+    monkeypatch.setenv("FACE_DETECTOR", "nope")
+    assert isinstance(create_face_detector(), HaarFaceDetector)
+    monkeypatch.setenv("FACE_DETECTOR", "dnn")
+    monkeypatch.setenv("DNN_FACE_MODEL", str(tmp_path / "missing.caffemodel"))
+    assert isinstance(create_face_detector(), HaarFaceDetector)
+
+def test_registry_info_reports_cost(monkeypatch):
+    """
+    Ensures custom backends can be registered and every backend reports its measured cost.
+    """
+    class FixedDetector(HaarFaceDetector):
+        name = "fixed-test"
+        def _detect(self, image, *args):
+            return [(1, 2, 3, 4)]
+
+    register_face_detector("fixed-test", FixedDetector, "Returns one box")
+    try:
+        monkeypatch.setenv("FACE_DETECTOR", "fixed-test")
+        detector = create_face_detector()
+        detector.detectMultiScale(np.zeros((10, 10), dtype=np.uint8))
+        info = {entry["name"]: entry for entry in face_detector_info()}
+        assert info["fixed-test"]["active"] and info["fixed-test"]["calls"] == 1
+        assert info["fixed-test"]["mean_ms"] >= 0
+        assert not info["haar"]["active"] and "dnn" in info
+    finally:
+        del FACE_DETECTORS["fixed-test"]
+
+def test_info_reports_fallback_when_model_files_are_missing(monkeypatch, tmp_path):
+    """
+    Ensures a requested backend that fell back to Haar is reported as such, with Haar active.
+    """
+    monkeypatch.setattr("app.services.face_detectors._loaded", {})
+    monkeypatch.setenv("FACE_DETECTOR", "dnn")
+    monkeypatch.setenv("DNN_FACE_MODEL", str(tmp_path / "missing.caffemodel"))
+    assert isinstance(create_face_detector(), HaarFaceDetector)
+    info = {entry["name"]: entry for entry in face_detector_info()}
+    assert info["haar"]["active"] and not info["haar"]["requested"]
+    assert not info["dnn"]["active"] and info["dnn"]["requested"] and info["dnn"]["fallback"]
+    assert "missing.caffemodel" in info["dnn"]["error"]
+
+def test_evaluate_face_detector_scores_boxes():
+    """
+    Ensures the comparison benchmark scores precision/recall against labeled boxes.
+    """
+    detector = MagicMock()
+    detector.detectMultiScale.return_value = [(10, 10, 50, 50), (100, 100, 20, 20)]
+    frame = np.zeros((200, 200, 3), dtype=np.uint8)
+    result = evaluate_face_detector(detector, [("a.jpg", frame, {"faces": [(12, 12, 50, 50), (150, 10, 30, 30)]})])
+    assert (result["true_positives"], result["false_positives"], result["false_negatives"]) == (1, 1, 1)
+    assert result["precision"] == 0.5 and result["recall"] == 0.5
+    assert match_boxes([], []) == (0, 0, 0) and precision_recall(0, 0, 0) == (1.0, 1.0)
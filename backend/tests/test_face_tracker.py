@@ -0,0 +1,92 @@
+"""
+Unit tests for FaceTracker.
+Mocks the face cascade to control full-frame and ROI detections.
+"""
+
+import numpy as np
+from unittest.mock import MagicMock
+from app.services.face_tracker import FaceTracker, create_face_tracker
+from app.services.smile_detector import detect_smile_on_frame
+
+def make_cascade(full_faces, roi_faces):
+    """
+    Returns a fake cascade answering full-frame calls with full_faces and ROI calls with roi_faces.
+    """
+    cascade = MagicMock()
+    def detect(image, *args, **kwargs):
+        return full_faces if image.shape == (200, 200) else roi_faces
+    cascade.detectMultiScale.side_effect = detect
+    return cascade
+
+def test_first_frame_runs_full_detection():
+    """
+    Ensures the first frame is scanned in full and its faces are returned.
+    """
+    tracker = FaceTracker(redetect_interval=5)
+    cascade = make_cascade([(50, 50, 40, 40)], [])
+    gray = np.zeros((200, 200), dtype=np.uint8)
+    assert tracker.detect_faces(gray, cascade) == [(50, 50, 40, 40)]
+    assert cascade.detectMultiScale.call_count == 1
+
+def test_tracks_in_roi_between_full_detections():
+    """
+    Ensures intermediate frames only search an ROI, mapping results back to frame coordinates,
+    and that full detection runs again after redetect_interval frames.
+    """
+    tracker = FaceTracker(redetect_interval=3, search_margin=0.5)
+    cascade = make_cascade([(50, 50, 40, 40)], [(22, 20, 40, 40)])
+    gray = np.zeros((200, 200), dtype=np.uint8)
+
+    tracker.detect_faces(gray, cascade)  # full
+    faces = tracker.detect_faces(gray, cascade)  # tracked: ROI origin is (30, 30)
+    assert faces == [(52, 50, 40, 40)]
+    roi = cascade.detectMultiScale.call_args[0][0]
+    assert roi.shape == (80, 80)
+
+    tracker.detect_faces(gray, cascade)  # tracked
+    tracker.detect_faces(gray, cascade)  # interval reached: full again
+    full_calls = [c for c in cascade.detectMultiScale.call_args_list if c[0][0].shape == (200, 200)]
+    assert len(full_calls) == 2
+
+def test_lost_face_triggers_full_detection():
+    """
+    Ensures a face missing from its ROI falls back to full-frame detection on the same frame.
+    """
+    tracker = FaceTracker(redetect_interval=10)
+    cascade = make_cascade([(50, 50, 40, 40)], [])
+    gray = np.zeros((200, 200), dtype=np.uint8)
+    tracker.detect_faces(gray, cascade)
+    assert tracker.detect_faces(gray, cascade) == [(50, 50, 40, 40)]
+    full_calls = [c for c in cascade.detectMultiScale.call_args_list if c[0][0].shape == (200, 200)]
+    assert len(full_calls) == 2
+
+def test_state_round_trip_and_reset():
+    """
+    Ensures tracker state can be exported/restored and reset forces a full scan.
+    """
+    tracker = FaceTracker()
+    tracker.set_state(([(1, 2, 3, 4)], 2))
+    assert tracker.get_state() == ([(1, 2, 3, 4)], 2)
+    tracker.reset()
+    assert tracker.get_state() == ([], 0)
+
+def test_create_face_tracker_from_environment(monkeypatch):
+    """
+    Ensures tracking is disabled by default and enabled by FACE_TRACKING_INTERVAL.
+    """
+    monkeypatch.delenv("FACE_TRACKING_INTERVAL", raising=False)
+    assert create_face_tracker() is None
+    monkeypatch.setenv("FACE_TRACKING_INTERVAL", "8")
+    assert create_face_tracker().redetect_interval == 8
+
+def test_detect_smile_on_frame_uses_tracker():
+    """
+    Ensures detect_smile_on_frame asks the tracker for faces instead of scanning the frame.
+    """
+    tracker = MagicMock()
+    tracker.detect_faces.return_value = []
+    face_cascade = MagicMock()
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    assert detect_smile_on_frame(frame, face_cascade=face_cascade, smile_cascade=MagicMock(), face_tracker=tracker) is None
+    tracker.detect_faces.assert_called_once()
+    face_cascade.detectMultiScale.assert_not_called()
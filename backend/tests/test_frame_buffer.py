@@ -0,0 +1,92 @@
+"""
+Unit tests for FrameRingBuffer.
+"""
+
+import numpy as np
+import pytest
+from app.services.frame_buffer import FrameRingBuffer, convert_frame
+
+def write(buffer, value, seq, shape=(2, 3, 3)):
+    """
+    Writes one frame the way the capture loop does: into the claimed slot when possible.
+    """
+    writable, slot = buffer.begin_write()
+    assert writable
+    frame = np.full(shape, value, dtype=np.uint8)
+    if slot is not None and slot.shape == frame.shape:
+        slot[:] = frame
+        frame = slot
+    return buffer.commit(frame, seq, float(seq))
+
+def test_slots_are_preallocated_and_reused():
+    """
+    Ensures frames cycle through capacity slots of one array and old frames expire.
+    """
+    buffer = FrameRingBuffer(capacity=3)
+    first = write(buffer, 1, 1)
+    second = write(buffer, 2, 2)
+    write(buffer, 3, 3)
+    fourth = write(buffer, 4, 4)
+    assert np.shares_memory(first, fourth) and not np.shares_memory(first, second)
+    assert buffer.copy(1) is None
+    frame, seq, timestamp = buffer.copy()
+    assert (frame == 4).all() and seq == 4 and timestamp == 4.0
+    assert buffer.latest_info() == (4, 4.0)
+
+def test_copy_detects_overwrite_during_copy():
+    """
+    Ensures a slot claimed for writing is no longer readable under its old sequence number.
+    """
+    buffer = FrameRingBuffer(capacity=3)
+    for seq in (1, 2, 3):
+        write(buffer, seq, seq)
+    buffer.begin_write()  # Capture thread starts overwriting frame 1
+    assert buffer.copy(1) is None
+    assert buffer.copy(2)[1] == 2
+
+def test_lease_is_read_only_and_pins_its_slot():
+    """
+    Ensures a borrowed frame is a read-only view the writer skips until it is released,
+    and that new frames are skipped while every spare slot is lent out.
+    """
+    buffer = FrameRingBuffer(capacity=3)
+    for seq in (1, 2, 3):
+        write(buffer, seq, seq)
+    with buffer.acquire(1) as lease:
+        assert lease.seq == 1 and (lease.frame == 1).all()
+        with pytest.raises(ValueError):
+            lease.frame[0, 0, 0] = 9
+        write(buffer, 4, 4)  # Replaces frame 2, not the lent frame 1
+        assert (lease.frame == 1).all() and buffer.copy(2) is None
+        second = buffer.acquire(3)
+        assert buffer.begin_write() == (False, None)  # Only the newest frame is left
+        second.release()
+        second.release()
+    assert buffer._pins == [0, 0, 0]
+    write(buffer, 5, 5)
+    assert buffer.copy(3) is None and buffer.copy(1)[1] == 1 and buffer.copy(5)[1] == 5
+
+def test_shape_change_reallocates_and_window_is_ordered():
+    """
+    Ensures a resolution change replaces the ring, and window() returns the newest frames oldest first.
+    """
+    buffer = FrameRingBuffer(capacity=3)
+    write(buffer, 1, 1)
+    write(buffer, 2, 2, shape=(4, 4, 3))
+    write(buffer, 3, 3, shape=(4, 4, 3))
+    assert [seq for _, seq, _ in buffer.window(5)] == [2, 3]
+    assert buffer.window(1)[0][0].shape == (4, 4, 3)
+    buffer.clear()
+    assert buffer.copy() is None and buffer.window(3) == []
+
+def test_convert_frame_grayscale_and_downscale():
+    """
+    Ensures conversions return new arrays of the requested shape, even for a read-only frame.
+    """
+    frame = np.full((8, 12, 3), 200, dtype=np.uint8)
+    frame.flags.writeable = False
+    assert convert_frame(frame, gray=True).shape == (8, 12)
+    assert convert_frame(frame, scale=0.5).shape == (4, 6, 3)
+    small_gray = convert_frame(frame, gray=True, scale=0.5)
+    assert small_gray.shape == (4, 6) and small_gray.flags.writeable
+    assert convert_frame(frame).flags.writeable
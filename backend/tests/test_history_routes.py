@@ -0,0 +1,116 @@
+"""
+API route tests for detection history and aggregate endpoints.
+Seeds a temporary SQLite database through the normalized insert helper.
+"""
+
+import sqlite3
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.detection_event import ensure_schema, insert_detection_events
+from app.models.detection_history import open_history_db
+
+client = TestClient(app)
+
+@pytest.fixture
+def history_db(tmp_path, monkeypatch):
+    """
+    Points SMILE_DB_PATH at a database with five events: three on "a", two on "b".
+    """
+    db_path = str(tmp_path / "history.db")
+    monkeypatch.setenv("SMILE_DB_PATH", db_path)
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn)
+    box = {"x": 1, "y": 2, "w": 3, "h": 4}
+    insert_detection_events(conn, [
+        ("a", 3600.0, [box], None),
+        ("a", 3610.0, [box, box], None),
+        ("b", 3620.0, [box], None),
+        ("a", 7200.0, [box], "smile_a.jpg"),
+        ("b", 7260.0, [], None),
+    ])
+    conn.commit()
+    conn.close()
+    return db_path
+
+def test_detections_paginate_newest_first(history_db):
+    """
+    Ensures /detections walks all events newest first with a cursor and returns their boxes.
+    """
+    first = client.get("/detections", params={"limit": 2}).json()
+    assert [item["timestamp"] for item in first["items"]] == [7260.0, 7200.0]
+    assert first["items"][1]["coords"] == [{"x": 1, "y": 2, "w": 3, "h": 4}]
+    second = client.get("/detections", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    third = client.get("/detections", params={"limit": 2, "cursor": second["next_cursor"]}).json()
+    assert [item["timestamp"] for item in second["items"]] == [3620.0, 3610.0]
+    assert len(second["items"][1]["coords"]) == 2
+    assert [item["timestamp"] for item in third["items"]] == [3600.0]
+    assert third["next_cursor"] is None
+
+def test_detections_filter_by_camera_and_time(history_db):
+    """
+    Ensures camera_id, start (inclusive) and end (exclusive) narrow the results.
+    """
+    response = client.get("/detections", params={"camera_id": "a", "start": 3610, "end": 7200})
+    assert response.status_code == 200
+    assert [item["timestamp"] for item in response.json()["items"]] == [3610.0]
+
+def test_detections_rejects_bad_cursor_and_limit(history_db):
+    """
+    Ensures malformed cursors and out-of-range limits return 400.
+    """
+    assert client.get("/detections", params={"cursor": "nope"}).status_code == 400
+    assert client.get("/detections", params={"limit": 0}).status_code == 400
+
+def test_aggregate_per_hour_and_camera(history_db):
+    """
+    Ensures /detections/aggregate counts events and smiles per hour and camera.
+    """
+    response = client.get("/detections/aggregate", params={"bucket": "hour"})
+    assert response.status_code == 200
+    assert response.json() == {"bucket": "hour", "results": [
+        {"camera_id": "a", "bucket_start": 3600, "detections": 2, "smiles": 3},
+        {"camera_id": "b", "bucket_start": 3600, "detections": 1, "smiles": 1},
+        {"camera_id": "a", "bucket_start": 7200, "detections": 1, "smiles": 1},
+        {"camera_id": "b", "bucket_start": 7200, "detections": 1, "smiles": 0},
+    ]}
+
+def test_aggregate_per_minute_for_one_camera(history_db):
+    """
+    Ensures minute buckets and the camera filter are applied.
+    """
+    results = client.get("/detections/aggregate", params={"camera_id": "a"}).json()["results"]
+    assert [(r["bucket_start"], r["detections"]) for r in results] == [(3600, 2), (7200, 1)]
+
+def test_aggregate_rejects_unknown_bucket(history_db):
+    """
+    Ensures unknown bucket sizes return 400.
+    """
+    assert client.get("/detections/aggregate", params={"bucket": "day"}).status_code == 400
+
+def test_detection_image_is_served_by_key(history_db, tmp_path, monkeypatch):
+    """
+    Ensures /detections/{id}/image returns the saved image and 404 for events without one.
+    """
+    monkeypatch.setenv("DETECTION_IMAGE_DIR", str(tmp_path))
+    (tmp_path / "smile_a.jpg").write_bytes(b"jpeg")
+    items = client.get("/detections", params={"camera_id": "a"}).json()["items"]
+    assert [item["has_image"] for item in items] == [True, False, False]
+    response = client.get(f"/detections/{items[0]['id']}/image")
+    assert response.status_code == 200
+    assert response.content == b"jpeg"
+    assert response.headers["content-type"] == "image/jpeg"
+    assert client.get(f"/detections/{items[1]['id']}/image").status_code == 404
+    assert client.get("/detections/999/image").status_code == 404
+
+def test_history_connection_is_read_only(history_db):
+    """
+    Ensures history reads open the database read-only, so a request can never run DDL.
+    """
+    conn = open_history_db()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM detection_events").fetchone() == (5,)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("CREATE TABLE scratch (id INTEGER)")
+    finally:
+        conn.close()
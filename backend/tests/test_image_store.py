@@ -0,0 +1,76 @@
+"""
+Unit tests for the append-only image pack store.
+Uses small pack sizes in a temporary directory to exercise rollover and retention.
+"""
+
+import os
+from app.models.image_store import ImagePackStore, create_image_pack_store
+
+def test_append_and_read_back(tmp_path):
+    """
+    Ensures appended images are read back exactly through their (pack, offset, length) location.
+    """
+    store = ImagePackStore(str(tmp_path))
+    first = store.append(b"first-image")
+    second = store.append(b"second")
+    try:
+        assert first == (1, 0, 11)
+        assert second == (1, 11, 6)
+        assert store.read(*first) == b"first-image"
+        assert store.read(*second) == b"second"
+        third = store.append(b"appended-after-mapping")
+        assert store.read(*third) == b"appended-after-mapping"
+    finally:
+        store.close()
+
+def test_rolls_over_to_new_pack(tmp_path):
+    """
+    Ensures a new pack is started when the current one would exceed max_pack_bytes,
+    and a reopened store continues with a fresh pack.
+    """
+    store = ImagePackStore(str(tmp_path), max_pack_bytes=10)
+    locations = [store.append(b"123456") for _ in range(3)]
+    store.close()
+    assert [pack for pack, _, _ in locations] == [1, 2, 3]
+    assert sorted(os.listdir(tmp_path)) == ["pack_00000001.pack", "pack_00000002.pack", "pack_00000003.pack"]
+
+    reopened = ImagePackStore(str(tmp_path), max_pack_bytes=10)
+    try:
+        assert reopened.read(*locations[0]) == b"123456"
+        assert reopened.append(b"x")[0] == 4
+    finally:
+        reopened.close()
+
+def test_retention_deletes_whole_packs(tmp_path):
+    """
+    Ensures size and age retention delete the oldest whole packs but never the current one.
+    """
+    store = ImagePackStore(str(tmp_path), max_pack_bytes=10, max_total_bytes=20)
+    locations = [store.append(b"123456789") for _ in range(4)]
+    try:
+        assert store.read(*locations[0]) == b"123456789"  # Mapped before deletion
+        assert store.enforce_retention() == [1, 2]
+        assert store.read(*locations[0]) is None
+        assert store.read(*locations[2]) == b"123456789"
+        store.max_total_bytes = 0
+        store.max_age = 60
+        assert store.enforce_retention(now=store._packs[4][1] + 120) == [3]
+        assert sorted(os.listdir(tmp_path)) == ["pack_00000004.pack"]
+    finally:
+        store.close()
+
+def test_create_from_environment(tmp_path, monkeypatch):
+    """
+    Ensures the pack store is only created with IMAGE_STORE=pack and honours its settings.
+    """
+    monkeypatch.delenv("IMAGE_STORE", raising=False)
+    assert create_image_pack_store() is None
+    monkeypatch.setenv("IMAGE_STORE", "pack")
+    monkeypatch.setenv("IMAGE_PACK_DIR", str(tmp_path))
+    monkeypatch.setenv("IMAGE_PACK_SIZE_MB", "1")
+    monkeypatch.setenv("IMAGE_RETENTION_DAYS", "2")
+    store = create_image_pack_store()
+    assert store.directory == str(tmp_path)
+    assert store.max_pack_bytes == 1024 * 1024
+    assert store.max_age == 2 * 86400
+    assert store.max_total_bytes == 0
@@ -2,8 +2,14 @@
 Integration tests for FastAPI app entrypoint and health check endpoint.
 """
 
+import sqlite3
+import time
+from unittest.mock import patch
 from fastapi.testclient import TestClient
-from app.main import app
+from app.main import app, shutdown_event
+from app.models.detection_event import DetectionEventWriter, DetectionImageWriter
+from app.models.image_store import ImagePackStore
+from app.services.metrics import metrics
 
 client = TestClient(app)
 
@@ -14,3 +20,53 @@ def test_health_check():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"message": "Smile Detection API is running."}
+
+def test_metrics_endpoint():
+    """
+    Ensures /metrics serves stage histograms, counters and queue gauges in Prometheus text format.
+    """
+    metrics.observe("face", 0.003)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'smile_stage_seconds_bucket{stage="face",le="0.005"}' in body
+    assert "smile_frames_captured_total" in body
+    assert 'smile_queue_depth{queue="events"}' in body
+    assert 'smile_capture_fps{camera="default"}' in body
+    assert 'smile_cascade_pool{state="in_use"}' in body
+
+def test_detectors_endpoint(monkeypatch):
+    """
+    Ensures /detectors lists the face detector backends and marks the configured one active.
+    """
+    monkeypatch.setattr("app.services.face_detectors._loaded", {})  # No detector created yet
+    monkeypatch.setenv("FACE_DETECTOR", "dnn")
+    detectors = {entry["name"]: entry for entry in client.get("/detectors").json()["detectors"]}
+    assert set(detectors) >= {"haar", "dnn"}
+    assert detectors["dnn"]["active"] and not detectors["haar"]["active"]
+
+def test_shutdown_indexes_every_packed_image(tmp_path):
+    """
+    Ensures shutdown drains the image writer before the event writer, so every image
+    appended to a pack gets its index row.
+    """
+    db_path = str(tmp_path / "shutdown.db")
+    event_writer = DetectionEventWriter(db_path=db_path, flush_interval=60)
+    store = ImagePackStore(str(tmp_path / "packs"))
+    append = store.append
+    def slow_append(image_bytes):
+        time.sleep(0.002)  # Images are still being written when shutdown starts
+        return append(image_bytes)
+    store.append = slow_append
+    image_writer = DetectionImageWriter(save_dir=str(tmp_path), max_queue=100, pack_store=store, event_writer=event_writer)
+    event_writer.start()
+    image_writer.start()
+    for i in range(50):
+        assert image_writer.submit(b"jpeg", filename=f"smile_{i}.jpg") is True
+    with patch("app.main.detection_event_writer", event_writer), patch("app.main.detection_image_writer", image_writer):
+        shutdown_event()
+    conn = sqlite3.connect(db_path)
+    indexed = conn.execute("SELECT COUNT(*) FROM detection_images").fetchone()[0]
+    conn.close()
+    assert image_writer.written == indexed == 50
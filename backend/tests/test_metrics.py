@@ -0,0 +1,55 @@
+"""
+Unit tests for the metrics registry, stage timers and Server-Timing formatting.
+Uses private Metrics instances so tests do not depend on the shared registry.
+"""
+
+from app.services.metrics import Metrics, server_timing
+
+def test_stage_histogram_buckets_are_cumulative():
+    """
+    Ensures observations land in the right buckets and render cumulatively with sum and count.
+    """
+    metrics = Metrics(buckets=(0.01, 0.1))
+    metrics.observe("face", 0.005)
+    metrics.observe("face", 0.05)
+    metrics.observe("face", 5.0)
+    body = metrics.render()
+    assert 'smile_stage_seconds_bucket{stage="face",le="0.01"} 1' in body
+    assert 'smile_stage_seconds_bucket{stage="face",le="0.1"} 2' in body
+    assert 'smile_stage_seconds_bucket{stage="face",le="+Inf"} 3' in body
+    assert 'smile_stage_seconds_count{stage="face"} 3' in body
+    assert 'smile_stage_seconds_sum{stage="face"} 5.055' in body
+
+def test_collect_timings_captures_only_this_block():
+    """
+    Ensures the collector sums repeated stages inside the block and ignores later ones.
+    """
+    metrics = Metrics()
+    with metrics.collect_timings() as timings:
+        with metrics.time_stage("smile"):
+            pass
+        metrics.observe("smile", 0.25)
+    metrics.observe("encode", 1.0)
+    assert set(timings) == {"smile"}
+    assert timings["smile"] >= 0.25
+
+def test_counters_and_gauges():
+    """
+    Ensures labelled counters and scrape-time gauges are rendered, and unused counters show 0.
+    """
+    metrics = Metrics()
+    metrics.inc("smile_detections_total")
+    metrics.inc("smile_detections_total", 2)
+    metrics.register_gauge("queue_depth", "Pending items", lambda: {(("queue", "events"),): 4})
+    body = metrics.render()
+    assert metrics.get("smile_detections_total") == 3
+    assert "smile_detections_total 3" in body
+    assert "smile_frames_dropped_total 0" in body
+    assert 'queue_depth{queue="events"} 4' in body
+
+def test_server_timing_format():
+    """
+    Ensures stage durations are formatted in milliseconds, with extra entries appended.
+    """
+    assert server_timing({"face": 0.0123}, app=0.0005) == "face;dur=12.30, app;dur=0.50"
+    assert server_timing(None) == ""
@@ -0,0 +1,127 @@
+"""
+Unit tests for the offline video / image directory CLI.
+Uses tiny synthetic videos and images; detection is patched except in the multi-process test.
+"""
+
+import os
+import sqlite3
+import cv2
+import numpy as np
+import pytest
+from unittest.mock import patch
+from app.offline import plan_chunks, process_video_chunk, run, main
+
+def write_video(path, frames=20, fps=10):
+    """
+    Writes a small MJPG video whose frame i has brightness i * 10.
+    """
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (32, 24))
+    for i in range(frames):
+        writer.write(np.full((24, 32, 3), i * 10, dtype=np.uint8))
+    writer.release()
+
+def fake_detect(frame, face_tracker):
+    """
+    Reports one smile on bright frames.
+    """
+    return [{"x": 1, "y": 2, "w": 3, "h": 4}] if frame.mean() >= 95 else []
+
+def test_plan_chunks():
+    """
+    Ensures inputs are split into consecutive ranges covering every item.
+    """
+    assert plan_chunks(10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert plan_chunks(0, 4) == []
+
+def test_video_stride_chunks_and_bulk_store(tmp_path):
+    """
+    Ensures every stride-th frame is scored across chunks and detections are stored with video timestamps.
+    """
+    video = tmp_path / "clip.avi"
+    write_video(video)
+    db_path = str(tmp_path / "offline.db")
+    with patch("app.offline._detect", side_effect=fake_detect):
+        summary = run(str(video), db_path=db_path, stride=2, chunk_size=7, batch_size=2, start_time=1000.0)
+    assert summary["scored"] == 10  # Frames 0, 2, ..., 18
+    assert summary["detections"] == 5  # Frames 10, 12, ..., 18
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT camera_id, ts, box_count FROM detection_events ORDER BY ts").fetchall()
+    conn.close()
+    assert [ts for _, ts, _ in rows] == pytest.approx([1001.0, 1001.2, 1001.4, 1001.6, 1001.8])
+    assert {(camera, count) for camera, _, count in rows} == {("clip.avi", 1)}
+
+def test_video_default_start_time_is_mtime_minus_duration(tmp_path):
+    """
+    Ensures the default start time places the last frame at the file's modification time.
+    """
+    video = tmp_path / "clip.avi"
+    write_video(video)  # 20 frames at 10 fps: 2 seconds
+    os.utime(video, (5000.0, 5000.0))
+    db_path = str(tmp_path / "offline.db")
+    with patch("app.offline._detect", side_effect=fake_detect):
+        run(str(video), db_path=db_path, chunk_size=7)
+    conn = sqlite3.connect(db_path)
+    timestamps = [row[0] for row in conn.execute("SELECT ts FROM detection_events ORDER BY ts")]
+    conn.close()
+    assert timestamps[0] == pytest.approx(4999.0) and timestamps[-1] == pytest.approx(4999.9)
+
+def test_video_chunk_timestamps_come_from_stream_position(tmp_path):
+    """
+    Ensures frames are timed by the decoder position, not by frame index and nominal fps.
+    """
+    class VariableRateCapture:
+        """Reports frame i at i * 250 ms although the nominal rate is 10 fps."""
+        def __init__(self, path):
+            self.position = 0
+        def set(self, prop, value):
+            self.position = int(value)
+        def get(self, prop):
+            return {cv2.CAP_PROP_FPS: 10.0, cv2.CAP_PROP_POS_MSEC: (self.position - 1) * 250.0}.get(prop, 0.0)
+        def grab(self):
+            self.position += 1
+            return True
+        def read(self):
+            self.position += 1
+            return True, np.full((4, 4, 3), 200, dtype=np.uint8)
+        def release(self):
+            pass
+
+    with patch("app.offline.cv2.VideoCapture", VariableRateCapture), patch("app.offline._detect", side_effect=fake_detect):
+        scored, detections = process_video_chunk("clip.avi", 4, 8, 2)
+    assert scored == 2
+    assert [seconds for seconds, _ in detections] == [1.0, 1.5]
+
+def test_image_directory(tmp_path):
+    """
+    Ensures a directory of images is scored in name order, skipping unreadable files.
+    """
+    images = tmp_path / "images"
+    images.mkdir()
+    for i, value in enumerate([0, 200, 50, 250]):
+        cv2.imwrite(str(images / f"{i}.png"), np.full((8, 8, 3), value, dtype=np.uint8))
+    (images / "broken.jpg").write_bytes(b"not an image")
+    db_path = str(tmp_path / "images.db")
+    with patch("app.offline._detect", side_effect=fake_detect):
+        summary = run(str(images), db_path=db_path, camera_id="lobby", chunk_size=2)
+    assert summary["scored"] == 4
+    assert summary["detections"] == 2
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT camera_id, COUNT(*) FROM detection_events").fetchone() == ("lobby", 2)
+    conn.close()
+
+def test_parallel_workers_score_every_frame(tmp_path):
+    """
+    Ensures chunks run in worker processes and together score the whole video.
+    """
+    video = tmp_path / "blank.avi"
+    write_video(video, frames=12)
+    summary = run(str(video), db_path=str(tmp_path / "parallel.db"), workers=2, chunk_size=4)
+    assert summary["scored"] == 12
+    assert summary["detections"] == 0
+
+def test_main_reports_unreadable_source(tmp_path):
+    """
+    Ensures the CLI exits with status 1 for a source it cannot open.
+    """
+    with patch("app.offline.setup_logger"):
+        assert main([str(tmp_path / "missing.mp4"), "--db", str(tmp_path / "x.db")]) == 1
@@ -0,0 +1,97 @@
+"""
+Unit tests for the process-pool detection engine.
+Runs a real single-worker pool on small synthetic frames.
+"""
+
+import cv2
+import numpy as np
+import pytest
+from app.services import process_detector
+from app.services.process_detector import ProcessPoolDetector, get_process_detector, shutdown_process_detector
+from app.services.face_tracker import FaceTracker
+
+@pytest.fixture(scope="module")
+def detector():
+    """
+    Provides one single-worker pool for the module (process startup is slow).
+    """
+    engine = ProcessPoolDetector(workers=1)
+    yield engine
+    engine.close()
+
+def test_detect_blank_frame_returns_none(detector):
+    """
+    Ensures a frame without faces yields None, like detect_smile_on_frame.
+    """
+    frame = np.zeros((60, 80, 3), dtype=np.uint8)
+    assert detector.detect(frame) is None
+    assert not frame.any()
+
+def test_detect_none_frame_returns_none(detector):
+    """
+    Ensures a missing frame is rejected without touching the pool.
+    """
+    assert detector.detect(None) is None
+
+def test_detect_grows_shared_memory_slot(detector):
+    """
+    Ensures larger frames reallocate the shared memory slot instead of failing.
+    """
+    assert detector.detect(np.zeros((10, 10, 3), dtype=np.uint8)) is None
+    assert detector.detect(np.zeros((120, 160, 3), dtype=np.uint8)) is None
+    assert all(slot.size >= 10 * 10 * 3 for slot in detector._all_slots)
+
+def test_detect_encoded_preserves_order(detector):
+    """
+    Ensures encoded batch detection returns one entry per input, with None for undecodable data.
+    """
+    _, png = cv2.imencode(".png", np.zeros((50, 50, 3), dtype=np.uint8))
+    assert detector.detect_encoded([png.tobytes(), b"garbage"]) == [[], None]
+    assert detector.detect_encoded([]) == []
+
+def test_warm_up_runs_in_every_worker(detector):
+    """
+    Ensures warmup reaches the pool's worker process and leaves it usable.
+    """
+    assert detector.warm_up() == 1
+    assert detector.detect(np.zeros((60, 80, 3), dtype=np.uint8)) is None
+
+def test_get_process_detector_disabled_by_default(monkeypatch):
+    """
+    Ensures no pool is created unless DETECTION_BACKEND=process.
+    """
+    monkeypatch.delenv("DETECTION_BACKEND", raising=False)
+    assert get_process_detector() is None
+
+def test_get_process_detector_is_shared(monkeypatch):
+    """
+    Ensures the configured engine is created once, honours DETECTION_WORKERS, and can be shut down.
+    """
+    created = []
+
+    class FakeDetector:
+        def __init__(self, workers=None):
+            self.workers = workers
+            self.closed = False
+            created.append(self)
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setenv("DETECTION_BACKEND", "process")
+    monkeypatch.setenv("DETECTION_WORKERS", "3")
+    monkeypatch.setattr(process_detector, "ProcessPoolDetector", FakeDetector)
+    engine = get_process_detector()
+    assert get_process_detector() is engine
+    assert engine.workers == 3
+    shutdown_process_detector()
+    assert engine.closed is True
+    assert len(created) == 1
+
+def test_detect_round_trips_face_tracker_state(detector):
+    """
+    Ensures tracker state updated in the worker is copied back to the caller's tracker.
+    """
+    tracker = FaceTracker(redetect_interval=5)
+    tracker.set_state(([(1, 1, 5, 5)], 4))  # Interval reached: worker runs a full scan
+    assert detector.detect(np.zeros((60, 80, 3), dtype=np.uint8), face_tracker=tracker) is None
+    assert tracker.get_state() == ([], 0)
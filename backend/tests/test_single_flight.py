@@ -0,0 +1,81 @@
+"""
+Unit tests for the SingleFlight request coalescing helper.
+"""
+
+import threading
+import pytest
+from app.services.single_flight import SingleFlight, Overloaded, create_single_flight
+
+def test_concurrent_callers_share_one_computation():
+    """
+    Ensures callers with the same key wait for the leader's result instead of computing it again.
+    """
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(2.0)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", compute)))
+    leader.start()
+    assert started.wait(2.0)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("k", compute))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(2.0)
+    assert calls == [1]
+    assert results == ["result"] * 4
+    assert flights.inflight() == 0
+    assert flights.do("k", lambda: "again") == "again"  # Finished flights are not cached
+
+def test_limit_rejects_new_work_but_not_unlimited_callers():
+    """
+    Ensures the concurrency limit turns away new limited computations, while unlimited
+    (background) callers and followers of a running flight are unaffected.
+    """
+    flights = SingleFlight(max_inflight=1, wait_timeout=0.01)
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(2.0)
+        return 1
+
+    leader = threading.Thread(target=lambda: flights.do("a", compute))
+    leader.start()
+    assert started.wait(2.0)
+    with pytest.raises(Overloaded):
+        flights.do("b", lambda: 2)
+    assert flights.do("c", lambda: 3, limited=False) == 3
+    with pytest.raises(Overloaded):
+        flights.do("a", lambda: 4)  # Follower gives up after wait_timeout
+    release.set()
+    leader.join(2.0)
+    assert flights.do("b", lambda: 2) == 2
+
+def test_errors_reach_every_caller():
+    """
+    Ensures an exception raised by the computation is re-raised to its caller and the flight is cleared.
+    """
+    flights = SingleFlight()
+    with pytest.raises(ValueError):
+        flights.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flights.inflight() == 0
+
+def test_create_single_flight_from_environment(monkeypatch):
+    """
+    Ensures DETECTION_MAX_INFLIGHT (0 = unbounded) and DETECTION_WAIT_TIMEOUT are honoured.
+    """
+    monkeypatch.setenv("DETECTION_MAX_INFLIGHT", "0")
+    monkeypatch.setenv("DETECTION_WAIT_TIMEOUT", "0.5")
+    flights = create_single_flight()
+    assert flights.max_inflight is None and flights.wait_timeout == 0.5
+    monkeypatch.delenv("DETECTION_MAX_INFLIGHT")
+    assert create_single_flight().max_inflight == 2
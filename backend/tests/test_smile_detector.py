@@ -3,9 +3,12 @@ Unit tests for detect_smile_on_frame in smile_detector service.
 Mocks OpenCV cascades and imencode to test smile detection logic.
 """
 
+import cv2
+import threading
+import pytest
 import numpy as np
-from unittest.mock import MagicMock
-from app.services.smile_detector import detect_smile_on_frame
+from unittest.mock import MagicMock, patch
+from app.services.smile_detector import detect_smile_on_frame, decode_image, detect_smiles_in_images, CascadePool
 
 def test_no_frame_returns_none():
     """
@@ -71,6 +74,27 @@ def test_smile_detected_best_box_and_encoding_success(monkeypatch):
     assert isinstance(coords, list)
     assert "x" in coords[0]
 
+def test_read_only_frame_is_copied_before_drawing():
+    """
+    Ensures a read-only (borrowed) frame is never drawn on: boxes go onto a private copy that is encoded.
+    """
+    fake_face_cascade = MagicMock()
+    fake_face_cascade.detectMultiScale.return_value = [(10, 10, 80, 80)]
+    fake_smile_cascade = MagicMock()
+    fake_smile_cascade.detectMultiScale.return_value = [(20, 20, 50, 20)]
+    encoded = []
+    def fake_imencode(fmt, img):
+        encoded.append(img)
+        return True, np.array([1, 2, 3])
+
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    frame.flags.writeable = False
+    result = detect_smile_on_frame(frame, face_cascade=fake_face_cascade, smile_cascade=fake_smile_cascade,
+                                   imencode_func=fake_imencode, detection_scale=1.0)
+    assert result is not None
+    assert not frame.any()
+    assert encoded[0].any() and encoded[0] is not frame
+
 def test_smile_detected_encoding_failure(monkeypatch):
     """
     Ensures detect_smile_on_frame returns None if image encoding fails.
@@ -110,3 +134,140 @@ def test_smile_filtered_by_aspect_and_center(monkeypatch):
         imencode_func=fake_imencode
     )
     assert result is None
+
+def test_encode_image_false_skips_drawing_and_encoding():
+    """
+    Ensures encode_image=False returns (None, coords) without touching the frame or encoding.
+    """
+    fake_face_cascade = MagicMock()
+    fake_face_cascade.detectMultiScale.return_value = [(10, 10, 80, 80)]
+    fake_smile_cascade = MagicMock()
+    fake_smile_cascade.detectMultiScale.return_value = [(20, 10, 50, 20)]
+    fake_imencode = MagicMock()
+
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    result = detect_smile_on_frame(
+        frame,
+        face_cascade=fake_face_cascade,
+        smile_cascade=fake_smile_cascade,
+        imencode_func=fake_imencode,
+        encode_image=False,
+    )
+    assert result == (None, [{"x": 30, "y": 60, "w": 50, "h": 20}])
+    fake_imencode.assert_not_called()
+    assert not frame.any()
+
+def test_decode_image_invalid_bytes_returns_none():
+    """
+    Ensures decode_image returns None for empty or non-image data.
+    """
+    assert decode_image(b"") is None
+    assert decode_image(b"not an image") is None
+
+def test_decode_image_reduced_grayscale():
+    """
+    Ensures decode_image can decode straight to reduced-size grayscale and rejects unsupported factors.
+    """
+    _, jpeg = cv2.imencode(".jpg", np.zeros((120, 160, 3), dtype=np.uint8))
+    assert decode_image(jpeg.tobytes()).shape == (120, 160, 3)
+    assert decode_image(jpeg.tobytes(), gray=True).shape == (120, 160)
+    assert decode_image(jpeg.tobytes(), reduce=4, gray=True).shape == (30, 40)
+    assert decode_image(jpeg.tobytes(), reduce=2).shape == (60, 80, 3)
+    with pytest.raises(ValueError):
+        decode_image(jpeg.tobytes(), reduce=3)
+
+def test_grayscale_frame_is_detected_and_annotated():
+    """
+    Ensures single-channel frames are detected without conversion and boxes are drawn in white.
+    """
+    fake_face_cascade = MagicMock()
+    fake_face_cascade.detectMultiScale.return_value = [(10, 10, 80, 80)]
+    fake_smile_cascade = MagicMock()
+    fake_smile_cascade.detectMultiScale.return_value = [(20, 10, 50, 20)]
+    frame = np.zeros((100, 100), dtype=np.uint8)
+    result = detect_smile_on_frame(frame, fake_face_cascade, fake_smile_cascade,
+                                   imencode_func=lambda fmt, img: (True, np.array([1], dtype=np.uint8)))
+    assert result[1] == [{"x": 30, "y": 60, "w": 50, "h": 20}]
+    assert frame[60, 30] == 255
+
+def test_detect_smiles_in_images_preserves_order():
+    """
+    Ensures batch detection returns one entry per input, in order, with None for undecodable data.
+    """
+    _, png = cv2.imencode(".png", np.zeros((50, 50, 3), dtype=np.uint8))
+    results = detect_smiles_in_images([png.tobytes(), b"garbage", png.tobytes()], max_workers=2)
+    assert results == [[], None, []]
+    assert detect_smiles_in_images([]) == []
+
+def test_detection_scale_maps_faces_to_original_frame():
+    """
+    Ensures faces are searched on a downscaled image and smile coords are reported in original-frame space.
+    """
+    seen_shapes = []
+    fake_face_cascade = MagicMock()
+    def fake_faces(image, *args, **kwargs):
+        seen_shapes.append(image.shape)
+        return [(5, 5, 40, 40)]  # (10, 10, 80, 80) at full resolution
+    fake_face_cascade.detectMultiScale.side_effect = fake_faces
+    fake_smile_cascade = MagicMock()
+    fake_smile_cascade.detectMultiScale.return_value = [(20, 10, 50, 20)]
+
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    result = detect_smile_on_frame(
+        frame,
+        face_cascade=fake_face_cascade,
+        smile_cascade=fake_smile_cascade,
+        encode_image=False,
+        detection_scale=0.5,
+    )
+    assert seen_shapes == [(50, 50)]
+    # Smile search runs on the full-resolution lower half of the mapped face
+    assert fake_smile_cascade.detectMultiScale.call_args[0][0].shape == (40, 80)
+    assert result == (None, [{"x": 30, "y": 60, "w": 50, "h": 20}])
+
+def test_detection_scale_from_environment(monkeypatch):
+    """
+    Ensures DETECTION_SCALE sets the default face search scale.
+    """
+    monkeypatch.setenv("DETECTION_SCALE", "0.25")
+    fake_face_cascade = MagicMock()
+    fake_face_cascade.detectMultiScale.return_value = []
+    detect_smile_on_frame(np.zeros((100, 100, 3), dtype=np.uint8), face_cascade=fake_face_cascade, smile_cascade=MagicMock())
+    assert fake_face_cascade.detectMultiScale.call_args[0][0].shape == (25, 25)
+
+def test_cascade_pool_reuses_pairs_and_bounds_concurrency():
+    """
+    Ensures the pool loads pairs lazily up to its size, reuses returned pairs,
+    and makes callers wait while every pair is checked out.
+    """
+    loaded = []
+    pool = CascadePool(size=2, loader=lambda: loaded.append(object()) or loaded[-1])
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second and len(loaded) == 2
+    assert pool.stats() == {"size": 2, "created": 2, "idle": 0, "in_use": 2}
+
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    waiter.join(0.05)
+    assert waiter.is_alive()  # Blocked: both pairs are in use
+    pool.release(second)
+    waiter.join(1.0)
+    assert got == [second] and len(loaded) == 2
+    pool.release(first)
+    with pool.checkout() as pair:
+        assert pair is first
+
+def test_detection_without_cascades_uses_pool():
+    """
+    Ensures detect_smile_on_frame checks a pair out of the shared pool when no cascades are injected,
+    and returns it afterwards.
+    """
+    fake_face_cascade = MagicMock()
+    fake_face_cascade.detectMultiScale.return_value = []
+    pool = CascadePool(size=1, loader=lambda: (fake_face_cascade, MagicMock()))
+    with patch("app.services.smile_detector.cascade_pool", pool):
+        assert detect_smile_on_frame(np.zeros((50, 50, 3), dtype=np.uint8)) is None
+    fake_face_cascade.detectMultiScale.assert_called_once()
+    assert pool.stats()["in_use"] == 0 and pool.stats()["idle"] == 1
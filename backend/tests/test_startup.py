@@ -0,0 +1,69 @@
+"""
+Unit tests for startup phase timing, detector warmup and the /ready endpoint.
+"""
+
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+import app.main as main
+from app.services.startup import StartupTracker, warm_up_detection
+from app.services.smile_detector import CascadePool, warm_up_cascades
+
+client = TestClient(main.app)
+
+def test_phases_are_timed_and_background_warmup_marks_ready():
+    """
+    Ensures phases are reported in milliseconds and readiness follows the background phase.
+    """
+    tracker = StartupTracker()
+    with tracker.phase("writers"):
+        pass
+    assert not tracker.ready and tracker.status()["startup_ms"] is None
+    tracker.run_in_background("warmup", lambda: None).join(timeout=5)
+    status = tracker.status()
+    assert status["ready"] and status["error"] is None
+    assert list(status["phases"]) == ["writers", "warmup"] and status["startup_ms"] >= status["phases"]["warmup"]
+
+def test_failed_warmup_stays_not_ready():
+    """
+    Ensures an exception during warmup is reported and readiness is not granted.
+    """
+    tracker = StartupTracker()
+    def fail():
+        raise RuntimeError("cascade missing")
+    tracker.run_in_background("warmup", fail).join(timeout=5)
+    status = tracker.status()
+    assert not status["ready"] and status["error"] == "cascade missing" and "warmup" in status["phases"]
+
+def test_ready_endpoint_reflects_startup(monkeypatch):
+    """
+    Ensures /ready answers 503 until startup completes and 200 afterwards, while / stays 200.
+    """
+    tracker = StartupTracker()
+    monkeypatch.setattr(main, "startup_tracker", tracker)
+    response = client.get("/ready")
+    assert response.status_code == 503 and response.json()["ready"] is False
+    assert client.get("/").status_code == 200
+    tracker.mark_ready()
+    response = client.get("/ready")
+    assert response.status_code == 200 and response.json()["ready"] is True
+
+def test_warm_up_runs_every_stage_once():
+    """
+    Ensures warmup exercises the face search, the smile search and JPEG encoding.
+    """
+    face_cascade, smile_cascade = MagicMock(), MagicMock()
+    face_cascade.detectMultiScale.return_value = []
+    smile_cascade.detectMultiScale.return_value = []
+    warm_up_cascades(face_cascade, smile_cascade)
+    assert face_cascade.detectMultiScale.call_count == 1 and smile_cascade.detectMultiScale.call_count == 1
+
+def test_warm_up_detection_loads_distinct_pool_pairs(monkeypatch):
+    """
+    Ensures in-process warmup loads WARMUP_CASCADE_PAIRS pairs into the pool, capped at its size.
+    """
+    pool = CascadePool(size=2, loader=lambda: (MagicMock(**{"detectMultiScale.return_value": []}),
+                                              MagicMock(**{"detectMultiScale.return_value": []})))
+    monkeypatch.setattr("app.services.smile_detector.cascade_pool", pool)
+    monkeypatch.setenv("WARMUP_CASCADE_PAIRS", "3")
+    warm_up_detection()
+    assert pool.stats() == {"size": 2, "created": 2, "idle": 2, "in_use": 0}
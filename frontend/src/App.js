@@ -2,18 +2,28 @@
  * Main Application Component for Smile Detection UI.
  *
  * - Starts/stops camera session on backend.
- * - Polls backend every second for smile detection.
+ * - Receives detections pushed over the WebSocket stream while it is connected.
+ * - Falls back to polling every second (skipping unchanged frames via ETag) while the
+ *   stream is down, and reconnects it every few seconds.
  * - Shows live feedback and handles network and API errors.
  * - Displays a spinner overlay while starting the camera.
- * - Cleans up Blob URLs to prevent memory leaks.
+ * - Cleans up Blob URLs to prevent memory leaks: only the displayed smile image keeps one.
  */
 
 import React, { useState, useEffect, useRef } from "react";
 import SmileViewer from "./components/SmileViewer";
 import SmileDetails from "./components/SmileDetails";
-import { startCamera, stopCamera, fetchSmileDetection } from "./api/SmileApi";
+import {
+  startCamera,
+  stopCamera,
+  fetchSmileDetection,
+  subscribeSmileDetections,
+} from "./api/SmileApi";
 import "./index.css";
 
+// Delay before reopening a closed detection stream (polling covers the gap)
+const RECONNECT_DELAY_MS = 3000;
+
 function App() {
   // App state
   const [detectionRunning, setDetectionRunning] = useState(false);
@@ -25,22 +35,99 @@ function App() {
 
   const intervalRef = useRef(null);
   const inFlight = useRef(false);
+  const lastEtag = useRef(null);
+  // Object URL of the displayed smile image (also lastSmile.image); revoked when replaced
+  const currentImage = useRef(null);
 
   /**
-   * Poll for smile detection every second when detectionRunning is true.
+   * Revokes the object URL of the displayed smile image, if any.
+   */
+  const releaseImage = () => {
+    if (currentImage.current) {
+      URL.revokeObjectURL(currentImage.current);
+      currentImage.current = null;
+    }
+  };
+
+  /**
+   * Shows a new smile image and its coordinates, releasing the previous image's URL.
+   */
+  const showSmile = (blob, coords) => {
+    const newImage = URL.createObjectURL(blob);
+    releaseImage();
+    currentImage.current = newImage;
+    setImageSrc(newImage);
+    setSmileCoords(coords);
+    setLastSmile({ coords, image: newImage });
+  };
+
+  // Release the last image URL on unmount
+  // eslint-disable-next-line
+  useEffect(() => releaseImage, []);
+
+  /**
+   * While detectionRunning is true, subscribe to the detection stream.
+   * Poll every second only while the stream is disconnected, and reconnect it.
    */
   useEffect(() => {
-    if (detectionRunning) {
+    if (!detectionRunning) return undefined;
+    let closeStream = null;
+    let reconnectTimer = null;
+    let stopped = false;
+
+    const startPolling = () => {
+      if (intervalRef.current) return;
       intervalRef.current = setInterval(() => {
         if (!inFlight.current) {
           handleSmileDetection();
         }
       }, 1000);
-    }
-    return () => clearInterval(intervalRef.current);
+    };
+    const stopPolling = () => {
+      clearInterval(intervalRef.current);
+      intervalRef.current = null;
+    };
+    const handleStreamClosed = () => {
+      if (stopped) return;
+      startPolling();
+      clearTimeout(reconnectTimer);
+      reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+    };
+    const connect = () => {
+      try {
+        closeStream = subscribeSmileDetections(handleStreamEvent, {
+          frames: true,
+          onOpen: stopPolling,
+          onClose: handleStreamClosed,
+        });
+      } catch (error) {
+        handleStreamClosed();
+      }
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(reconnectTimer);
+      stopPolling();
+      if (closeStream) closeStream();
+    };
     // eslint-disable-next-line
   }, [detectionRunning]);
 
+  /**
+   * Handles one event pushed over the detection stream.
+   * Smile events carry the annotated frame as a Blob.
+   */
+  const handleStreamEvent = (event) => {
+    setStatusMessage("Keep smiling!");
+    if (event.image) {
+      showSmile(event.image, event.coords);
+    } else if (!event.coords || event.coords.length === 0) {
+      setSmileCoords(null);
+    }
+  };
+
   /**
    * Handles polling for smile detection from backend.
    * Updates image, coordinates, and UI status.
@@ -48,9 +135,14 @@ function App() {
   const handleSmileDetection = async () => {
     inFlight.current = true;
     try {
-      const response = await fetchSmileDetection();
+      const response = await fetchSmileDetection(lastEtag.current);
       if (!detectionRunning) return;
 
+      // Remember the frame we now have so unchanged frames come back as 304
+      if (response.headers && response.headers["etag"]) {
+        lastEtag.current = response.headers["etag"];
+      }
+
       // Success: Smile detected
       if (response.status === 200) {
         setStatusMessage("Keep smiling!");
@@ -68,10 +160,11 @@ function App() {
             }
           }
         }
-        const newImage = URL.createObjectURL(response.data);
-        setImageSrc(newImage);
-        setSmileCoords(coords);
-        setLastSmile({ coords, image: newImage });
+        showSmile(response.data, coords);
+      }
+      // Frame unchanged since last poll (304): keep current display
+      else if (response.status === 304) {
+        setStatusMessage("Keep smiling!");
       }
       // No smile detected (204)
       else if (response.status === 204) {
@@ -94,7 +187,7 @@ function App() {
   };
 
   /**
-   * Starts camera session and polling for detection.
+   * Starts camera session and the detection stream.
    * Shows spinner overlay while starting.
    */
   const handleStart = async () => {
@@ -102,6 +195,8 @@ function App() {
     setStatusMessage("Starting camera...");
     try {
       await startCamera();
+      lastEtag.current = null;
+      releaseImage();
       setImageSrc(null);
       setSmileCoords(null);
       setLastSmile({ coords: null, image: null });
@@ -115,11 +210,10 @@ function App() {
   };
 
   /**
-   * Stops camera session and polling.
+   * Stops camera session, the detection stream and polling.
    */
   const handleStop = async () => {
     setDetectionRunning(false);
-    clearInterval(intervalRef.current);
     setStatusMessage("Click 'Start' to begin.");
     try {
       await stopCamera();
@@ -60,19 +60,30 @@ jest.mock("./api/SmileApi", () => ({
   startCamera: jest.fn(),
   stopCamera: jest.fn(),
   fetchSmileDetection: jest.fn(),
+  subscribeSmileDetections: jest.fn(),
 }));
 
 const {
   startCamera,
   stopCamera,
   fetchSmileDetection,
+  subscribeSmileDetections,
 } = require("./api/SmileApi");
 
+// Handlers of the latest (mocked) detection stream
+let stream;
+
 describe("App", () => {
   beforeEach(() => {
     jest.clearAllMocks();
     URL.revokeObjectURL.mockClear();
     blobCounter = 0;
+    // By default the stream cannot connect, so the App falls back to polling
+    subscribeSmileDetections.mockImplementation((onEvent, options) => {
+      stream = { onEvent, ...options, close: jest.fn() };
+      options.onClose();
+      return stream.close;
+    });
   });
 
   /**
@@ -203,6 +214,42 @@ describe("App", () => {
     expect(screen.getByText(/keep smiling/i)).toBeInTheDocument();
   });
 
+  /**
+   * Should keep the current smile on 304 and send the last ETag on the next poll.
+   */
+  it("handles 304 response (frame unchanged) and sends last ETag", async () => {
+    startCamera.mockResolvedValue();
+    fetchSmileDetection
+      .mockResolvedValueOnce({
+        status: 200,
+        headers: {
+          "x-smile-coords": JSON.stringify([{ x: 1, y: 2, w: 3, h: 4 }]),
+          etag: '"5"',
+        },
+        data: new Blob(["img"], { type: "image/jpeg" }),
+      })
+      .mockResolvedValue({ status: 304, headers: { etag: '"5"' }, data: null });
+
+    render(<App />);
+    await act(async () => {
+      fireEvent.click(screen.getByRole("button", { name: /start/i }));
+    });
+    await waitFor(() => expect(startCamera).toHaveBeenCalled());
+    await act(async () => {
+      jest.advanceTimersByTime(1000);
+    });
+    await waitFor(() => expect(fetchSmileDetection).toHaveBeenCalledTimes(1));
+    await act(async () => {
+      jest.advanceTimersByTime(1000);
+    });
+    await waitFor(() => expect(fetchSmileDetection).toHaveBeenCalledTimes(2));
+    expect(fetchSmileDetection).toHaveBeenLastCalledWith('"5"');
+    expect(screen.getByTestId("smile-viewer")).toHaveTextContent("image");
+    expect(screen.getByTestId("smile-details")).not.toHaveTextContent(
+      /no smile/i
+    );
+  });
+
   /**
    * Should show a message if backend returns 409 (camera not started).
    */
@@ -414,4 +461,110 @@ describe("App", () => {
 
     expect(document.querySelector(".spinner-overlay")).not.toBeInTheDocument();
   });
+
+  /**
+   * Should show pushed detections and not poll while the stream is connected.
+   */
+  it("uses the detection stream while it is connected", async () => {
+    startCamera.mockResolvedValue();
+    stopCamera.mockResolvedValue();
+    subscribeSmileDetections.mockImplementation((onEvent, options) => {
+      stream = { onEvent, ...options, close: jest.fn() };
+      return stream.close;
+    });
+
+    render(<App />);
+    await act(async () => {
+      fireEvent.click(screen.getByRole("button", { name: /start/i }));
+    });
+    await waitFor(() => expect(subscribeSmileDetections).toHaveBeenCalled());
+    expect(subscribeSmileDetections.mock.calls[0][1].frames).toBe(true);
+
+    await act(async () => {
+      stream.onOpen();
+      stream.onEvent({
+        seq: 1,
+        coords: [{ x: 1, y: 2, w: 3, h: 4 }],
+        image: new Blob(["img"], { type: "image/jpeg" }),
+      });
+      jest.advanceTimersByTime(3000);
+    });
+    expect(fetchSmileDetection).not.toHaveBeenCalled();
+    expect(screen.getByTestId("smile-viewer")).toHaveTextContent("image");
+    expect(screen.getByTestId("smile-details")).not.toHaveTextContent(
+      /no smile/i
+    );
+
+    await act(async () => {
+      fireEvent.click(screen.getByRole("button", { name: /stop/i }));
+    });
+    expect(stream.close).toHaveBeenCalled();
+  });
+
+  /**
+   * Should revoke each replaced smile image URL, and the last one on unmount.
+   */
+  it("revokes replaced smile image URLs", async () => {
+    startCamera.mockResolvedValue();
+    subscribeSmileDetections.mockImplementation((onEvent, options) => {
+      stream = { onEvent, ...options, close: jest.fn() };
+      return stream.close;
+    });
+
+    const { unmount } = render(<App />);
+    await act(async () => {
+      fireEvent.click(screen.getByRole("button", { name: /start/i }));
+    });
+    await waitFor(() => expect(subscribeSmileDetections).toHaveBeenCalled());
+    const smile = () => ({
+      coords: [{ x: 1, y: 2, w: 3, h: 4 }],
+      image: new Blob(["img"], { type: "image/jpeg" }),
+    });
+    await act(async () => {
+      stream.onOpen();
+      stream.onEvent({ seq: 1, ...smile() });
+      stream.onEvent({ seq: 2, ...smile() });
+    });
+    expect(URL.revokeObjectURL).toHaveBeenCalledTimes(1);
+    expect(URL.revokeObjectURL).toHaveBeenCalledWith("test-object-url-0");
+
+    unmount();
+    expect(URL.revokeObjectURL).toHaveBeenLastCalledWith("test-object-url-1");
+  });
+
+  /**
+   * Should poll while the stream is down and stop polling once it reconnects.
+   */
+  it("falls back to polling and reconnects the stream", async () => {
+    startCamera.mockResolvedValue();
+    fetchSmileDetection.mockResolvedValue({ status: 204, headers: {}, data: null });
+
+    render(<App />);
+    await act(async () => {
+      fireEvent.click(screen.getByRole("button", { name: /start/i }));
+    });
+    await waitFor(() => expect(subscribeSmileDetections).toHaveBeenCalledTimes(1));
+    await act(async () => {
+      jest.advanceTimersByTime(1000);
+    });
+    await waitFor(() => expect(fetchSmileDetection).toHaveBeenCalledTimes(1));
+
+    // The next attempt connects: polling stops
+    subscribeSmileDetections.mockImplementation((onEvent, options) => {
+      stream = { onEvent, ...options, close: jest.fn() };
+      return stream.close;
+    });
+    await act(async () => {
+      jest.advanceTimersByTime(2000);
+    });
+    await waitFor(() => expect(subscribeSmileDetections).toHaveBeenCalledTimes(2));
+    await act(async () => {
+      stream.onOpen();
+    });
+    const polls = fetchSmileDetection.mock.calls.length;
+    await act(async () => {
+      jest.advanceTimersByTime(3000);
+    });
+    expect(fetchSmileDetection).toHaveBeenCalledTimes(polls);
+  });
 });
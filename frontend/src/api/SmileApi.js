@@ -37,26 +37,85 @@ export async function stopCamera() {
 
 /**
  * Validates response status codes from the smile detection API.
- * Allows 200 (OK), 204 (No Content), and 500 (Internal Server Error) as "handled" responses.
+ * Allows 200 (OK), 204 (No Content), 304 (Not Modified), and 500 (Internal Server Error) as "handled" responses.
  * @param {number} status - HTTP status code from the response
  * @returns {boolean} Whether the status is considered valid for processing
  */
 export const validateSmileStatus = (status) =>
-  status === 200 || status === 204 || status === 500;
+  status === 200 || status === 204 || status === 304 || status === 500;
 
 /**
  * Polls the backend for smile detection on the current camera frame.
+ * @param {string} [etag] - ETag of the last frame received; the backend answers 304 if nothing changed.
  * @returns {Promise<object>} Axios response, including image blob and headers.
  * @throws {Error} Network or backend error.
  */
-export async function fetchSmileDetection() {
+export async function fetchSmileDetection(etag) {
   try {
     const response = await axios.get(`${BASE_URL}/detect_smile`, {
       responseType: "blob",
       validateStatus: validateSmileStatus,
+      headers: etag ? { "If-None-Match": etag } : {},
     });
     return response;
   } catch (error) {
     throw error;
   }
 }
+
+/**
+ * Opens a push-based detection stream over WebSocket instead of polling.
+ * The backend sends one JSON event per processed frame; slow clients only get the newest.
+ * With `frames`, the backend follows every event that has a smile with a binary JPEG
+ * message; it is attached to that event as `image` (a Blob) before onEvent is called.
+ * @param {function(object): void} onEvent - Called with {seq, timestamp, coords[, image]} for every event.
+ * @param {object} [options]
+ * @param {boolean} [options.frames] - Also receive the annotated JPEG of smile events.
+ * @param {function(Event): void} [options.onOpen] - Called once the stream is connected.
+ * @param {function(Event): void} [options.onClose] - Called when the stream closes or cannot connect.
+ * @param {function(Event): void} [options.onError] - Called on connection errors.
+ * @returns {function(): void} Function that closes the stream.
+ */
+export function subscribeSmileDetections(
+  onEvent,
+  { frames = false, onOpen, onClose, onError } = {}
+) {
+  const socket = new WebSocket(
+    `${BASE_URL.replace(/^http/, "ws")}/ws/detect_smile${frames ? "?frames=true" : ""}`
+  );
+  socket.binaryType = "blob";
+  // Smile event waiting for its JPEG message
+  let pending = null;
+
+  socket.onmessage = (message) => {
+    if (typeof message.data !== "string") {
+      // Binary JPEG of the preceding smile event
+      if (pending) {
+        onEvent({ ...pending, image: message.data });
+        pending = null;
+      }
+      return;
+    }
+    if (pending) {
+      // Its JPEG never came: deliver the smile event without an image
+      onEvent(pending);
+      pending = null;
+    }
+    const event = JSON.parse(message.data);
+    if (frames && event.coords && event.coords.length > 0) {
+      pending = event;
+    } else {
+      onEvent(event);
+    }
+  };
+  if (onOpen) {
+    socket.onopen = onOpen;
+  }
+  if (onClose) {
+    socket.onclose = onClose;
+  }
+  if (onError) {
+    socket.onerror = onError;
+  }
+  return () => socket.close();
+}
@@ -12,6 +12,7 @@ import {
   stopCamera,
   fetchSmileDetection,
   validateSmileStatus,
+  subscribeSmileDetections,
 } from "./SmileApi";
 
 // Mock axios globally for this test suite
@@ -90,9 +91,10 @@ describe("validateSmileStatus", () => {
   /**
    * Should return true for valid status codes.
    */
-  it("returns true for 200, 204, 500", () => {
+  it("returns true for 200, 204, 304, 500", () => {
     expect(validateSmileStatus(200)).toBe(true);
     expect(validateSmileStatus(204)).toBe(true);
+    expect(validateSmileStatus(304)).toBe(true);
     expect(validateSmileStatus(500)).toBe(true);
   });
 
@@ -134,6 +136,22 @@ describe("fetchSmileDetection", () => {
     expect(result).toBe(mockResponse);
   });
 
+  /**
+   * Should send the last ETag as If-None-Match for conditional polling.
+   */
+  it("sends If-None-Match when an ETag is given", async () => {
+    axios.get.mockResolvedValue({ status: 304, data: null });
+
+    await fetchSmileDetection('"7"');
+
+    expect(axios.get).toHaveBeenCalledWith(
+      expect.stringContaining("/detect_smile"),
+      expect.objectContaining({
+        headers: { "If-None-Match": '"7"' },
+      })
+    );
+  });
+
   /**
    * Should propagate errors thrown by axios (network/backend error).
    */
@@ -143,3 +161,70 @@ describe("fetchSmileDetection", () => {
     await expect(fetchSmileDetection()).rejects.toThrow("Network Error");
   });
 });
+
+//
+// Tests for subscribeSmileDetections streaming client
+//
+describe("subscribeSmileDetections", () => {
+  const OriginalWebSocket = global.WebSocket;
+  let socket;
+
+  beforeEach(() => {
+    global.WebSocket = jest.fn((url) => {
+      socket = { url, close: jest.fn() };
+      return socket;
+    });
+  });
+
+  afterEach(() => {
+    global.WebSocket = OriginalWebSocket;
+  });
+
+  /**
+   * Should connect to the ws:// stream and forward parsed events.
+   */
+  it("opens the detection stream and forwards events", () => {
+    const onEvent = jest.fn();
+    subscribeSmileDetections(onEvent);
+
+    expect(socket.url).toMatch(/^ws:\/\/.*\/ws\/detect_smile$/);
+    socket.onmessage({ data: JSON.stringify({ seq: 1, coords: [] }) });
+    expect(onEvent).toHaveBeenCalledWith({ seq: 1, coords: [] });
+  });
+
+  /**
+   * Should attach each binary JPEG to the smile event it follows, without parsing it.
+   */
+  it("pairs binary frames with their smile events", () => {
+    const onEvent = jest.fn();
+    const onOpen = jest.fn();
+    const onClose = jest.fn();
+    subscribeSmileDetections(onEvent, { frames: true, onOpen, onClose });
+    const image = new Blob(["jpeg"], { type: "image/jpeg" });
+    const coords = [{ x: 1, y: 2, w: 3, h: 4 }];
+
+    expect(socket.url).toMatch(/\/ws\/detect_smile\?frames=true$/);
+    expect(socket.onopen).toBe(onOpen);
+    expect(socket.onclose).toBe(onClose);
+    socket.onmessage({ data: JSON.stringify({ seq: 1, coords }) });
+    expect(onEvent).not.toHaveBeenCalled();
+    socket.onmessage({ data: image });
+    expect(onEvent).toHaveBeenLastCalledWith({ seq: 1, coords, image });
+
+    socket.onmessage({ data: JSON.stringify({ seq: 2, coords: [] }) });
+    expect(onEvent).toHaveBeenLastCalledWith({ seq: 2, coords: [] });
+    socket.onmessage({ data: JSON.stringify({ seq: 3, coords }) });
+    socket.onmessage({ data: JSON.stringify({ seq: 4, coords: [] }) });
+    expect(onEvent).toHaveBeenCalledWith({ seq: 3, coords });
+    expect(onEvent).toHaveBeenLastCalledWith({ seq: 4, coords: [] });
+  });
+
+  /**
+   * Should close the socket when the returned function is called.
+   */
+  it("returns a function that closes the stream", () => {
+    const close = subscribeSmileDetections(jest.fn());
+    close();
+    expect(socket.close).toHaveBeenCalled();
+  });
+});